@@ -0,0 +1,94 @@
+import numpy as np
+
+
+def line_angles(lines):
+    """
+    Computes the angle and length of line segments.
+
+    Parameters:
+        lines (np.ndarray): Segments as an (N, 4) array of (x1, y1, x2, y2),
+            e.g. the squeezed output of cv2.HoughLinesP.
+
+    Returns:
+        (angles, lengths): Angles in degrees normalized to the deviation from
+            the nearest axis ([-45, 45)), and segment lengths.
+    """
+    lines = np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+    dx = lines[:, 2] - lines[:, 0]
+    dy = lines[:, 3] - lines[:, 1]
+    lengths = np.hypot(dx, dy)
+    angles = normalize_angles(np.degrees(np.arctan2(dy, dx)))
+    return angles, lengths
+
+
+def normalize_angles(angles):
+    """Maps angles in degrees to the deviation from the nearest axis ([-45, 45))."""
+    return (np.asarray(angles, dtype=np.float64) + 45) % 90 - 45
+
+
+def weighted_median(values, weights):
+    """Weighted median of `values` (the value at half of the cumulative weight)."""
+    order = np.argsort(values, kind="stable")
+    cumulative = np.cumsum(weights[order])
+    index = np.searchsorted(cumulative, cumulative[-1] / 2)
+    return values[order[min(index, len(order) - 1)]]
+
+
+def aggregate_line_angles(angles, weights=None, bin_width=None, tolerance=1.0, max_lines=2000):
+    """
+    Combines many line angles into one dominant angle.
+
+    Parameters:
+        angles: Line angles in degrees (normalized with normalize_angles).
+        weights: Per-line weights, typically lengths (default: equal weights).
+        bin_width: If set, lines first vote into histogram bins of this width
+            (degrees) and only the winning bin and its neighbours feed the
+            weighted median. This ignores minority directions such as
+            hatching or text strokes. The bins wrap around at +-45 degrees.
+        tolerance: Angular distance (degrees) counted as agreeing with the
+            result when computing the confidence.
+        max_lines: Only the heaviest lines are kept (selected with
+            argpartition) so noisy scans with thousands of segments stay cheap.
+
+    Returns:
+        (angle, confidence): Length-weighted median angle in degrees and the
+            fraction of the total weight within `tolerance` of it (0 to 1,
+            measured around the wrap).
+            Returns (0.0, 0.0) when there are no lines.
+    """
+    angles = np.asarray(angles, dtype=np.float64).ravel()
+    if weights is None:
+        weights = np.ones_like(angles)
+    weights = np.asarray(weights, dtype=np.float64).ravel()
+
+    valid = np.isfinite(angles) & (weights > 0)
+    angles = angles[valid]
+    weights = weights[valid]
+    if angles.size == 0:
+        return 0.0, 0.0
+
+    if max_lines and angles.size > max_lines:
+        heaviest = np.argpartition(weights, -max_lines)[-max_lines:]
+        angles = angles[heaviest]
+        weights = weights[heaviest]
+
+    total = weights.sum()
+    selected = angles
+    selected_weights = weights
+    if bin_width:
+        n_bins = int(np.ceil(90 / bin_width))
+        bins = np.clip(((angles + 45) // bin_width).astype(np.int64), 0, n_bins - 1)
+        votes = np.bincount(bins, weights=weights, minlength=n_bins)
+        # The histogram is circular: -45 and +45 are the same orientation, so
+        # the end bins are neighbours and a peak can span the wrap
+        peak = int(np.argmax(votes + np.roll(votes, 1) + np.roll(votes, -1)))
+        distance = np.abs(bins - peak)
+        in_peak = np.minimum(distance, n_bins - distance) <= 1
+        # Unwrap the peak's angles around its center before taking the median
+        center = -45 + (peak + 0.5) * bin_width
+        selected = normalize_angles(angles[in_peak] - center) + center
+        selected_weights = weights[in_peak]
+
+    angle = float(normalize_angles(weighted_median(selected, selected_weights)))
+    confidence = float(weights[np.abs(normalize_angles(angles - angle)) <= tolerance].sum() / total)
+    return angle, confidence
@@ -0,0 +1,140 @@
+import os
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+from run import main as run
+from stage_cache import StageCache, hash_array
+
+# Downstream settings evaluated by default (3 x 2 x 3 = 18 candidates)
+DEFAULT_GRID = {
+    "delta": (10, 20, 30),
+    "kernel_size": (1, 3),
+    "thin": (2, 4, 6),
+}
+
+# Stages that do not depend on the tuned settings, computed once
+UPSTREAM_STAGES = ("frame", "colors", "axes")
+
+
+def score_points(data_points, xlim, ylim, bins=200, max_jump=0.1):
+    """
+    Cheap quality metrics of an extracted series.
+
+    The x range is split into `bins` columns; the median y of every occupied
+    column stands for the trace there.
+
+    Parameters:
+        data_points: (N, 2) array of data points.
+        xlim, ylim: Axis limits of the plot.
+        bins (int): Number of x columns.
+        max_jump (float): Largest change between neighbouring columns, as a
+            fraction of the y range, that still counts as continuous.
+
+    Returns:
+        dict: "coverage" (fraction of the columns with points), "continuity"
+        (fraction of neighbouring occupied columns without a jump), "points"
+        and "score" (coverage x continuity, 0 to 1).
+    """
+    points = np.asarray(data_points if data_points is not None else np.empty((0, 2)), np.float64).reshape(-1, 2)
+    if len(points) < 2:
+        return {"coverage": 0.0, "continuity": 0.0, "points": len(points), "score": 0.0}
+    columns = np.floor((points[:, 0] - xlim[0]) / (xlim[1] - xlim[0]) * bins).astype(np.intp)
+    inside = (columns >= 0) & (columns < bins)
+    columns, ys = columns[inside], points[inside, 1]
+    if columns.size == 0:
+        return {"coverage": 0.0, "continuity": 0.0, "points": len(points), "score": 0.0}
+    # Median y per occupied column
+    order = np.lexsort((ys, columns))
+    columns, ys = columns[order], ys[order]
+    occupied, starts, counts = np.unique(columns, return_index=True, return_counts=True)
+    medians = ys[starts + counts // 2]
+
+    coverage = occupied.size / bins
+    if occupied.size > 1:
+        steps = np.abs(np.diff(medians)) / abs(ylim[1] - ylim[0])
+        continuity = float(np.mean(steps <= max_jump))
+    else:
+        continuity = 0.0
+    return {"coverage": round(coverage, 4), "continuity": round(continuity, 4), "points": len(points),
+            "score": round(coverage * continuity, 4)}
+
+
+def autotune(image, args, grid=None, max_workers=None):
+    """
+    Extracts an image with every combination of the downstream settings in
+    `grid` and keeps the best scoring one (see score_points).
+
+    The frame, color discovery and axis (OCR) stages run once and are shared
+    with every candidate through forked stage caches; the color mask is
+    computed once per delta. The candidates then run concurrently in a
+    thread pool (OpenCV releases the GIL), and the best one is run again
+    from its cached stages to render the figure (unless render, or the
+    preset, turns rendering off).
+
+    Parameters:
+        image: BGR image.
+        args: run.main settings; the tuned ones are overridden. A
+            stage_cache (interactive session) is used for the upstream stages.
+        grid (dict): Values to try per setting (default DEFAULT_GRID).
+        max_workers (int): Number of candidates evaluated at once.
+
+    Returns:
+        dict: The run.main result of the best candidate, plus "autotune" with
+        its "settings" and the "scores" of every candidate (settings and
+        metrics, best first).
+    """
+    grid = dict(DEFAULT_GRID if grid is None else grid)
+    names = list(grid)
+    candidates = [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+    settings = dict(vars(args))
+    base = settings.get("stage_cache") or StageCache()
+    image_key = settings.get("image_key") or hash_array(image)
+
+    def run_candidate(candidate, cache, final=False):
+        overrides = {"stage_cache": cache, "image_key": image_key, "panels": False}
+        if not final:
+            overrides["render"] = False
+        # The final run renders as the caller's render (or else preset) says
+        return run(image, SimpleNamespace(**{**settings, **candidate, **overrides}))
+
+    # Upstream stages once, with the first candidate
+    results = {0: run_candidate(candidates[0], base)}
+    caches = {0: base}
+    mask_stages = UPSTREAM_STAGES + ("mask", "morphology", "suppression")
+
+    def first_of(delta):
+        return next(i for i, candidate in enumerate(candidates) if candidate.get("delta") == delta)
+
+    def evaluate(index, cache):
+        caches[index] = cache
+        results[index] = run_candidate(candidates[index], cache)
+
+    workers = max_workers or min(4, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # One color mask per delta
+        firsts = sorted({first_of(delta) for delta in grid.get("delta", ())} - {0})
+        list(executor.map(lambda i: evaluate(i, base.fork(UPSTREAM_STAGES)), firsts))
+        # Every other candidate from the mask (and morphology) of its delta
+        mask_caches = {candidates[i].get("delta"): caches[i] for i in [0] + firsts}
+        rest = [i for i in range(len(candidates)) if i not in results]
+        list(executor.map(lambda i: evaluate(i, mask_caches[candidates[i].get("delta")].fork(mask_stages)), rest))
+
+    scores = []
+    for index, candidate in enumerate(candidates):
+        result = results[index]
+        scores.append({**candidate, **score_points(result["data_points"], result["xlim"], result["ylim"]),
+                       "index": index})
+    # Best score first; among equals the fewest points per column (thinnest outline)
+    scores.sort(key=lambda row: (-row["score"], row["points"]))
+    best = scores[0].pop("index")
+    for row in scores[1:]:
+        row.pop("index")
+    print(f"Autotune: best of {len(candidates)} candidates {candidates[best]} (score {scores[0]['score']})")
+
+    # Rerun (and render) the best candidate; all its stages are cached
+    result = run_candidate(candidates[best], caches[best], final=True)
+    result["autotune"] = {"settings": candidates[best], "scores": scores}
+    return result
@@ -0,0 +1,129 @@
+import numpy as np
+
+SCALES = ("linear", "log10", "db")
+# Scales whose tick labels are logarithmically spaced
+LOG_SCALES = ("log10", "db")
+
+
+class AxisCalibration:
+    """
+    Mapping between pixel positions along one axis and data values.
+
+    For a linear axis:  value = slope * pixel + intercept
+    For a log10 axis:   log10(value) = slope * pixel + intercept
+    For a dB axis:      same as log10 (logarithmically spaced labels), but
+                        values are returned in decibels, 10 * log10(value),
+                        e.g. RCS in m^2 on a log axis comes out in dBsm.
+
+    Pixels are absolute image coordinates (columns for x, rows for y) of the
+    image the calibration was measured on.
+    """
+
+    def __init__(self, slope, intercept, scale="linear", residual=0.0, inliers=None, outliers=None):
+        self.slope = float(slope)
+        self.intercept = float(intercept)
+        self.scale = scale
+        self.residual = float(residual)
+        self.inliers = inliers if inliers is not None else []
+        self.outliers = outliers if outliers is not None else []
+
+    def to_data(self, pixels):
+        """Converts pixel positions to data values (vectorized)."""
+        fitted = self.slope * np.asarray(pixels, dtype=np.float64) + self.intercept
+        if self.scale == "log10":
+            return np.power(10.0, fitted)
+        if self.scale == "db":
+            return 10.0 * fitted
+        return fitted
+
+    def to_pixel(self, values):
+        """Converts data values (as returned by to_data) to pixel positions (vectorized)."""
+        values = np.asarray(values, dtype=np.float64)
+        if self.scale == "log10":
+            values = np.log10(values)
+        elif self.scale == "db":
+            values = values / 10.0
+        return (values - self.intercept) / self.slope
+
+    def as_dict(self):
+        return {
+            "scale": self.scale,
+            "slope": self.slope,
+            "intercept": self.intercept,
+            "residual_px": self.residual,
+            "inliers": [[float(v), float(p)] for v, p in self.inliers],
+            "outliers": [[float(v), float(p)] for v, p in self.outliers],
+        }
+
+    def __repr__(self):
+        return (f"AxisCalibration(scale={self.scale!r}, slope={self.slope:.6g}, "
+                f"intercept={self.intercept:.6g}, residual={self.residual:.3g}px)")
+
+
+def calibration_from_limits(value_start, value_end, pixel_start, pixel_end, scale="linear"):
+    """
+    Calibration that maps pixel_start to value_start and pixel_end to value_end.
+    This is what fixed axis limits mean when they sit on the plot edges.
+    Values are axis label values (linear units for "db" axes).
+    """
+    if scale in LOG_SCALES:
+        value_start, value_end = np.log10(value_start), np.log10(value_end)
+    slope = (value_end - value_start) / (pixel_end - pixel_start)
+    return AxisCalibration(slope, value_start - slope * pixel_start, scale=scale)
+
+
+def fit_axis(ticks, scale="linear", max_residual=None, min_points=2):
+    """
+    Least-squares fit of an axis mapping to OCR'd tick values and their pixel positions.
+
+    Ticks whose residual (in pixels) is too large are rejected one at a time
+    (worst first) and the line is refit, so a misread label does not skew
+    the whole axis.
+
+    Parameters:
+        ticks: Iterable of (value, pixel) pairs.
+        scale: "linear", "log10" or "db" (non-positive values are ignored for
+            the logarithmic scales). Tick values are the label values.
+        max_residual: Largest accepted residual in pixels. Defaults to a
+            quarter of the median spacing between ticks (at least 2 px).
+        min_points: Minimum number of inliers for a valid fit.
+
+    Returns:
+        AxisCalibration, or None if fewer than min_points ticks fit.
+    """
+    ticks = [(float(v), float(p)) for v, p in ticks]
+    if scale in LOG_SCALES:
+        ticks = [(v, p) for v, p in ticks if v > 0]
+    if len(ticks) < max(min_points, 2):
+        return None
+
+    values = np.array([v for v, _ in ticks])
+    pixels = np.array([p for _, p in ticks])
+    targets = np.log10(values) if scale in LOG_SCALES else values
+
+    if max_residual is None:
+        spacing = np.diff(np.sort(pixels))
+        spacing = spacing[spacing > 0]
+        max_residual = max(2.0, 0.25 * float(np.median(spacing))) if spacing.size else 2.0
+
+    keep = np.ones(len(ticks), dtype=bool)
+    while True:
+        if np.unique(pixels[keep]).size < 2:
+            return None
+        slope, intercept = np.polyfit(pixels[keep], targets[keep], 1)
+        if slope == 0:
+            return None
+        # Residuals measured along the axis, in pixels
+        residuals = np.abs((targets - intercept) / slope - pixels)
+        worst = int(np.argmax(np.where(keep, residuals, -1)))
+        if residuals[worst] <= max_residual:
+            break
+        # Need a third point to tell which one is wrong
+        if keep.sum() <= max(min_points, 2):
+            return None
+        keep[worst] = False
+
+    inliers = [t for t, k in zip(ticks, keep) if k]
+    outliers = [t for t, k in zip(ticks, keep) if not k]
+    rms = float(np.sqrt(np.mean(residuals[keep] ** 2)))
+    return AxisCalibration(slope, intercept, scale=scale, residual=rms, inliers=inliers, outliers=outliers)
@@ -0,0 +1,140 @@
+import cv2
+import numpy as np
+from utils import string_to_hsv
+from color_discovery import MIN_SATURATION
+
+
+def color_mask(hsv, color, delta=20, min_saturation=MIN_SATURATION):
+    """
+    Boolean mask of the saturated pixels of an HSV image within `delta` of
+    the hue of `color` (hue distance wraps around, so reds work too).
+    """
+    hue = int(string_to_hsv(color)[0])
+    difference = np.abs(hsv[:, :, 0].astype(np.int16) - hue)
+    distance = np.minimum(difference, 180 - difference)
+    return (distance <= delta) & (hsv[:, :, 1] >= min_saturation)
+
+
+def find_bars(mask, min_width=2, min_length=3, step=2):
+    """
+    Vertical bars of a binary mask from its column projection.
+
+    Columns with at least min_length foreground pixels are bar columns; runs
+    of them are bars, split where the top or bottom edge jumps by more than
+    `step` pixels (touching bars of different heights). Edges are averaged
+    over the columns of each bar with np.add.reduceat, without a per-bar loop.
+
+    Parameters:
+        mask: 2D boolean array.
+        min_width (int): Narrower runs (e.g. leftover lines) are ignored.
+        min_length (int): Minimum bar length in pixels.
+        step (int): Edge jump that separates two touching bars.
+
+    Returns:
+        np.ndarray: (N, 4) float array of [left, right, top, bottom] pixel
+        edges (right and bottom inclusive), left to right.
+    """
+    height, width = mask.shape
+    counts = np.count_nonzero(mask, axis=0)
+    filled = counts >= min_length
+    if not filled.any():
+        return np.empty((0, 4))
+    # First and last foreground row of every column
+    tops = np.argmax(mask, axis=0)
+    bottoms = height - 1 - np.argmax(mask[::-1], axis=0)
+
+    columns = np.nonzero(filled)[0]
+    breaks = (np.diff(columns) > 1) | (np.abs(np.diff(tops[columns])) > step) | \
+             (np.abs(np.diff(bottoms[columns])) > step)
+    starts = np.concatenate([[0], np.nonzero(breaks)[0] + 1])
+    lengths = np.diff(np.concatenate([starts, [len(columns)]]))
+    left = columns[starts]
+    right = columns[starts + lengths - 1]
+    top = np.add.reduceat(tops[columns], starts) / lengths
+    bottom = np.add.reduceat(bottoms[columns], starts) / lengths
+    bars = np.column_stack([left, right, top, bottom]).astype(np.float64)
+    return bars[lengths >= min_width]
+
+
+def value_baseline(calibration, offset, size):
+    """
+    Pixel (in mask coordinates) of the value 0 along the value axis, clipped
+    to the mask: bars grow from zero, or from the frame edge on the side of
+    zero when it is off the axis (as matplotlib draws them; log axes grow
+    from the bottom edge).
+
+    Parameters:
+        calibration: Calibration of the value axis.
+        offset (float): Position of the mask along that axis.
+        size (int): Extent of the mask along that axis.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        zero = float(calibration.to_pixel(0.0)) - offset
+    if np.isnan(zero):
+        zero = size
+    return float(np.clip(zero, 0, size))
+
+
+def bar_values(bars, x_calibration, y_calibration, offset=(0, 0), baseline=None):
+    """
+    (category position, value) of each bar in data units.
+
+    Of the two ends of a bar, the one closer to the baseline is its foot and
+    the other one gives the value, so bars below the baseline work too.
+
+    Parameters:
+        bars: Output of find_bars.
+        x_calibration, y_calibration: Calibrations in the coordinates the
+            bars are offset by.
+        offset: Position of the mask in those coordinates.
+        baseline (float): Row of the baseline in mask coordinates (default:
+            value 0 of y_calibration, see value_baseline, clipped to the bars).
+
+    Returns:
+        np.ndarray: (N, 2) array of [position, value].
+    """
+    if len(bars) == 0:
+        return np.empty((0, 2))
+    left, right, top, bottom = bars.T
+    if baseline is None:
+        baseline = value_baseline(y_calibration, offset[1], bottom.max() + 1)
+    # Pixel r spans [r, r + 1) in calibration coordinates
+    hanging = np.abs(top - baseline) < np.abs(bottom + 1 - baseline)
+    end = np.where(hanging, bottom + 1, top)
+    position = x_calibration.to_data((left + right + 1) / 2 + offset[0])
+    value = y_calibration.to_data(end + offset[1])
+    return np.column_stack([position, value])
+
+
+def extract_bars(image, colors, x_calibration, y_calibration, offset=(0, 0), delta=20, orientation="vertical"):
+    """
+    Bars of every color of a (grouped) bar chart.
+
+    Parameters:
+        image: BGR plot area.
+        colors: Bar colors (one series per color).
+        x_calibration, y_calibration: Axis calibrations (see
+            GraphDataExtractor.get_calibration).
+        offset: Position of the image in the calibration coordinates.
+        delta (int): Hue tolerance.
+        orientation (str): "vertical" bars (categories along x) or
+            "horizontal" (categories along y, values along x).
+
+    Returns:
+        list: One dict per color with "color" and "data_points" ((N, 2)
+        [position, value] array sorted by position).
+    """
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    series = []
+    for color in colors:
+        mask = color_mask(hsv, color, delta)
+        if orientation == "horizontal":
+            # Transposed, so categories run along the columns
+            baseline = value_baseline(x_calibration, offset[0], mask.shape[1])
+            points = bar_values(find_bars(mask.T), y_calibration, x_calibration, offset[::-1], baseline)
+        else:
+            baseline = value_baseline(y_calibration, offset[1], mask.shape[0])
+            points = bar_values(find_bars(mask), x_calibration, y_calibration, offset, baseline)
+        points = points[np.argsort(points[:, 0], kind="stable")]
+        series.append({"color": color, "data_points": points})
+    return series
@@ -0,0 +1,134 @@
+import io
+import os
+import time
+import argparse
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import matplotlib.pyplot as plt
+
+from run import main as run
+from presets import PRESETS
+from stage_cache import CalibrationCache
+
+# Settings matching the generated sample figures (1 px traces need a light thin)
+SAMPLE_SETTINGS = {"x_lim": [0, 180], "y_lim": [-30, 30], "thin": 2}
+
+
+def benchmark(images, settings, presets=tuple(PRESETS), repeat=3):
+    """
+    Times run.main on every image with each quality preset.
+
+    Each preset runs `repeat` times per image; the first run is a warm-up
+    (kernel caches, and the calibration cache when settings carry one, are
+    filled as in a long batch) and is not timed when repeat > 1.
+
+    Parameters:
+        images: dict of name -> BGR image.
+        settings (dict): run.main settings shared by all runs.
+        presets: Names of the presets to compare.
+        repeat (int): Runs per image and preset.
+
+    Returns:
+        list: One row per image and preset with the mean "seconds", the
+        number of "points", the "median_rcs" and its difference from the
+        accurate preset ("median_error", None without an accurate run).
+    """
+    rows = []
+    for name, image in images.items():
+        reference = None
+        for preset in sorted(presets, key=lambda p: p != "accurate"):
+            times = []
+            for i in range(repeat):
+                start = time.perf_counter()
+                result = run(image, SimpleNamespace(**settings, preset=preset))
+                if i > 0 or repeat == 1:
+                    times.append(time.perf_counter() - start)
+            median = result["median_rcs"]
+            median = float(median) if median is not None else None
+            if preset == "accurate":
+                reference = median
+            points = result["data_points"]
+            rows.append({
+                "image": name,
+                "preset": preset,
+                "seconds": float(np.mean(times)),
+                "points": len(points) if points is not None else 0,
+                "median_rcs": median,
+                "median_error": abs(median - reference) if median is not None and reference is not None else None,
+            })
+    return rows
+
+
+def sample_images(dpis=(150, 200, 300)):
+    """
+    Renders the sample sine fixtures used when no images are given.
+
+    Parameters:
+        dpis: Resolutions of the fixtures, one image each.
+
+    Returns:
+        dict: name -> BGR image; a matplotlib sine plot with the
+        SAMPLE_SETTINGS limits per resolution.
+    """
+    x = np.linspace(0, 180, 400)
+    y = 10 * np.sin(np.deg2rad(2 * x))
+
+    images = {}
+    for dpi in dpis:
+        fig, ax = plt.subplots(figsize=(8, 6))
+        ax.plot(x, y, color="blue", linewidth=1)
+        ax.set_xlim(*SAMPLE_SETTINGS["x_lim"])
+        ax.set_ylim(*SAMPLE_SETTINGS["y_lim"])
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", dpi=dpi)
+        plt.close(fig)
+        images[f"sine_{dpi}dpi.png"] = cv2.imdecode(np.frombuffer(buffer.getvalue(), np.uint8), cv2.IMREAD_COLOR)
+    return images
+
+
+def load_images(paths):
+    """Reads the images in `paths` (files or folders of .png/.jpg files)."""
+    images = {}
+    for path in paths:
+        files = [os.path.join(path, f) for f in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+        for file in files:
+            if file.lower().endswith((".png", ".jpg", ".jpeg")):
+                image = cv2.imread(file)
+                if image is not None:
+                    images[os.path.basename(file)] = image
+    return images
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the speed and accuracy of the quality presets.")
+    parser.add_argument("paths", nargs="*", help="Images or folders (default: generated sample sine figures).")
+    parser.add_argument("--target_color", type=str, default="blue", help="Color of the data trace.")
+    parser.add_argument("--thin", type=int, default=None, help="Thin factor (default: 6, 2 for the samples).")
+    parser.add_argument("--x_lim", type=float, nargs=2, default=None, help="Manual x axis limits (skips the axis OCR).")
+    parser.add_argument("--y_lim", type=float, nargs=2, default=None, help="Manual y axis limits (skips the axis OCR).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per image and preset.")
+    parser.add_argument("--o", type=str, default="benchmark", help="Output folder of the runs.")
+    cli_args = parser.parse_args()
+
+    settings = {"target_color": cli_args.target_color, "thin": 6, "output_folder": cli_args.o,
+                "isMedian": True, "calibration_cache": CalibrationCache()}
+    if cli_args.paths:
+        images = load_images(cli_args.paths)
+        if not images:
+            parser.error(f"No images found in {', '.join(cli_args.paths)}")
+    else:
+        images = sample_images()
+        settings.update(SAMPLE_SETTINGS)
+    if cli_args.thin is not None:
+        settings["thin"] = cli_args.thin
+    if cli_args.x_lim and cli_args.y_lim:
+        settings.update(x_lim=cli_args.x_lim, y_lim=cli_args.y_lim)
+    rows = benchmark(images, settings, repeat=cli_args.repeat)
+
+    print(f"{'image':<30} {'preset':<10} {'seconds':>8} {'points':>7} {'median':>9} {'error':>7}")
+    for row in rows:
+        median = f"{row['median_rcs']:.2f}" if row["median_rcs"] is not None else "-"
+        error = f"{row['median_error']:.2f}" if row["median_error"] is not None else "-"
+        print(f"{row['image']:<30} {row['preset']:<10} {row['seconds']:>8.3f} {row['points']:>7} {median:>9} {error:>7}")
@@ -0,0 +1,102 @@
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+
+class BufferPool:
+    """
+    Pool of preallocated NumPy arrays keyed on (shape, dtype).
+
+    Long-running processes (the Flask app) handle many images of the same
+    size. Handing buffers back to the pool after each stage lets the next
+    request reuse them instead of allocating full-size arrays again.
+
+    Buffers returned by `acquire` are NOT zeroed; callers must fully
+    overwrite them (e.g. pass them as `dst=` to OpenCV).
+
+    Parameters:
+        max_per_key (int): Maximum number of idle buffers kept per (shape, dtype).
+        max_bytes (int): Upper bound on the total size of idle buffers.
+    """
+
+    def __init__(self, max_per_key=8, max_bytes=256 * 1024 * 1024):
+        self.max_per_key = max_per_key
+        self.max_bytes = max_bytes
+        self._free = defaultdict(list)
+        self._pooled_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.releases = 0
+        self.discards = 0
+
+    @staticmethod
+    def _key(shape, dtype):
+        return (tuple(int(s) for s in shape), np.dtype(dtype).str)
+
+    def acquire(self, shape, dtype=np.uint8):
+        """Returns an uninitialized array of the given shape and dtype."""
+        key = self._key(shape, dtype)
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                buffer = free.pop()
+                self._pooled_bytes -= buffer.nbytes
+                self.hits += 1
+                return buffer
+            self.misses += 1
+        return np.empty(key[0], dtype=np.dtype(key[1]))
+
+    def acquire_like(self, array):
+        """Returns an uninitialized array with the shape and dtype of `array`."""
+        return self.acquire(array.shape, array.dtype)
+
+    def release(self, *buffers):
+        """
+        Returns buffers to the pool. Views, non-contiguous arrays and None
+        are ignored so callers can release unconditionally.
+        """
+        for buffer in buffers:
+            if buffer is None or buffer.base is not None or not buffer.flags.c_contiguous:
+                continue
+            key = self._key(buffer.shape, buffer.dtype)
+            with self._lock:
+                free = self._free[key]
+                if any(b is buffer for b in free):
+                    continue
+                if len(free) >= self.max_per_key or self._pooled_bytes + buffer.nbytes > self.max_bytes:
+                    self.discards += 1
+                    continue
+                free.append(buffer)
+                self._pooled_bytes += buffer.nbytes
+                self.releases += 1
+
+    def clear(self):
+        """Drops all idle buffers."""
+        with self._lock:
+            self._free.clear()
+            self._pooled_bytes = 0
+
+    def stats(self):
+        """Returns pool usage counters for monitoring."""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "releases": self.releases,
+                "discards": self.discards,
+                "idle_buffers": sum(len(free) for free in self._free.values()),
+                "idle_bytes": self._pooled_bytes,
+            }
+
+
+# One pool per worker process
+default_pool = BufferPool()
+
+
+def get_pool():
+    """Returns the process-wide buffer pool."""
+    return default_pool
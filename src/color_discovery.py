@@ -0,0 +1,125 @@
+import cv2
+import numpy as np
+from find_plot_corners import detect_plot_corners
+
+# Pixels filter_colors treats as a colored trace (see utils.filter_colors)
+MIN_SATURATION = 150
+MIN_VALUE = 50
+
+
+def sample_pixels(image, max_samples=20000, seed=0):
+    """Up to max_samples pixels of a BGR image, as an (N, 1, 3) array (uniform random sample)."""
+    pixels = image.reshape(-1, image.shape[-1])[:, :3]
+    if len(pixels) > max_samples:
+        rng = np.random.default_rng(seed)
+        pixels = pixels[rng.choice(len(pixels), max_samples, replace=False)]
+    return np.ascontiguousarray(pixels).reshape(-1, 1, 3)
+
+
+def hue_peaks(hues, min_count, smooth=5):
+    """
+    Peaks of the circular hue histogram (OpenCV hues, 0-179) with at least
+    min_count samples within +-smooth/2 bins, strongest first.
+    """
+    histogram = np.bincount(hues, minlength=180).astype(np.float64)
+    half = smooth // 2
+    # Circular moving sum so red (0 and 179) stays one peak
+    padded = np.concatenate([histogram[-half:], histogram, histogram[:half]]) if half else histogram
+    smoothed = np.convolve(padded, np.ones(smooth), mode="valid")
+    is_peak = (smoothed >= np.roll(smoothed, 1)) & (smoothed > np.roll(smoothed, -1)) & (smoothed >= min_count)
+    peaks = np.nonzero(is_peak)[0]
+    return peaks[np.argsort(smoothed[peaks])[::-1]]
+
+
+def hue_distance(hues, hue):
+    """Circular distance between OpenCV hues."""
+    difference = np.abs(hues.astype(np.int16) - int(hue))
+    return np.minimum(difference, 180 - difference)
+
+
+def discover_colors(image, max_colors=5, max_samples=20000, min_fraction=0.02, min_saturation=MIN_SATURATION,
+                    min_value=MIN_VALUE, seed=0):
+    """
+    Dominant trace colors of a plot image.
+
+    A bounded random sample of the pixels is converted to HSV; the saturated
+    ones (the pixels filter_colors can isolate, so black, white and grey are
+    ignored) are clustered by hue: peaks of the circular hue histogram seed
+    the clusters and every sample joins the nearest peak.
+
+    Parameters:
+        image: BGR image, ideally cropped to the plot area.
+        max_colors (int): Maximum number of colors returned.
+        max_samples (int): Size of the pixel sample (bounds the cost).
+        min_fraction (float): Smallest cluster, as a fraction of the saturated samples.
+        min_saturation, min_value: HSV thresholds of a colored pixel.
+
+    Returns:
+        list: Dicts with "color" (hex, usable as target_color), "hue",
+        "delta" (hue tolerance covering the cluster), "pixels" (estimated
+        number of pixels in the image) and "fraction" (of the colored
+        pixels), largest first.
+    """
+    sample = sample_pixels(image, max_samples, seed)
+    hsv = cv2.cvtColor(sample, cv2.COLOR_BGR2HSV).reshape(-1, 3)
+    colored = (hsv[:, 1] >= min_saturation) & (hsv[:, 2] >= min_value)
+    if not colored.any():
+        return []
+    hues = hsv[colored, 0]
+    bgr = sample.reshape(-1, 3)[colored]
+
+    peaks = hue_peaks(hues, max(1, min_fraction * len(hues)))[:max_colors]
+    if len(peaks) == 0:
+        return []
+    # Assign every colored sample to its nearest peak
+    distances = np.stack([hue_distance(hues, peak) for peak in peaks])
+    labels = np.argmin(distances, axis=0)
+
+    # Scale sample counts back to the whole image
+    scale = image.shape[0] * image.shape[1] / len(sample)
+    colors = []
+    for index, peak in enumerate(peaks):
+        members = labels == index
+        count = int(np.count_nonzero(members))
+        if count < min_fraction * len(hues):
+            continue
+        b, g, r = np.median(bgr[members], axis=0).astype(int)
+        spread = np.percentile(distances[index, members], 95)
+        colors.append({
+            "color": f"#{r:02x}{g:02x}{b:02x}",
+            "hue": int(peak),
+            "delta": int(np.clip(np.ceil(spread) + 5, 10, 30)),
+            "pixels": int(round(count * scale)),
+            "fraction": round(count / len(hues), 3),
+        })
+    colors.sort(key=lambda color: color["pixels"], reverse=True)
+    return colors
+
+
+def plot_colors(image, corners=None, min_corner_confidence=0.3, **kwargs):
+    """
+    discover_colors inside the detected plot frame (the whole image if no
+    confident frame is found), so legend boxes and titles outside it are ignored.
+
+    Parameters:
+        image: BGR image.
+        corners: PlotCorners of the image if already detected.
+        min_corner_confidence (float): Minimum frame confidence to crop to it.
+        **kwargs: Passed to discover_colors.
+
+    Returns:
+        dict with "colors" (see discover_colors) and "plot_box"
+        ([left, top, right, bottom] or None).
+    """
+    if corners is None:
+        corners = detect_plot_corners(image)
+    box = None
+    region = image
+    if corners.confidence >= min_corner_confidence:
+        (x0, y1), (x1, y0) = corners.origin, corners.top_right
+        left, right = sorted((x0, x1))
+        top, bottom = sorted((y0, y1))
+        if right > left and bottom > top:
+            box = [int(left), int(top), int(right), int(bottom)]
+            region = image[top:bottom, left:right]
+    return {"colors": discover_colors(region, **kwargs), "plot_box": box}
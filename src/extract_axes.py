@@ -8,8 +8,278 @@ import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 from PIL import Image
 import math
+import numpy as np
+from ocr_cache import get_ocr_cache
 
-def extract_axes_labels(img_input, lower_left, factor=0.004, DEBUG=False, debug_file_path="output/axes-extraction.png"):
+
+def extract_numbers(text):
+    """
+    Extracts all numbers (including negatives and decimals) from a text string.
+    """
+    text = text.replace("O", "0").replace("_","-").replace("$","3").replace("- ","-").replace("~","-")
+    # Replace 'L' with '1' if it is preceded or followed by a digit.
+    text = re.sub(r'(?<=\d)L|L(?=\d)', '1', text)
+    pattern = r'[‐–—−-]?\d+(?:\.\d+)?'
+    matches = re.findall(pattern, text)
+    return [float(num.replace("—", "-").replace("–", "-").replace("‐", "-").replace("−", "-")) for num in matches]
+
+
+def locate_tick_labels(binary, axis, min_area=3, max_gap=0.6):
+    """
+    Finds tight bounding boxes around the tick labels in a thresholded axis ROI.
+
+    Glyphs are found with connected components on the dark pixels. Components
+    touching the ROI edge next to the plot (tick marks, clipped frame lines)
+    are dropped, the rest are grouped into text rows and then merged into
+    labels wherever the horizontal gap is small compared with the glyph height.
+
+    Parameters:
+        binary: Thresholded ROI (dark text on white), as passed to OCR.
+        axis: "x" for the strip below the plot, "y" for the strip left of it.
+        min_area: Smallest component (in pixels) treated as a glyph.
+        max_gap: Largest gap between glyphs of one label, as a fraction of
+                 the typical glyph height.
+
+    Returns:
+        list of (x, y, w, h) boxes in ROI coordinates, ordered left to right
+        for the x axis and bottom to top for the y axis.
+    """
+    ink = (binary < 128).astype(np.uint8)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    stats = stats[1:]
+    if count <= 1:
+        return []
+
+    x, y, w, h, area = (stats[:, i] for i in range(5))
+    height, width = binary.shape[:2]
+    if axis == "x":
+        touches_plot = y == 0
+    else:
+        touches_plot = x + w >= width
+    glyphs = stats[(area >= min_area) & ~touches_plot]
+    if len(glyphs) == 0:
+        return []
+
+    glyph_height = np.percentile(glyphs[:, 3], 75)
+    gap = max(2.0, max_gap * glyph_height)
+
+    # Group glyphs into text rows by vertical overlap of their centers
+    glyphs = glyphs[np.argsort(glyphs[:, 1] + glyphs[:, 3] / 2)]
+    rows = []
+    for glyph in glyphs:
+        center = glyph[1] + glyph[3] / 2
+        if rows and abs(center - rows[-1][-1][1] - rows[-1][-1][3] / 2) <= glyph_height / 2:
+            rows[-1].append(glyph)
+        else:
+            rows.append([glyph])
+
+    # Merge neighbouring glyphs of a row into labels
+    labels = []
+    for row in rows:
+        row = sorted(row, key=lambda g: g[0])
+        x0, y0, x1, y1 = row[0][0], row[0][1], row[0][0] + row[0][2], row[0][1] + row[0][3]
+        merged = []
+        for gx, gy, gw, gh, _ in row[1:]:
+            if gx - x1 <= gap:
+                x1, y0, y1 = max(x1, gx + gw), min(y0, gy), max(y1, gy + gh)
+            else:
+                merged.append((x0, y0, x1 - x0, y1 - y0))
+                x0, y0, x1, y1 = gx, gy, gx + gw, gy + gh
+        merged.append((x0, y0, x1 - x0, y1 - y0))
+        labels.append(merged)
+
+    # Tick labels are too short to be anything but text-height boxes
+    labels = [[b for b in row if b[3] >= 0.5 * glyph_height] for row in labels]
+    labels = [row for row in labels if row]
+    if not labels:
+        return []
+
+    if axis == "x":
+        # The row closest to the axis holds the tick labels (below it: the axis title)
+        return sorted(labels[0], key=lambda b: b[0])
+
+    # y axis: one label per row, the one nearest the axis; rotated titles and
+    # other text further left are dropped
+    boxes = [max(row, key=lambda b: b[0] + b[2]) for row in labels]
+    right = max(b[0] + b[2] for b in boxes)
+    boxes = [b for b in boxes if b[0] + b[2] >= right - 1.5 * glyph_height]
+    return sorted(boxes, key=lambda b: -b[1])
+
+
+def ocr_label_crops(crops, config=r'--psm 6', padding=10, cache=None):
+    """
+    OCRs many small label crops with a single Tesseract call.
+
+    The crops are stacked into one mosaic (one label per line, separated by
+    white padding); each recognized word is assigned back to the crop whose
+    line contains it. Crops already in the OCR cache are not OCR'd again.
+
+    Parameters:
+        cache: OCRCache to use (default: the process-wide cache).
+
+    Returns:
+        list of str: The text of each crop (empty if nothing was read).
+    """
+    if not crops:
+        return []
+    cache = cache if cache is not None else get_ocr_cache()
+    keys = [cache.key(crop, config, kind="label") for crop in crops]
+    texts = [cache.get(key) for key in keys]
+    missing = [index for index, text in enumerate(texts) if text is None]
+    if missing:
+        read = _ocr_mosaic([crops[index] for index in missing], config, padding)
+        for index, text in zip(missing, read):
+            cache.put(keys[index], text)
+            texts[index] = text
+    return texts
+
+
+def _ocr_mosaic(crops, config, padding):
+    mosaic = np.full((sum(c.shape[0] for c in crops) + padding * (len(crops) + 1),
+                      max(c.shape[1] for c in crops) + 2 * padding), 255, np.uint8)
+    rows = []
+    top = padding
+    for crop in crops:
+        h, w = crop.shape[:2]
+        mosaic[top:top + h, padding:padding + w] = crop
+        rows.append((top - padding / 2, top + h + padding / 2))
+        top += h + padding
+
+    data = pytesseract.image_to_data(mosaic, config=config, output_type=pytesseract.Output.DICT)
+    texts = [[] for _ in crops]
+    for word, word_top, word_height in zip(data["text"], data["top"], data["height"]):
+        if not word.strip():
+            continue
+        center = word_top + word_height / 2
+        for index, (row_top, row_bottom) in enumerate(rows):
+            if row_top <= center < row_bottom:
+                texts[index].append(word)
+                break
+    return [" ".join(words) for words in texts]
+
+
+def ocr_strip(image, config, cache=None):
+    """pytesseract.image_to_string through the OCR cache."""
+    cache = cache if cache is not None else get_ocr_cache()
+    return cache.cached(image, config, lambda img, cfg: pytesseract.image_to_string(img, config=cfg))
+
+
+def label_boxes(binary, axis, offset=(0, 0), origin=None):
+    """
+    Tick label boxes of one axis ROI (see locate_tick_labels), in ROI coordinates.
+
+    Parameters:
+        binary: Thresholded ROI.
+        axis: "x" or "y".
+        offset: (x, y) position of the ROI in the full image.
+        origin: Optional plot origin (x, y) in the full image. Labels lying
+                entirely before it (x axis) or below it (y axis) belong to
+                the other axis and are dropped.
+    """
+    boxes = locate_tick_labels(binary, axis)
+    if origin is not None:
+        if axis == "x":
+            boxes = [b for b in boxes if offset[0] + b[0] + b[2] > origin[0]]
+        else:
+            boxes = [b for b in boxes if offset[1] + b[1] < origin[1]]
+    return boxes
+
+
+def ticks_from_labels(boxes, texts, axis, offset=(0, 0)):
+    """
+    Pairs OCR'd label values with their pixel position along the axis.
+
+    Returns:
+        list of (value, pixel): pixel is the label center (image column for
+        x, image row for y) in full-image coordinates. Labels without a
+        number are skipped.
+    """
+    ticks = []
+    for (x, y, w, h), text in zip(boxes, texts):
+        numbers = extract_numbers(text)
+        if not numbers:
+            continue
+        pixel = offset[0] + x + w / 2 if axis == "x" else offset[1] + y + h / 2
+        ticks.append((numbers[0], pixel))
+    return ticks
+
+
+def detect_axis_scale(values, pixels=None, min_ticks=3):
+    """
+    Guesses whether an axis is linear or logarithmic from its tick labels.
+
+    With pixel positions, the scale whose straight-line fit (value or
+    log10(value) against pixel) leaves the smaller relative residual wins.
+    Without them, a log axis is recognized by a constant ratio rather than a
+    constant step between consecutive labels (1, 10, 100, ...).
+
+    Parameters:
+        values: Tick values in axis order.
+        pixels: Optional pixel positions of the ticks.
+        min_ticks: Fewer ticks than this are always reported as linear.
+
+    Returns:
+        "linear" or "log10"
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.size < min_ticks or np.any(values <= 0):
+        return "linear"
+    logs = np.log10(values)
+
+    if pixels is not None and len(pixels) == values.size and np.ptp(pixels) > 0:
+        pixels = np.asarray(pixels, dtype=np.float64)
+
+        def misfit(targets):
+            span = np.ptp(targets)
+            if span == 0:
+                return np.inf
+            residuals = targets - np.polyval(np.polyfit(pixels, targets, 1), pixels)
+            return np.sqrt(np.mean(residuals ** 2)) / span
+
+        return "log10" if misfit(logs) < 0.5 * misfit(values) else "linear"
+
+    def variation(steps):
+        mean = np.mean(steps)
+        return np.std(steps) / abs(mean) if mean else np.inf
+
+    if variation(np.diff(logs)) < 0.1 and variation(np.diff(values)) > 0.5:
+        return "log10"
+    return "linear"
+
+
+def extract_axes_ticks(img_input, lower_left, factor=0.004, DEBUG=False, debug_file_path="output/axes-extraction.png"):
+    """
+    Like extract_axes_labels, but returns each tick value with its pixel
+    position: (x_ticks, y_ticks) as lists of (value, pixel).
+    """
+    result = extract_axes(img_input, lower_left, factor, DEBUG, debug_file_path, localize=True)
+    return result["x_ticks"], result["y_ticks"]
+
+
+def extract_axes_labels(img_input, lower_left, factor=0.004, DEBUG=False, debug_file_path="output/axes-extraction.png", localize=True):
+    """
+    Reads the x and y axis tick values next to the plot origin.
+
+    With localize=True only tight crops around the tick labels are OCR'd
+    (see locate_tick_labels); the full ROI strips are OCR'd if fewer than two
+    labels are read that way.
+
+    Returns:
+        (x_axis_values, y_axis_values)
+    """
+    result = extract_axes(img_input, lower_left, factor, DEBUG, debug_file_path, localize=localize)
+    return result["x_axis"], result["y_axis"]
+
+
+def extract_axes(img_input, lower_left, factor=0.004, DEBUG=False, debug_file_path="output/axes-extraction.png", localize=True):
+    """
+    Reads the axis tick labels next to the plot origin.
+
+    Returns:
+        dict with "x_axis"/"y_axis" (tick values), "x_ticks"/"y_ticks"
+        ((value, pixel) pairs; empty when the values came from whole-strip OCR)
+        and "x_scale"/"y_scale" ("linear" or "log10", see detect_axis_scale).
+    """
 
     if len(img_input.shape) > 2:
         img = cv2.cvtColor(img_input, cv2.COLOR_RGB2GRAY)
@@ -81,28 +351,37 @@ def extract_axes_labels(img_input, lower_left, factor=0.004, DEBUG=False, debug_
     y_axis_preprocessed = preprocess_for_ocr(y_axis_region)
     x_axis_preprocessed = preprocess_for_ocr(x_axis_region)
 
-    # Use pytesseract to extract text from the cropped regions
-    y_axis_text = pytesseract.image_to_string(y_axis_preprocessed, config=r'--psm 6')
-    x_axis_text = pytesseract.image_to_string(x_axis_preprocessed, config=r'--psm 7')
+    x_ticks, y_ticks = [], []
+    x_axis_text = y_axis_text = ""
+    if localize:
+        # OCR only the tick label glyph clusters (one mosaic for both axes),
+        # not the mostly blank strips
+        x_offset, y_offset = (0, x_roi_top), (y_roi_left, 0)
+        x_boxes = label_boxes(x_axis_preprocessed, "x", x_offset, origin=lower_left)
+        y_boxes = label_boxes(y_axis_preprocessed, "y", y_offset, origin=lower_left)
+        crops = [x_axis_preprocessed[y:y + h, x:x + w] for x, y, w, h in x_boxes]
+        crops += [y_axis_preprocessed[y:y + h, x:x + w] for x, y, w, h in y_boxes]
+        texts = ocr_label_crops(crops)
+        x_ticks = ticks_from_labels(x_boxes, texts[:len(x_boxes)], "x", x_offset)
+        y_ticks = ticks_from_labels(y_boxes, texts[len(x_boxes):], "y", y_offset)
+        if DEBUG and useOpenCV:
+            for boxes, (dx, dy) in ((x_boxes, x_offset), (y_boxes, y_offset)):
+                for (x, y, w, h) in boxes:
+                    cv2.rectangle(img_color, (x + dx, y + dy), (x + dx + w, y + dy + h), (255, 0, 0), thickness=2)
+            cv2.imwrite(debug_file_path, img_color)
 
-    
+    x_axis_values = [value for value, _ in x_ticks]
+    y_axis_values = [value for value, _ in y_ticks]
 
-
-    def extract_numbers(text):
-        """
-        Extracts all numbers (including negatives and decimals) from a text string.
-        """
-        text = text.replace("O", "0").replace("_","-").replace("$","3").replace("- ","-").replace("~","-")
-        # Replace 'L' with '1' if it is preceded or followed by a digit.
-        text = re.sub(r'(?<=\d)L|L(?=\d)', '1', text)
-        pattern = r'[‐–—-]?\d+(?:\.\d+)?'
-        matches = re.findall(pattern, text)
-        return [float(num.replace("—", "-").replace("–", "-").replace("‐", "-")) for num in matches]
-  
-    # Get OCR numbers; note that we reverse y-axis values since OCR order might be flipped
-    y_axis_values = extract_numbers(y_axis_text)
-    x_axis_values = extract_numbers(x_axis_text)
-    y_axis_values = y_axis_values[::-1]
+    # Fall back to the full strips; note that we reverse y-axis values since OCR order might be flipped
+    if len(x_axis_values) < 2:
+        x_axis_text = ocr_strip(x_axis_preprocessed, r'--psm 7')
+        x_axis_values = extract_numbers(x_axis_text)
+        x_ticks = []
+    if len(y_axis_values) < 2:
+        y_axis_text = ocr_strip(y_axis_preprocessed, r'--psm 6')
+        y_axis_values = extract_numbers(y_axis_text)[::-1]
+        y_ticks = []
 
     if DEBUG:
         print("X-axis Text:", x_axis_text)
@@ -166,7 +445,14 @@ def extract_axes_labels(img_input, lower_left, factor=0.004, DEBUG=False, debug_
 
     #   y_axis_values = sanitize_axis_values(y_axis_values)
 
-    return x_axis_values, y_axis_values
+    # Linear vs log spacing, from the label positions when they are known
+    x_scale = detect_axis_scale(*zip(*x_ticks)) if len(x_ticks) >= 3 else detect_axis_scale(x_axis_values)
+    y_scale = detect_axis_scale(*zip(*y_ticks)) if len(y_ticks) >= 3 else detect_axis_scale(y_axis_values)
+    if DEBUG:
+        print(f"Detected axis scales: x={x_scale}, y={y_scale}")
+
+    return {"x_axis": x_axis_values, "y_axis": y_axis_values, "x_ticks": x_ticks, "y_ticks": y_ticks,
+            "x_scale": x_scale, "y_scale": y_scale}
 
 # Main execution for testing purposes
 if __name__ == "__main__":
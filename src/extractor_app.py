@@ -2,15 +2,44 @@ import os
 from flask import Flask, request, jsonify, render_template, url_for
 import cv2
 import numpy as np
-from run import main as run
+from run import main as run, result_to_json, MODES
 from types import SimpleNamespace
 from pdf_extract import extract as extract_images_from_pdf
 from pdf_extract import save_images_to_pdf
+from pdf_pipeline import process_pdf
+from plot_classifier import MIN_PLOT_SCORE
+from buffer_pool import get_pool
+from kernel_cache import cache_info as kernel_cache_info
+from axis_calibration import SCALES
+from ocr_cache import get_ocr_cache
+from color_discovery import plot_colors
+from stage_cache import default_store, get_session_cache, hash_bytes
+from autotune import autotune
+from presets import PRESETS
 
 
 
 app = Flask(__name__)
 
+AXIS_SCALES = ("auto",) + SCALES
+
+def form_flag(name, default=False):
+    """Reads a checkbox/boolean form field (checked checkboxes submit "on")."""
+    value = request.form.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "on", "yes")
+
+def form_numbers(name, count):
+    """Reads a comma-separated list of `count` numbers, or None if the field is empty."""
+    value = request.form.get(name, "").strip()
+    if not value:
+        return None
+    numbers = [float(v) for v in value.split(",")]
+    if len(numbers) != count:
+        raise ValueError(f"{name} must have {count} comma-separated numbers")
+    return numbers
+
 # @app.route('/')
 @app.route('/')
 def index():
@@ -24,6 +53,12 @@ def index2():
 def pdf():
     return render_template("pdf.html")
 
+@app.route('/stats')
+def stats():
+    # Worker-level counters for monitoring
+    return jsonify({"buffer_pool": get_pool().stats(), "kernel_cache": kernel_cache_info(),
+                    "ocr_cache": get_ocr_cache().stats(), "sessions": default_store.stats()})
+
 @app.route('/extractpdf', methods=['POST'])
 def extractpdf():
     if 'file' not in request.files:
@@ -63,24 +98,25 @@ def extractpdf():
     return jsonify(result)
     # return jsonify({'message': 'PDF images extracted successfully'})
 
-@app.route('/extract', methods=['POST'])
-def extract():
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
-
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
-
-    # Read the image file
-    file_bytes = np.frombuffer(file.read(), np.uint8)
-    image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+def extraction_settings(output_folder="static/images"):
+    """
+    Reads the run.main settings shared by /extract and /extractpdfdata from
+    the request form (or default values if missing).
 
-    # Get parameters from the form (or use default values if missing)
+    Raises:
+        ValueError: If a field has an invalid value.
+    """
     target_color = request.form.get('target_color', '#034730')
-    delta = int(request.form.get('delta', 20))
+    delta = request.form.get('delta', '').strip()
+    delta = int(delta) if delta else None
+    if form_flag("auto_color"):
+        # Resolved by run.main from the dominant trace color (color_discovery),
+        # with the hue tolerance discovered for it
+        target_color = "auto"
+        delta = None
     kernel_size = int(request.form.get('kernel_size', 1))
     thin = int(request.form.get('thin', 6))
+    min_component_area = int(request.form.get('min_component_area', 0))
     dpi = int(request.form.get('dpi', 300))
     classification = request.form.get('classification', 'SAMPLE')
     title = request.form.get("title", "Example Figure")
@@ -88,10 +124,26 @@ def extract():
     y_label = request.form.get("y_label", "Y Axis")
     isMedian = request.form.get("isMedian", True)
     debug = request.form.get("debug", False)
-
-    # If images is None, then the file was not a valid image
-    if image is None:
-        return jsonify({'error': 'Invalid image file'}), 400
+    deskew = form_flag("deskew")
+    preset = request.form.get("preset") or None
+    if preset is not None and preset not in PRESETS:
+        raise ValueError(f'Preset must be one of {", ".join(PRESETS)}')
+    mode = request.form.get("mode", "line")
+    if mode not in MODES:
+        raise ValueError(f'Mode must be one of {", ".join(MODES)}')
+    theta_zero = float(request.form.get("theta_zero", 90))
+    theta_direction = -1 if form_flag("theta_clockwise", default=True) else 1
+    bar_colors = [c.strip() for c in request.form.get("bar_colors", "").split(",") if c.strip()] or None
+    bar_orientation = request.form.get("bar_orientation", "vertical")
+    if bar_orientation not in ("vertical", "horizontal"):
+        raise ValueError('Bar orientation must be "vertical" or "horizontal"')
+    tracking = form_flag("tracking")
+    traces = request.form.get("traces", "").strip()
+    traces = int(traces) if traces else None
+    x_scale = request.form.get("x_scale", "auto")
+    y_scale = request.form.get("y_scale", "auto")
+    if x_scale not in AXIS_SCALES or y_scale not in AXIS_SCALES:
+        raise ValueError(f'Axis scale must be one of {", ".join(AXIS_SCALES)}')
 
     # Check the checkbox: if it is unchecked, then get axis limits;
     # note: when a checkbox is checked its value is submitted.
@@ -114,13 +166,19 @@ def extract():
         x_lim = None
         y_lim = None
 
+    # Optional region of interest: a pixel box and/or data ranges
+    roi = form_numbers("roi", 4)
+    x_range = form_numbers("x_range", 2)
+    y_range = form_numbers("y_range", 2)
+
     settings = {
         "target_color": target_color,
         "delta": delta,
         "kernel_size": kernel_size,
         "thin": thin,
+        "min_component_area": min_component_area,
         "debug": debug,
-        "output_folder": "static/images",
+        "output_folder": output_folder,
         "classification": classification,
         'dpi': dpi,
         "x_lim": x_lim,
@@ -128,19 +186,69 @@ def extract():
         "title": title,
         "x_label": x_label,
         "y_label": y_label,
-        "isMedian": isMedian
+        "isMedian": isMedian,
+        "deskew": deskew,
+        "mode": mode,
+        "r_lim": form_numbers("r_lim", 2),
+        "theta_zero": theta_zero,
+        "theta_direction": theta_direction,
+        "bar_colors": bar_colors,
+        "bar_orientation": bar_orientation,
+        "suppress_grid": form_flag("suppress_grid"),
+        "suppress_legend": form_flag("suppress_legend"),
+        "panels": form_flag("panels"),
+        "tracking": tracking,
+        "traces": traces,
+        "x_scale": x_scale,
+        "y_scale": y_scale,
+        "roi": roi,
+        "x_range": x_range,
+        "y_range": y_range,
+        "preset": preset
     }
+    if preset is not None:
+        # The preset sets the output resolution
+        del settings["dpi"]
+    return settings
+
+
+@app.route('/extract', methods=['POST'])
+def extract():
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file part'}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No selected file'}), 400
+
+    # Read the image file. Within an interactive session the decoded image and
+    # the pipeline stages are reused when the same file is submitted again
+    data = file.read()
+    stage_cache = get_session_cache(request.form.get('session_id'))
+    image_key = hash_bytes(data)
+    decode = lambda: cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    image = stage_cache.get_or_compute("decode", image_key, decode) if stage_cache else decode()
+
+    # Get parameters from the form (or use default values if missing)
+    try:
+        settings = extraction_settings()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # If images is None, then the file was not a valid image
+    if image is None:
+        return jsonify({'error': 'Invalid image file'}), 400
 
     # Convert the dictionary to an object with attributes
-    args = SimpleNamespace(**settings)
+    args = SimpleNamespace(**settings, stage_cache=stage_cache, image_key=image_key)
 
-    result = run(image, args)
-    
-    if hasattr(result["data_points"], "tolist"):
-        result["data_points"] = result["data_points"].astype(float).tolist()
-    
-    if hasattr(result["median_rcs"], "item"):
-        result["median_rcs"] = float(result["median_rcs"].item())
+    # Auto-tune: try a grid of delta/kernel_size/thin and keep the best series
+    extract_image = autotune if form_flag("autotune") else run
+    try:
+        result = result_to_json(extract_image(image, args))
+    except ValueError as e:
+        # e.g. a region of interest outside the plot area
+        return jsonify({'error': str(e)}), 400
 
     # Include the extracted_image URL in the result if applicable
     # result["extracted_image"] = url_for('static', filename='images/extracted-image.png')
@@ -148,5 +256,53 @@ def extract():
     return jsonify(result)
 
 
+@app.route('/colors', methods=['POST'])
+def colors():
+    # Dominant trace colors inside the plot frame, usable as target_color
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file part'}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No selected file'}), 400
+
+    image = cv2.imdecode(np.frombuffer(file.read(), np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return jsonify({'error': 'Invalid image file'}), 400
+
+    try:
+        max_colors = int(request.form.get('max_colors', 5))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(plot_colors(image, max_colors=max_colors))
+
+
+@app.route('/extractpdfdata', methods=['POST'])
+def extractpdfdata():
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file part'}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No selected file'}), 400
+
+    output_folder = "static/images/pdfdata"
+    try:
+        settings = extraction_settings(output_folder)
+        min_plot_score = float(request.form.get('min_plot_score', MIN_PLOT_SCORE))
+        vector_dpi = int(request.form.get('vector_dpi', 200))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # PyMuPDF opens the upload from memory, nothing is written until the per-figure outputs
+    try:
+        manifest = process_pdf(file.read(), SimpleNamespace(**settings), output_folder, min_plot_score=min_plot_score,
+                               vector=form_flag("vector", default=True), vector_dpi=vector_dpi)
+    except RuntimeError as e:
+        return jsonify({'error': f'Invalid PDF file: {e}'}), 400
+
+    return jsonify(manifest)
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001)
\ No newline at end of file
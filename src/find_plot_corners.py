@@ -1,8 +1,20 @@
 import os
+from typing import NamedTuple, Optional
 import cv2
 import numpy as np
+from buffer_pool import get_pool
+from kernel_cache import corner_detection_params, get_structuring_element
+from angle_histogram import normalize_angles, aggregate_line_angles
 
-def find_plot_corners(image, debug=False, output_folder="output"):
+class PlotCorners(NamedTuple):
+    """Result of detect_plot_corners."""
+    origin: Optional[tuple]      # bottom-left (x, y) or None
+    top_right: Optional[tuple]   # top-right (x, y) or None
+    confidence: float            # 0 (no frame) to 1 (fully supported rectangle)
+    candidates: list             # all (x, y) line intersections
+
+
+def find_plot_corners(image, debug=False, output_folder="output", pool=None, scale=1.0):
     """
     Attempts to locate both the origin (bottom-left) and the top-right corner of a plot.
     
@@ -14,48 +26,117 @@ def find_plot_corners(image, debug=False, output_folder="output"):
     Parameters:
       image: Input image (BGR).
       debug: If True, shows intermediate images and prints debug info.
+      pool: Optional BufferPool for the intermediate line maps (defaults to the process pool).
+      scale: Detect on the image resized by this factor (e.g. 0.5, faster and
+             accurate to about 1 / scale pixels).
     
     Returns:
       (origin, top_right): Tuple of pixel coordinates for the origin and top-right corner.
                             If detection fails, one or both may be None.
     """
    
+    result = detect_plot_corners(image, debug=debug, output_folder=output_folder, pool=pool, scale=scale)
+    return result.origin, result.top_right
+
+
+def detect_plot_corners(image, debug=False, output_folder="output", pool=None, scale=1.0):
+    """
+    Same detection as find_plot_corners, returned as a PlotCorners result.
+
+    The confidence combines how much of the rectangle spanned by origin and
+    top_right is covered by detected frame lines with whether its two other
+    corners were also found as intersections. It is 0 when there are no
+    intersections or the rectangle is degenerate, so callers can skip
+    cropping and axis OCR on images without a detectable frame.
+
+    With scale < 1 the lines are detected on a downscaled copy (area
+    interpolation keeps 1 px frame lines dark enough) and the points are
+    mapped back to the full image.
+    """
+    if scale >= 1:
+        return _with_pooled_buffers(image, pool, _find_plot_corners, debug, output_folder)
+    small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    result = _with_pooled_buffers(small, pool, _find_plot_corners, debug, output_folder)
+
+    def full(point):
+        return None if point is None else (int(round(point[0] / scale)), int(round(point[1] / scale)))
+
+    return PlotCorners(full(result.origin), full(result.top_right), result.confidence,
+                       [full(point) for point in result.candidates])
+
+
+def _with_pooled_buffers(image, pool, func, *args):
+    """Calls func(image, *args, acquire) and releases every buffer it acquired."""
+    if pool is None:
+        pool = get_pool()
+    shape = image.shape[:2]
+    buffers = []
+
+    def acquire():
+        buffer = pool.acquire(shape, np.uint8)
+        buffers.append(buffer)
+        return buffer
+
+    try:
+        return func(image, *args, acquire)
+    finally:
+        pool.release(*buffers)
+
+
+def _binary_lines(image, acquire):
+    """Grayscale, inverted and thresholded image (dark lines become white)."""
     # Convert image to grayscale and invert it so dark lines become white
     if len(image.shape) > 2:
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY, dst=acquire())
     else:
         gray = image
     # gray = image
-    inv_gray = cv2.bitwise_not(gray)
+    inv_gray = cv2.bitwise_not(gray, dst=acquire())
     
     # Threshold the image to obtain a binary image (lines in white)
-    _, binary = cv2.threshold(inv_gray, 50, 255, cv2.THRESH_BINARY)
+    _, binary = cv2.threshold(inv_gray, 50, 255, cv2.THRESH_BINARY, dst=inv_gray)
+    return gray, binary
+
+
+class _LineMaps(NamedTuple):
+    """Intermediate maps of the frame line detection (pooled buffers)."""
+    gray: np.ndarray
+    vertical_open: np.ndarray      # vertical lines before extension
+    vertical_lines: np.ndarray
+    horizontal_open: np.ndarray    # horizontal lines before extension
+    horizontal_lines: np.ndarray
+    intersections: np.ndarray
+
+
+def _line_maps(image, acquire, debug=False, output_folder="output"):
+    """Thick horizontal and vertical lines of an image and their intersections."""
+    gray, binary = _binary_lines(image, acquire)
     if debug:
         cv2.imwrite(os.path.join(output_folder, "binary.png"), binary)  # Save contour image
         
+    # Kernel sizes are based on the (quantized) image dimensions and cached across calls.
+    params = corner_detection_params(*image.shape[:2])
+
     # Use morphological operations to extract thick vertical lines.
-    # The kernel size is based on the image dimensions; adjust as necessary.
-    vert_kernel_len = max(3, image.shape[0] // 40)
-    vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, vert_kernel_len))
-    vertical_lines = cv2.morphologyEx(binary, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
+    vertical_kernel = params["vertical_kernel"]
+    vertical_open = cv2.morphologyEx(binary, cv2.MORPH_OPEN, vertical_kernel, iterations=2, dst=acquire())
     # Extend vertical lines using closing with a tall kernel
-    extend_vert_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, image.shape[0] // 5))
-    vertical_lines = cv2.morphologyEx(vertical_lines, cv2.MORPH_CLOSE, extend_vert_kernel, iterations=2)
+    extend_vert_kernel = params["extend_vert_kernel"]
+    vertical_lines = cv2.morphologyEx(vertical_open, cv2.MORPH_CLOSE, extend_vert_kernel, iterations=2, dst=acquire())
     if debug:
         cv2.imwrite(os.path.join(output_folder, "vertical-lines.png"), vertical_lines)  # Save contour image
 
     # Use morphological operations to extract thick horizontal lines.
-    hor_kernel_len = max(3, image.shape[1] // 40)
-    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (hor_kernel_len, 1))
-    horizontal_lines = cv2.morphologyEx(binary, cv2.MORPH_OPEN, horizontal_kernel, iterations=1)
+    horizontal_kernel = params["horizontal_kernel"]
+    horizontal_open = cv2.morphologyEx(binary, cv2.MORPH_OPEN, horizontal_kernel, iterations=1, dst=acquire())
     # Extend horizontal lines using closing with a wider kernel
-    extend_hor_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (image.shape[1] // 5, 1))
-    horizontal_lines = cv2.morphologyEx(horizontal_lines, cv2.MORPH_CLOSE, extend_hor_kernel, iterations=2)
+    extend_hor_kernel = params["extend_hor_kernel"]
+    horizontal_lines = cv2.morphologyEx(horizontal_open, cv2.MORPH_CLOSE, extend_hor_kernel, iterations=2, dst=acquire())
     if debug:
         cv2.imwrite(os.path.join(output_folder, "horizontal-lines.png"), horizontal_lines)  # Save contour image
     
     # Find intersections between the vertical and horizontal thick lines.
-    intersections = cv2.bitwise_and(vertical_lines, horizontal_lines)
+    intersections = cv2.bitwise_and(vertical_lines, horizontal_lines, dst=acquire())
     
     # Cleanup border (a little janky but doesn't hurt)
     border_width = 15
@@ -66,13 +147,18 @@ def find_plot_corners(image, debug=False, output_folder="output"):
     
     if debug:
         cv2.imwrite(os.path.join(output_folder, "intersections.png"), intersections)  # Save contour image
+    return _LineMaps(gray, vertical_open, vertical_lines, horizontal_open, horizontal_lines, intersections)
+
+
+def _find_plot_corners(image, debug, output_folder, acquire):
+    gray, _, vertical_lines, _, horizontal_lines, intersections = _line_maps(image, acquire, debug, output_folder)
     
     # Find contours in the intersections mask to get candidate intersection points.
     contours, _ = cv2.findContours(intersections, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     if not contours:
         if debug:
             print("No intersections found.")
-        return None, None
+        return PlotCorners(None, None, 0.0, [])
     
     if debug:
         contour_image = np.zeros_like(gray)  # Same size as the original image, filled with black (0)
@@ -98,8 +184,10 @@ def find_plot_corners(image, debug=False, output_folder="output"):
 
     # Find the top-right point do opposite
     top_right = sorted(candidate_points, key=lambda pt: (pt[1], -pt[0]))[0]
-    
-   
+
+    confidence = _frame_confidence(origin, top_right, candidate_points, horizontal_lines, vertical_lines)
+    if debug:
+        print(f"Corner confidence: {confidence:.2f}")
     
     if debug:
         # Create a copy of the image to mark candidate points and the chosen corners.
@@ -120,7 +208,245 @@ def find_plot_corners(image, debug=False, output_folder="output"):
 
 
     
-    return origin, top_right
+    return PlotCorners(origin, top_right, confidence, candidate_points)
+
+def _frame_confidence(origin, top_right, candidates, horizontal_lines, vertical_lines, band=4, min_span=0.1):
+    """Scores how well origin/top_right describe a rectangular plot frame (0 to 1)."""
+    height, width = horizontal_lines.shape[:2]
+    x0, y1 = origin
+    x1, y0 = top_right
+    if x1 - x0 < min_span * width or y1 - y0 < min_span * height:
+        return 0.0
+
+    def coverage(lines, index, lo, hi, axis):
+        # Fraction of the edge covered by a line within +/- band pixels
+        start, stop = max(index - band, 0), index + band + 1
+        strip = lines[start:stop, lo:hi] if axis == 0 else lines[lo:hi, start:stop]
+        return float(np.count_nonzero(strip.max(axis=axis))) / max(hi - lo, 1)
+
+    edges = [
+        coverage(horizontal_lines, y0, x0, x1, 0),  # top
+        coverage(horizontal_lines, y1, x0, x1, 0),  # bottom
+        coverage(vertical_lines, x0, y0, y1, 1),    # left
+        coverage(vertical_lines, x1, y0, y1, 1),    # right
+    ]
+
+    # Are the other two corners of the rectangle intersections as well?
+    points = np.array(candidates)
+    tolerance = max(5, 0.02 * max(width, height))
+    support = [
+        bool(np.any(np.abs(points - corner).max(axis=1) <= tolerance))
+        for corner in ((x0, y0), (x1, y1))
+    ]
+    return 0.6 * float(np.mean(edges)) + 0.4 * float(np.mean(support))
+
+
+def detect_plot_panels(image, min_confidence=0.5, min_span=0.05, pool=None):
+    """
+    Every rectangular plot frame of a figure (e.g. a grid of subplots),
+    found on the same line maps as detect_plot_corners.
+
+    Each frame-line intersection is classified by the arms leaving it along
+    the (unextended) line maps: a top-left frame corner has lines only to its
+    right and below, a bottom-right corner only to its left and above, while
+    grid lines and panels sharing a frame line give T and + shaped crossings.
+    Every top-left corner is paired with the closest bottom-right corner
+    below and to the right of it, and the rectangle is scored with the same
+    frame confidence as detect_plot_corners.
+
+    Parameters:
+      image: Input image (BGR).
+      min_confidence: Minimum frame confidence of a panel.
+      min_span: Minimum panel size as a fraction of the image size.
+      pool: Optional BufferPool for the intermediate line maps.
+
+    Returns:
+      list: One PlotCorners per panel, in reading order (top to bottom, then
+            left to right). Empty if no frame is found.
+    """
+    return _with_pooled_buffers(image, pool, _detect_plot_panels, min_confidence, min_span)
+
+
+def _detect_plot_panels(image, min_confidence, min_span, acquire):
+    maps = _line_maps(image, acquire)
+    contours, _ = cv2.findContours(maps.intersections, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return []
+    height, width = image.shape[:2]
+    boxes = np.array([cv2.boundingRect(cnt) for cnt in contours])
+    x, y, w, h = boxes.T
+
+    # Arms longer than tick marks, measured on the lines before extension
+    # (the extension closes the gaps between neighbouring panels)
+    arm = max(8, min(height, width) // 40)
+
+    def has_arm(lines, x0, x1, y0, y1, axis):
+        strip = lines[max(y0, 0):max(y1, 0), max(x0, 0):max(x1, 0)]
+        return strip.size > 0 and np.count_nonzero(strip.max(axis=axis)) >= 0.8 * arm
+
+    arms = np.array([[
+        has_arm(maps.horizontal_open, bx - arm, bx, by, by + bh, 0),            # left
+        has_arm(maps.horizontal_open, bx + bw, bx + bw + arm, by, by + bh, 0),  # right
+        has_arm(maps.vertical_open, bx, bx + bw, by - arm, by, 1),              # up
+        has_arm(maps.vertical_open, bx, bx + bw, by + bh, by + bh + arm, 1),    # down
+    ] for bx, by, bw, bh in boxes], bool).reshape(-1, 4)
+    left, right, up, down = arms.T
+    top_left = np.flatnonzero(right & down & ~left & ~up)
+    bottom_right = np.flatnonzero(left & up & ~right & ~down)
+
+    candidates = [(int(bx), int(by)) for bx, by in zip(x, y)]
+    panels = []
+    for i in top_left:
+        # Closest bottom-right corner below and to the right
+        inside = bottom_right[(x[bottom_right] - x[i] >= min_span * width) & (y[bottom_right] - y[i] >= min_span * height)]
+        if inside.size == 0:
+            continue
+        j = inside[np.argmin((x[inside] - x[i]) * (y[inside] - y[i]))]
+        origin, top_right = (int(x[i]), int(y[j])), (int(x[j]), int(y[i]))
+        confidence = _frame_confidence(origin, top_right, candidates, maps.horizontal_lines, maps.vertical_lines,
+                                       min_span=min_span)
+        if confidence >= min_confidence:
+            panels.append(PlotCorners(origin, top_right, confidence, candidates))
+    # Reading order, rows first (panels of a row share roughly the same top)
+    row_tolerance = 0.05 * height
+    panels.sort(key=lambda p: (round(p.top_right[1] / row_tolerance), p.origin[0]))
+    return panels
+
+
+def long_line_mask(mask, min_length_fraction=0.5, max_gap_fraction=0.01, dst=None, pool=None):
+    """
+    Pixels of a binary mask that lie on long horizontal or vertical lines
+    (e.g. gridlines drawn in the trace color).
+
+    Same line extraction as find_plot_corners, with kernels long enough that
+    only lines spanning a large part of the image survive the opening. A
+    closing along each direction first bridges the gaps of dashed lines; the
+    result is limited to the pixels of `mask`.
+
+    Parameters:
+      mask: Binary image (nonzero = foreground).
+      min_length_fraction: Minimum line length as a fraction of the image size.
+      max_gap_fraction: Largest gap bridged within a line (dashes), as a
+                        fraction of the image size.
+      dst: Optional output array (same shape and dtype as mask).
+      pool: Optional BufferPool for the intermediate maps.
+
+    Returns:
+      np.ndarray: The line pixels, with the values of `mask`.
+    """
+    return _with_pooled_buffers(mask, pool, _long_line_mask, min_length_fraction, max_gap_fraction, dst)
+
+
+def _long_line_mask(mask, min_length_fraction, max_gap_fraction, dst, acquire):
+    height, width = mask.shape[:2]
+    lines = []
+    for size, horizontal in ((width, True), (height, False)):
+        gap = max(1, int(max_gap_fraction * size))
+        length = max(3, int(min_length_fraction * size))
+        close_kernel = get_structuring_element(cv2.MORPH_RECT, (gap, 1) if horizontal else (1, gap))
+        open_kernel = get_structuring_element(cv2.MORPH_RECT, (length, 1) if horizontal else (1, length))
+        closed = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, close_kernel, dst=acquire())
+        lines.append(cv2.morphologyEx(closed, cv2.MORPH_OPEN, open_kernel, dst=closed))
+    combined = cv2.bitwise_or(lines[0], lines[1], dst=lines[0])
+    return cv2.bitwise_and(mask, combined, dst=dst)
+
+
+def estimate_axis_skew(image, min_length_fraction=0.25, pool=None):
+    """
+    Estimates the skew of a plot from its long axis/frame lines.
+
+    The thick lines isolated by the same morphological opening used in
+    find_plot_corners are labeled, and each long component's orientation is
+    taken from its second-order moments (no per-pixel Python loop).
+
+    Parameters:
+      image: Input image (BGR or grayscale).
+      min_length_fraction: Minimum line length as a fraction of the image size.
+      pool: Optional BufferPool for the intermediate maps.
+
+    Returns:
+      (angle, confidence): Length-weighted median line angle in degrees (image
+                           coordinates, the value to pass to utils.rotate_image)
+                           and the fraction of line length agreeing with it.
+                           Returns (None, 0.0) if no long lines are found.
+    """
+    return _with_pooled_buffers(image, pool, _estimate_axis_skew, min_length_fraction)
+
+
+def _estimate_axis_skew(image, min_length_fraction, acquire):
+    _, binary = _binary_lines(image, acquire)
+    params = corner_detection_params(*image.shape[:2])
+    height, width = image.shape[:2]
+
+    angles = []
+    lengths = []
+    for kernel, iterations, min_length, vertical in (
+        (params["horizontal_kernel"], 1, width * min_length_fraction, False),
+        (params["vertical_kernel"], 2, height * min_length_fraction, True),
+    ):
+        lines = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel, iterations=iterations, dst=acquire())
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(lines, connectivity=8)
+        extent = stats[1:, cv2.CC_STAT_HEIGHT if vertical else cv2.CC_STAT_WIDTH]
+        keep = np.flatnonzero(extent >= min_length) + 1
+        if keep.size == 0:
+            continue
+
+        # Per-label second-order moments via bincount
+        ys, xs = np.nonzero(lines)
+        lab = labels[ys, xs]
+        n = np.bincount(lab, minlength=count)[keep].astype(np.float64)
+        mx = np.bincount(lab, xs, minlength=count)[keep] / n
+        my = np.bincount(lab, ys, minlength=count)[keep] / n
+        cxx = np.bincount(lab, xs.astype(np.float64) ** 2, minlength=count)[keep] / n - mx ** 2
+        cyy = np.bincount(lab, ys.astype(np.float64) ** 2, minlength=count)[keep] / n - my ** 2
+        cxy = np.bincount(lab, xs.astype(np.float64) * ys, minlength=count)[keep] / n - mx * my
+        theta = 0.5 * np.degrees(np.arctan2(2 * cxy, cxx - cyy))
+        # Normalize to the deviation from the nearest axis (-45 to 45 degrees)
+        angles.append(normalize_angles(theta))
+        lengths.append(extent[keep - 1].astype(np.float64))
+
+    if not angles:
+        return None, 0.0
+    return aggregate_line_angles(np.concatenate(angles), np.concatenate(lengths), tolerance=0.25)
+
+
+def orthogonal_line_extent(image, max_thickness=0.02, pool=None):
+    """
+    Length of the longest horizontal and vertical lines in an image, found
+    with the same line extraction as find_plot_corners.
+
+    Parameters:
+      image: Input image (BGR or grayscale).
+      max_thickness: Components thicker than this fraction of the image size
+                     (at least 3 px) on average are filled shapes, not lines.
+      pool: Optional BufferPool for the intermediate maps.
+
+    Returns:
+      (horizontal, vertical): Extents as fractions of the image width and
+                              height (0 to 1).
+    """
+    return _with_pooled_buffers(image, pool, _orthogonal_line_extent, max_thickness)
+
+
+def _orthogonal_line_extent(image, max_thickness, acquire):
+    _, binary = _binary_lines(image, acquire)
+    params = corner_detection_params(*image.shape[:2])
+    height, width = image.shape[:2]
+
+    extents = []
+    for kernel, iterations, stat, size, across in (
+        (params["horizontal_kernel"], 1, cv2.CC_STAT_WIDTH, width, height),
+        (params["vertical_kernel"], 2, cv2.CC_STAT_HEIGHT, height, width),
+    ):
+        lines = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel, iterations=iterations, dst=acquire())
+        _, _, stats, _ = cv2.connectedComponentsWithStats(lines, connectivity=8)
+        extent = stats[1:, stat]
+        # Mean thickness of each component
+        thickness = stats[1:, cv2.CC_STAT_AREA] / np.maximum(extent, 1)
+        extent = extent[thickness <= max(3.0, max_thickness * across)]
+        extents.append(float(extent.max()) / size if extent.size else 0.0)
+    return tuple(extents)
+
 
 # Example usage:
 if __name__ == '__main__':
@@ -4,11 +4,28 @@ import numpy as np
 import matplotlib
 matplotlib.use("Agg")  # Use a non-GUI backend
 import matplotlib.pyplot as plt
-from find_plot_corners import find_plot_corners
+from find_plot_corners import find_plot_corners, detect_plot_corners, long_line_mask
 from utils import filter_colors
+from buffer_pool import get_pool
+from kernel_cache import get_square_kernel
+from axis_calibration import calibration_from_limits
+from trace_tracking import track_traces
+from bar_chart import extract_bars
+from suppression import find_legend_boxes
+
+# Default minimum size (pixels) of a connected component to be kept as data
+# (0 keeps everything; e.g. 2-5 removes speckles from scanned figures)
+MIN_COMPONENT_AREA = 0
+
+# Default cv2.approxPolyDP tolerance of extract_data_points (fraction of the
+# contour perimeter)
+DECIMATION = 0.0001
+
 
 class GraphDataExtractor:
-    def __init__(self, image_name=None):
+    def __init__(self, image_name=None, pool=None):
+        self.pool = pool if pool is not None else get_pool()
+        self._buffers = []
         if image_name is not None:
             self.image = self.load_image(image_name)
         else:
@@ -18,23 +35,69 @@ class GraphDataExtractor:
         self.x_max = 180
         self.y_min = -30
         self.y_max = 30
+        self.x_scale = "linear"
+        self.y_scale = "linear"
         self.thresholded_image = None
         self.cleaned_image = None
         self.subtracted_image = None
         self.data_points = None
         self.contours = None
         self.thin_factor = 1
+        # Contour simplification tolerance, as a fraction of each contour's
+        # perimeter (larger values keep fewer points)
+        self.decimation = DECIMATION
+        # Contours of connected components smaller than this (pixels) are noise
+        self.min_component_area = MIN_COMPONENT_AREA
+        # Per-contour [x, y, width, height, area] of the kept contours, the
+        # simplified vertices of all contours (pixels, unsorted) and the start
+        # of each contour's vertices in them
+        self.contour_stats = None
+        self.contour_points = None
+        self.contour_offsets = None
+        # Scaled points of each curve (track_traces) or bar color (extract_bars)
+        self.series = None
+        # Number of markers found by extract_markers
+        self.marker_count = None
+        # Legend boxes masked by mask_legends ([left, top, right, bottom] in
+        # the coordinates of the originally loaded image)
+        self.legend_boxes = None
+        # Position of the current image's top-left pixel in the originally
+        # loaded image; calibrations are expressed in those coordinates.
+        self.offset = (0, 0)
+        self.x_calibration = None
+        self.y_calibration = None
     
     def set_thin(self, thin):
         self.thin_factor = thin
 
-    def set_limits(self, xlim, ylim):
+    def set_limits(self, xlim, ylim, x_scale="linear", y_scale="linear"):
+        """
+        Sets the axis limits (label values at the image edges) and the axis
+        scale types: "linear", "log10" or "db" (log-spaced axis, output in dB).
+        """
         self.x_min, self.x_max = xlim
         self.y_min, self.y_max = ylim
+        self.x_scale = x_scale
+        self.y_scale = y_scale
+
+    def set_calibration(self, x_calibration=None, y_calibration=None):
+        """
+        Sets per-axis AxisCalibration objects (see axis_calibration.fit_axis),
+        measured in the coordinates of the originally loaded image. An axis
+        without a calibration is scaled from its limits and the image edges.
+        """
+        self.x_calibration = x_calibration
+        self.y_calibration = y_calibration
 
     def set_kernel_size(self, kernel_size):
         self.kernel_size = kernel_size
 
+    def set_decimation(self, decimation):
+        self.decimation = decimation
+
+    def set_min_component_area(self, min_area):
+        self.min_component_area = min_area
+
     def load_image(self, image_path, target_color='blue', delta=20):
         """Loads the image in grayscale."""
         # image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
@@ -42,13 +105,22 @@ class GraphDataExtractor:
         # image = filter_colors(image, target_color=target_color, delta=delta) # filter only black colors
         # image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         self.image = image
+        self.offset = (0, 0)
+        return image
+
+    def set_image(self, image):
+        """Replaces the working image with an uncropped one."""
+        self.image = image
+        self.offset = (0, 0)
         return image
     
-    def filter_to_gray(self, target_color='blue', delta=20):
+    def filter_to_gray(self, target_color='blue', delta=20, keep_black=True):
         image = self.image
         if len(image.shape) > 2:
-            image = filter_colors(image, target_color=target_color, delta=delta) # filter only black colors
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            filtered = filter_colors(image, target_color=target_color, delta=delta, pool=self.pool,
+                                     keep_black=keep_black) # filter only black colors
+            image = cv2.cvtColor(filtered, cv2.COLOR_BGR2GRAY, dst=self._acquire(image.shape[:2]))
+            self.pool.release(filtered)
             self.image = image
         else:
             print("WARNING: Image already gray scale, cannot convert")
@@ -57,38 +129,159 @@ class GraphDataExtractor:
     def get_image(self):
         return self.image
 
+    def _acquire(self, shape, dtype=np.uint8):
+        """Draws a working buffer from the pool; it is returned by release_buffers()."""
+        buffer = self.pool.acquire(shape, dtype)
+        self._buffers.append(buffer)
+        return buffer
+
+    def copy_image(self, image):
+        """Loads a pooled working copy of `image` so the caller's array is never modified."""
+        self.image = self._acquire(image.shape, image.dtype)
+        np.copyto(self.image, image)
+        self.offset = (0, 0)
+        return self.image
+
+    def load_pixmap(self, pix):
+        """
+        Loads a fitz.Pixmap (e.g. a PDF figure) as the working image, decoding
+        it straight into a pooled BGR buffer instead of going through a PNG file.
+        """
+        # PyMuPDF is only needed for PDF figures, not by the image extractor
+        from pdf_extract import pixmap_to_bgr
+        self.image = pixmap_to_bgr(pix, dst=self._acquire((pix.height, pix.width, 3)))
+        self.offset = (0, 0)
+        return self.image
+
+    def snapshot(self, *names):
+        """
+        Copies of the given attributes (e.g. "image", "offset") that outlive
+        release_buffers(): arrays are copied out of the pool buffers and made
+        read-only, since later stages only read them.
+        """
+        state = {}
+        for name in names:
+            value = getattr(self, name)
+            if isinstance(value, np.ndarray):
+                value = value.copy()
+                value.flags.writeable = False
+            state[name] = value
+        return state
+
+    def restore(self, state):
+        """Sets the attributes saved by snapshot()."""
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def release_buffers(self):
+        """
+        Returns all working buffers to the pool. Intermediate images
+        (thresholded, cleaned, eroded) are dropped since they may share memory
+        with the released buffers; data_points and contours are kept.
+        """
+        self.pool.release(*self._buffers)
+        self._buffers = []
+        self.image = None
+        self.thresholded_image = None
+        self.cleaned_image = None
+        self.eroded_image = None
+
     def threshold_image(self):
         """Thresholds the image to binary (invert if needed)."""
-        _, thresholded = cv2.threshold(self.image, 127, 127, cv2.THRESH_BINARY_INV)
+        _, thresholded = cv2.threshold(self.image, 127, 127, cv2.THRESH_BINARY_INV, dst=self._acquire(self.image.shape))
         self.thresholded_image = thresholded
         return thresholded
     
-    def clean_image(self):
-        """Applies morphological operations to clean the image."""
+    def clean_image(self, mask_border=True):
+        """
+        Applies morphological operations to clean the image. With mask_border,
+        a band along the image edges (leftovers of the plot frame) is cleared.
+        """
         iter = 1
-        kernel = np.ones((self.kernel_size, self.kernel_size), np.uint8)
-        cleaned = cv2.morphologyEx(self.thresholded_image, cv2.MORPH_OPEN, kernel, iterations=iter)
+        kernel = get_square_kernel(self.kernel_size)
+        cleaned = cv2.morphologyEx(self.thresholded_image, cv2.MORPH_OPEN, kernel, iterations=iter,
+                                   dst=self._acquire(self.thresholded_image.shape))
         # Mask the outer 10 pixels from each edge
         H, W = self.image.shape[:2]
         border_width = int(0.02 * H)
-        cleaned[:border_width, :] = 0
-        cleaned[-border_width:, :] = 0
-        cleaned[:, :border_width] = 0
-        cleaned[:, -border_width:] = 0
+        if mask_border:
+            cleaned[:border_width, :] = 0
+            cleaned[-border_width:, :] = 0
+            cleaned[:, :border_width] = 0
+            cleaned[:, -border_width:] = 0
         self.cleaned_image = cleaned
         return cleaned
 
+    def remove_gridlines(self, min_length_fraction=0.5):
+        """
+        Removes gridlines drawn in the trace color from the cleaned image:
+        the long horizontal and vertical lines found by long_line_mask are
+        subtracted (a trace crossing them loses only the crossing pixels).
+        """
+        lines = long_line_mask(self.cleaned_image, min_length_fraction, dst=self._acquire(self.cleaned_image.shape),
+                               pool=self.pool)
+        self.cleaned_image = cv2.subtract(self.cleaned_image, lines, dst=lines)
+        return self.cleaned_image
+
+    def mask_legends(self, color_image):
+        """
+        Clears the legend boxes (swatches and labels, see
+        suppression.find_legend_boxes) from the cleaned image.
+
+        Parameters:
+            color_image: BGR image of the same area as the cleaned image.
+        """
+        boxes = find_legend_boxes(color_image, self.cleaned_image)
+        if boxes:
+            cleaned = self._acquire(self.cleaned_image.shape)
+            np.copyto(cleaned, self.cleaned_image)
+            for left, top, right, bottom in boxes:
+                cleaned[top:bottom, left:right] = 0
+            self.cleaned_image = cleaned
+        dx, dy = self.offset
+        self.legend_boxes = [[left + dx, top + dy, right + dx, bottom + dy] for left, top, right, bottom in boxes]
+        return self.legend_boxes
+
     def find_contours(self):
         """Finds and extracts contours from the cleaned image."""
         k = self.thin_factor
-        kernel = np.ones((k, k), np.uint8)
-        self.eroded_image = cv2.erode(self.cleaned_image, kernel, iterations=1)
+        kernel = get_square_kernel(k)
+        self.eroded_image = cv2.erode(self.cleaned_image, kernel, iterations=1, dst=self._acquire(self.cleaned_image.shape))
         contours, _ = cv2.findContours(self.eroded_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        self.contours = contours
-        return contours
+        self.contours = self.filter_contours(contours)
+        return self.contours
+
+    def filter_contours(self, contours):
+        """
+        Drops the contours of connected components smaller than
+        min_component_area pixels (speckles) before any per-point work.
+
+        The area and bounding box of every component come from a single
+        cv2.connectedComponentsWithStats pass over the eroded image; each
+        external contour is matched to its component through its first vertex.
+        The stats of the kept contours are stored in contour_stats (None
+        when filtering is disabled).
+        """
+        self.contour_stats = None
+        if len(contours) == 0 or self.min_component_area <= 0:
+            return contours
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(self.eroded_image, connectivity=8)
+        starts = np.array([contour[0, 0] for contour in contours])
+        components = stats[labels[starts[:, 1], starts[:, 0]]]
+        keep = components[:, cv2.CC_STAT_AREA] >= self.min_component_area
+        self.contour_stats = components[keep]
+        if keep.all():
+            return contours
+        return tuple(contour for contour, kept in zip(contours, keep) if kept)
 
     def extract_data_points(self):
-        """Extracts the data points from contours and scales them."""
+        """
+        Extracts the data points from contours and scales them.
+
+        The simplified contours are flattened into one array, kept unsorted
+        in contour_points (pixels); contour i's vertices are
+        contour_points[contour_offsets[i]:contour_offsets[i + 1]].
+        """
         contours = self.contours
         data_points = []
 
@@ -99,19 +292,110 @@ class GraphDataExtractor:
             print('Exiting contour extraction')
             return data_points
 
-        for contour in contours:
-            epsilon = 0.0001 * cv2.arcLength(contour, True)
-            approx = cv2.approxPolyDP(contour, epsilon, True)
-            for point in approx:
-                x, y = point[0]
-                data_points.append((x, y))
-
-        data_points = np.array(data_points)
+        approx = [cv2.approxPolyDP(contour, self.decimation * cv2.arcLength(contour, True), True).reshape(-1, 2)
+                  for contour in contours]
+        self.contour_offsets = np.cumsum([0] + [len(vertices) for vertices in approx])
+        data_points = np.concatenate(approx)
+        self.contour_points = data_points
         data_points = self.sort_data_points(data_points)
         data_points = self.scale_data_points(data_points)
         self.data_points = data_points
         return data_points
     
+    def extract_markers(self, min_area=None):
+        """
+        Alternative to find_contours/extract_data_points for scatter plots:
+        one data point per marker, from the connected components of the
+        cleaned mask (a single cv2.connectedComponentsWithStats pass).
+
+        Touching markers form one component. Areas are quantized by the
+        median component area (the typical single marker); a component n
+        times larger is split into n points spread evenly along the longer
+        side of its bounding box.
+
+        Parameters:
+            min_area (int): Components smaller than this are noise (default:
+                min_component_area, at least 1).
+
+        Returns:
+            np.ndarray: Scaled marker positions sorted by x; the number of
+            markers is stored in marker_count.
+        """
+        if min_area is None:
+            min_area = max(1, self.min_component_area)
+        _, _, stats, centroids = cv2.connectedComponentsWithStats(self.cleaned_image, connectivity=8)
+        # Skip the background label
+        stats, centroids = stats[1:], centroids[1:]
+        keep = stats[:, cv2.CC_STAT_AREA] >= min_area
+        stats, centroids = stats[keep], centroids[keep]
+        self.marker_count = 0
+        if len(stats) == 0:
+            print('Exiting marker extraction')
+            return []
+
+        areas = stats[:, cv2.CC_STAT_AREA]
+        counts = np.maximum(1, np.rint(areas / np.median(areas))).astype(np.intp)
+        # Expand every component into its markers: marker i of n sits at
+        # (i + 0.5) / n along the longer side of the bounding box
+        component = np.repeat(np.arange(len(stats)), counts)
+        index = np.arange(len(component)) - np.repeat(np.cumsum(counts) - counts, counts)
+        fraction = (index + 0.5) / counts[component]
+        left, top, width, height = (stats[component, i] for i in
+                                    (cv2.CC_STAT_LEFT, cv2.CC_STAT_TOP, cv2.CC_STAT_WIDTH, cv2.CC_STAT_HEIGHT))
+        points = centroids[component].copy()
+        split = counts[component] > 1
+        horizontal = split & (width >= height)
+        vertical = split & (width < height)
+        points[horizontal, 0] = left[horizontal] + fraction[horizontal] * width[horizontal] - 0.5
+        points[vertical, 1] = top[vertical] + fraction[vertical] * height[vertical] - 0.5
+
+        self.marker_count = len(points)
+        points = points[np.argsort(points[:, 0], kind="stable")]
+        self.data_points = self.scale_data_points(points)
+        return self.data_points
+
+    def track_traces(self, traces=None):
+        """
+        Alternative to extract_data_points for curves of the same color that
+        cross or have steep excursions: follows each curve through the eroded
+        mask with trace_tracking.track_traces (one point per column).
+
+        Parameters:
+            traces (int): Number of curves (None estimates it).
+
+        Returns:
+            list: One dict per curve with the scaled (N, 2) "data_points";
+            data_points is set to the first (lowest-cost) curve.
+        """
+        series = track_traces(self.eroded_image, traces=traces)
+        if not series:
+            print('Exiting trace tracking')
+            self.series = []
+            return self.series
+        self.series = [{"data_points": self.scale_data_points(points)} for points in series]
+        self.data_points = self.series[0]["data_points"]
+        return self.series
+
+    def extract_bars(self, colors, delta=20, orientation="vertical"):
+        """
+        Alternative to the mask/contour stages for bar charts: measures the
+        bars of each color on the (BGR) plot area image, see
+        bar_chart.extract_bars.
+
+        Returns:
+            list: One dict per color with "color" and "data_points"
+            ([position, value] in data units); data_points is set to all bars
+            sorted by position.
+        """
+        self.series = extract_bars(self.image, colors, *self.get_calibration(), offset=self.offset, delta=delta,
+                                   orientation=orientation)
+        points = np.concatenate([s["data_points"] for s in self.series]) if self.series else np.empty((0, 2))
+        if len(points) == 0:
+            print('Exiting bar extraction')
+            return self.series
+        self.data_points = points[np.argsort(points[:, 0], kind="stable")]
+        return self.series
+
     def sort_data_points(self, data_points):
         """Sort points"""
         # data_points = data_points[data_points[:, 0].argsort()]
@@ -167,27 +451,33 @@ class GraphDataExtractor:
         return np.array(sorted_points, dtype=data_points.dtype)
     
     def scale_data_points(self, data_points):
-        """Scales data points to fit the user-defined limits based on image dimensions."""
-        # Assuming the minimum values are always zero
-        width = self.image.shape[1]  # Width of the image
-        height = self.image.shape[0]  # Height of the image
-
-        # Assuming the minimum values are always zero
-        x_min, x_max = width, 0
-        y_min, y_max = height, 0
-
-        # Convert data_points to float to avoid integer rounding issues
-        data_points = data_points.astype(np.float128)
-
-        # print(f"Origin: {self.x_min} , {self.y_min}")
-        # Scale x values
-        data_points[:, 0] = 0*self.x_min + ((data_points[:, 0] - x_min) / (x_max - x_min)) * (self.x_max - self.x_min)
-        # Scale y values
-        data_points[:, 1] = self.y_min + ((data_points[:, 1] - y_min) / (y_max - y_min)) * (self.y_max - self.y_min)
-
-        # flip x left to right
-        data_points[:, 0] = self.x_max - data_points[:, 0]
+        """
+        Scales data points (pixels of the current image) to data units.
+
+        Each axis uses its calibration if one was set; otherwise the user-defined
+        limits are assumed to sit on the image edges.
+        """
+        x_calibration, y_calibration = self.get_calibration()
+
+        # Convert to absolute pixel coordinates of the calibrations
+        data_points = data_points.astype(np.float64)
+        data_points[:, 0] = x_calibration.to_data(data_points[:, 0] + self.offset[0])
+        data_points[:, 1] = y_calibration.to_data(data_points[:, 1] + self.offset[1])
         return data_points
+
+    def get_calibration(self):
+        """Returns the (x, y) calibrations used by scale_data_points."""
+        height, width = self.image.shape[:2]
+        x0, y0 = self.offset
+        x_calibration = self.x_calibration
+        if x_calibration is None:
+            # Left edge is x_min, right edge is x_max
+            x_calibration = calibration_from_limits(self.x_min, self.x_max, x0, x0 + width, scale=self.x_scale)
+        y_calibration = self.y_calibration
+        if y_calibration is None:
+            # Bottom edge is y_min, top edge is y_max
+            y_calibration = calibration_from_limits(self.y_min, self.y_max, y0 + height, y0, scale=self.y_scale)
+        return x_calibration, y_calibration
     
     def remove_outliers(self, threshold=1.5):
         """Removes outliers from the data_points using the Interquartile Range (IQR) method."""
@@ -214,10 +504,15 @@ class GraphDataExtractor:
 
         # print(f"Removed outliers. Kept: {len(self.data_points)} of {original_length}\n")
  
-    def find_corners(self, debug: bool = False, output_folder="output"):
-        origin, top_right = find_plot_corners(self.image, debug=debug, output_folder=output_folder)
+    def find_corners(self, debug: bool = False, output_folder="output", scale=1.0):
+        origin, top_right = find_plot_corners(self.image, debug=debug, output_folder=output_folder, pool=self.pool,
+                                              scale=scale)
         return origin, top_right
     
+    def detect_corners(self, debug: bool = False, output_folder="output", scale=1.0):
+        """Corner detection with confidence score and candidates (PlotCorners)."""
+        return detect_plot_corners(self.image, debug=debug, output_folder=output_folder, pool=self.pool, scale=scale)
+
     def crop(self, origin, top_right):
         # Unpack the corner coordinates
         x_origin, y_origin = origin
@@ -232,19 +527,32 @@ class GraphDataExtractor:
         # Given our assumptions, typically:
         cropped = self.image[y_top:y_bottom, x_left:x_right]
         self.image = cropped
+        self.offset = (self.offset[0] + max(x_left, 0), self.offset[1] + max(y_top, 0))
         return cropped
     
-    def crop_to_plot_area(self, iterations=1, margin=4):
-        """Crops the image to the plot area."""
+    def crop_to_plot_area(self, iterations=1, margin=4, corners=None):
+        """
+        Crops the image to the plot area.
+
+        If `corners` (a PlotCorners result for the current image) is given, it
+        is used for the first iteration instead of detecting the corners again.
+        Returns False (leaving the image unchanged) if no corners are found.
+        """
         for i in range(iterations):
             # print(f"\nCrop, iteration: {i + 1}")
-            origin, top_right = self.find_corners()
+            if i == 0 and corners is not None:
+                origin, top_right = corners.origin, corners.top_right
+            else:
+                origin, top_right = self.find_corners()
+            if origin is None or top_right is None:
+                return False
             origin = (origin[0] + margin, origin[1] - margin)
             top_right = (top_right[0] - margin, top_right[1] + margin)
             # print(f"Origin: {origin}")
             # print(f"Top Right: {top_right}")
             self.crop(origin, top_right)
         # print("\nPlot cropping complete!\n")
+        return True
 
     def get_image_area(self):
         """Returns the area of the image in pixels."""
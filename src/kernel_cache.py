@@ -0,0 +1,69 @@
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+# Image dimensions are rounded down to a multiple of this many pixels so that
+# images of similar size share kernels and corner-detection parameters.
+SIZE_STEP = 32
+
+
+def quantize_size(n, step=SIZE_STEP):
+    """Rounds an image dimension down to its size bucket (never below one step)."""
+    return max(step, (int(n) // step) * step)
+
+
+def _read_only(kernel):
+    kernel.flags.writeable = False
+    return kernel
+
+
+@lru_cache(maxsize=128)
+def get_structuring_element(shape, ksize):
+    """
+    Cached cv2.getStructuringElement.
+
+    Parameters:
+        shape: OpenCV morphology shape (e.g. cv2.MORPH_RECT).
+        ksize: (width, height) tuple.
+
+    Returns:
+        np.ndarray: Read-only kernel shared between callers.
+    """
+    return _read_only(cv2.getStructuringElement(shape, ksize))
+
+
+@lru_cache(maxsize=32)
+def get_square_kernel(k):
+    """Cached np.ones((k, k), np.uint8) kernel (read-only)."""
+    return _read_only(np.ones((k, k), np.uint8))
+
+
+@lru_cache(maxsize=32)
+def _corner_detection_params(height_bucket, width_bucket):
+    vert_kernel_len = max(3, height_bucket // 40)
+    hor_kernel_len = max(3, width_bucket // 40)
+    return {
+        "vertical_kernel": get_structuring_element(cv2.MORPH_RECT, (1, vert_kernel_len)),
+        "extend_vert_kernel": get_structuring_element(cv2.MORPH_RECT, (1, height_bucket // 5)),
+        "horizontal_kernel": get_structuring_element(cv2.MORPH_RECT, (hor_kernel_len, 1)),
+        "extend_hor_kernel": get_structuring_element(cv2.MORPH_RECT, (width_bucket // 5, 1)),
+    }
+
+
+def corner_detection_params(height, width):
+    """
+    Returns the line-extraction kernels used by find_plot_corners for an
+    image of the given size. Results are kept in a bounded LRU keyed on the
+    quantized (height, width) bucket.
+    """
+    return _corner_detection_params(quantize_size(height), quantize_size(width))
+
+
+def cache_info():
+    """Returns LRU statistics for the kernel caches."""
+    return {
+        "structuring_elements": get_structuring_element.cache_info()._asdict(),
+        "square_kernels": get_square_kernel.cache_info()._asdict(),
+        "corner_params": _corner_detection_params.cache_info()._asdict(),
+    }
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class OCRCache:
+    """
+    Memo of OCR results keyed on the exact bytes of the preprocessed image
+    and the Tesseract configuration.
+
+    Figures generated from the same report template have identical label
+    strips (e.g. 0-180 and -30-30), so after thresholding their crops hash to
+    the same key and Tesseract is skipped entirely. An exact hash is used
+    rather than a perceptual one: a near match could return another figure's
+    numbers.
+
+    Parameters:
+        max_entries (int): Size of the in-memory LRU.
+        cache_dir (str): Optional directory where results are also stored as
+            small JSON files, so they survive restarts and are shared between
+            worker processes.
+    """
+
+    def __init__(self, max_entries=4096, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(image, config, kind="text"):
+        """Hash of the image pixels, shape and dtype, the config and the kind of OCR call."""
+        image = np.ascontiguousarray(image)
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{kind}|{config}|{image.shape}|{image.dtype.str}|".encode())
+        digest.update(image.data)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def get(self, key):
+        """Returns the cached result for `key`, or None."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        if self.cache_dir:
+            try:
+                with open(self._path(key)) as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                pass
+            else:
+                self._remember(key, value)
+                with self._lock:
+                    self.disk_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """Stores a (JSON-serializable) result."""
+        self._remember(key, value)
+        if self.cache_dir:
+            path = self._path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Write then rename so concurrent readers never see a partial file
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(value, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Could not write OCR cache entry {path}: {e}")
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def cached(self, image, config, func, kind="text"):
+        """Returns func(image, config), computing it only on a cache miss."""
+        key = self.key(image, config, kind)
+        value = self.get(key)
+        if value is None:
+            value = func(image, config)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """Drops the in-memory entries (files on disk are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns cache usage counters for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "cache_dir": self.cache_dir,
+            }
+
+
+# One cache per worker process; set OCR_CACHE_DIR to persist it
+default_cache = OCRCache(cache_dir=os.environ.get("OCR_CACHE_DIR") or None)
+
+
+def get_ocr_cache():
+    """Returns the process-wide OCR cache."""
+    return default_cache
@@ -2,6 +2,8 @@ import os
 import argparse
 import fitz  # PyMuPDF
 import re
+import cv2
+import numpy as np
 
 def remove_repeated_underscores(s):
     return re.sub(r'_{2,}', '_', s)
@@ -26,56 +28,173 @@ def save_images_to_pdf(images, output_folder):
     pdf.save(pdf_path)
 
 
-def extract(pdf_path, output_folder ="pdf", max_file_length=100):
-  
-  figure_keywords = ["Figure", "Table", "FIGURE", "TABLE", "FIG", "fig", "figure", "table"]
-  
-  doc = fitz.open(pdf_path)
+FIGURE_KEYWORDS = ["Figure", "Table", "FIGURE", "TABLE", "FIG", "fig", "figure", "table"]
+
+
+def caption_to_filename(image_text, max_file_length=100):
+    """Turns the text next to an image into a filename-safe caption ("No_Cap" if it is not a figure caption)."""
+    # Check if text contains "Figure" or "Table" (or other keywords)
+    if not image_text or not any(keyword in image_text for keyword in FIGURE_KEYWORDS):
+        return "No_Cap"
+    figure_caption = image_text.replace("\n", " ").replace("  "," ").replace(" ", "_")
+    # Remove special characters that can't be in filenames
+    figure_caption = "".join(c for c in figure_caption if c.isalnum() or c in "_-")
+    # Remove repeated underscores
+    figure_caption = remove_repeated_underscores(figure_caption)
+    # Limit caption length
+    return figure_caption[:max_file_length]
+
+
+def open_pdf(pdf_path):
+    """Opens a PDF from a path or from its contents (bytes)."""
+    if isinstance(pdf_path, (bytes, bytearray)):
+        return fitz.open(stream=pdf_path, filetype="pdf")
+    return fitz.open(pdf_path)
+
+
+def iter_pixmaps(doc, max_file_length=100):
+    """
+    Yields every image embedded in an open PDF with its caption.
+
+    Yields:
+        dict with "page" (1-based), "index" (image number on the page),
+        "name" (filename without extension), "caption" (nearest text block,
+        or None) and "pixmap" (fitz.Pixmap as stored in the PDF).
+    """
+    for page_number in range(len(doc)):
+        page = doc[page_number]
+        image_list = page.get_images(full=True)
+        text_blocks = page.get_text("dict")["blocks"]
+        print(f"Page {page_number+1} has {len(image_list)} images and {len(text_blocks)} text blocks.")
+
+        for img_index, img in enumerate(image_list):
+            xref = img[0]
+            rects = page.get_image_rects(xref)
+            image_text = get_closest_text_block(text_blocks, rects[0]) if rects else None
+            figure_caption = caption_to_filename(image_text, max_file_length)
+            yield {
+                "page": page_number + 1,
+                "index": img_index,
+                "name": f"{page_number+1}_{img_index}_{figure_caption}",
+                "caption": image_text.strip() if image_text else None,
+                "pixmap": fitz.Pixmap(doc, xref),
+            }
+
+
+def iter_figures(pdf_path, max_file_length=100):
+    """
+    Yields the images embedded in a PDF as decoded BGR arrays, without
+    writing them to disk. `pdf_path` may also be the PDF contents as bytes.
+
+    Yields:
+        dict like iter_pixmaps, with "image" (np.ndarray, BGR uint8)
+        instead of "pixmap", or an "error" if the image cannot be decoded.
+    """
+    doc = open_pdf(pdf_path)
+    try:
+        for figure in iter_pixmaps(doc, max_file_length):
+            try:
+                figure["image"] = pixmap_to_bgr(figure.pop("pixmap"))
+            except Exception as e:
+                # One undecodable image does not end the PDF
+                print(f"[Failed] {figure['name']}: {e}")
+                figure["error"] = str(e)
+            yield figure
+    finally:
+        doc.close()
+
+
+def pixmap_to_numpy(pix):
+    """
+    Zero-copy view of the pixmap samples as an (H, W, n) uint8 array.
+
+    The array shares memory with the pixmap, so `pix` must be kept alive
+    (and not modified) while the view is in use.
+    """
+    samples = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    # Rows may be padded beyond width * n
+    rows = samples.reshape(pix.height, pix.stride)[:, :pix.width * pix.n]
+    return rows.reshape(pix.height, pix.width, pix.n)
+
+
+def to_rgb_colorspace(pix):
+    """
+    Converts a pixmap in any colorspace but gray and RGB (CMYK, DeviceN,
+    Separation, ...) to RGB with MuPDF; other pixmaps are returned as is.
+    """
+    colorspace = pix.colorspace
+    if colorspace is not None and (colorspace.n not in (1, 3) or colorspace.name.startswith(("DeviceN", "Separation"))):
+        return fitz.Pixmap(fitz.csRGB, pix)
+    return pix
+
+
+def pixmap_to_bgr(pix, dst=None):
+    """
+    Converts a pixmap to a BGR uint8 image in a single pass.
+
+    Other colorspaces (CMYK, DeviceN, ...) are converted to RGB by MuPDF, and
+    transparent pixels are composited over white (so an alpha channel does
+    not turn the plot background black).
+
+    Parameters:
+        pix (fitz.Pixmap): Pixmap in any colorspace, with or without alpha.
+        dst (np.ndarray): Optional (H, W, 3) uint8 output buffer.
+
+    Returns:
+        np.ndarray: BGR image (dst if given).
+    """
+    pix = to_rgb_colorspace(pix)
+    samples = pixmap_to_numpy(pix)
+    colors = pix.n - pix.alpha
+    if colors not in (1, 3):
+        raise ValueError(f"Unsupported pixmap with {pix.n} channels")
+
+    if pix.alpha:
+        alpha = samples[:, :, -1:].astype(np.uint16)
+        samples = (255 - (255 - samples[:, :, :colors].astype(np.uint16)) * alpha // 255).astype(np.uint8)
+    if colors == 1:
+        return cv2.cvtColor(samples[:, :, 0], cv2.COLOR_GRAY2BGR, dst=dst)
+    return cv2.cvtColor(samples, cv2.COLOR_RGB2BGR, dst=dst)
+
+
+def extract(pdf_path, output_folder ="pdf", max_file_length=100, save_png=True, on_image=None):
+  """
+  Extracts the images embedded in a PDF.
+
+  Parameters:
+      pdf_path: Path to the PDF (or its contents as bytes).
+      output_folder (str): Where the PNG files are written.
+      max_file_length (int): Maximum length of the caption part of the filenames.
+      save_png (bool): Write each image to output_folder as PNG.
+      on_image (callable): Optional sink called as on_image(name, image) with
+          each decoded BGR image, e.g. to process figures without a PNG round trip.
+  """
+
+  doc = open_pdf(pdf_path)
 
   total_images_saved = 0
 
-  os.makedirs(output_folder, exist_ok=True)
+  if save_png:
+      os.makedirs(output_folder, exist_ok=True)
 
   images_saved = []
 
-  for page_number in range(len(doc)):
-      page = doc[page_number]
-      image_list = page.get_images(full=True)
-      images_per_page = len(image_list) 
-      text_blocks = page.get_text("dict")["blocks"]
-      print(f"Page {page_number+1} has {images_per_page} images and {len(text_blocks)} text blocks.")
-
-      for img_index, img in enumerate(image_list):
-          xref = img[0]
-          rect = page.get_image_rects(xref)[0]
-          image_text = get_closest_text_block(text_blocks, rect)
-          # Check if text contains "Figure" or "Table" (or other keywords)
-          if image_text and any(keyword in image_text for keyword in figure_keywords):
-            # Get matched keyword
-            #   keyword = next((keyword for keyword in figure_keywords if keyword in image_text), None)       
-            figure_caption = image_text.replace("\n", " ").replace("  "," ").replace(" ", "_")
-            # Remove special characters that can't be in filenames
-            figure_caption = "".join(c for c in figure_caption if c.isalnum() or c in "_-")
-            # Remove repeated underscores
-            figure_caption = remove_repeated_underscores(figure_caption)
-            # Limit caption length to 50 characters
-            figure_caption = figure_caption[:max_file_length]
-            
-          else:
-            figure_caption = "No_Cap"
-        #   print(f"Image {page_number+1}.{img_index} with caption: {figure_caption}")
-         
-          pix = fitz.Pixmap(doc, xref)
-          # Check if image is CMYK; if so, convert to RGB
-          if pix.n >= 5:
-              pix = fitz.Pixmap(fitz.csRGB, pix)
-          name = f"{page_number+1}_{img_index}_{figure_caption}.png"
-          images_saved.append(name)
+  for figure in iter_pixmaps(doc, max_file_length):
+      pix = figure["pixmap"]
+      name = f"{figure['name']}.png"
+      images_saved.append(name)
+      if on_image is not None:
+          on_image(name, pixmap_to_bgr(pix))
+      if save_png:
+          # PNG takes gray and RGB only (CMYK, DeviceN, ... are converted)
+          pix = to_rgb_colorspace(pix)
           output_path = f"{output_folder}/{name}"
           pix.save(output_path)
-          pix = None
           print(f"[Saved] {output_path}")
           total_images_saved += 1
+      pix = None
+
+  doc.close()
 
   print("\n-----------------------------------------")
   print(f"Total images saved: {total_images_saved}")
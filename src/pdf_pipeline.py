@@ -0,0 +1,157 @@
+import os
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from pdf_extract import iter_figures
+from vector_figures import iter_vector_figures
+from run import main as run, result_to_json
+from plot_classifier import plot_likeness, MIN_PLOT_SCORE
+from presets import PRESETS
+from stage_cache import CalibrationCache
+
+
+def default_workers():
+    """Number of figures digitized at once (OpenCV and Tesseract release the GIL)."""
+    return min(4, os.cpu_count() or 1)
+
+
+def process_figure(figure, settings, min_plot_score=MIN_PLOT_SCORE):
+    """
+    Runs the extraction on one decoded PDF figure.
+
+    Images scoring below min_plot_score with plot_classifier.plot_likeness
+    (photos, logos, diagrams) are skipped before any expensive stage.
+
+    Returns:
+        dict: Figure metadata and "plot_score", plus the JSON-ready run.main
+        result, a "skipped" reason, or an "error" entry if the extraction failed.
+    """
+    entry = {key: value for key, value in figure.items() if key != "image"}
+    entry.setdefault("source", "raster")
+    if "error" in entry:
+        # The image could not be decoded (see pdf_extract.iter_figures)
+        return entry
+    likeness = plot_likeness(figure["image"])
+    entry["plot_score"] = likeness["score"]
+    if min_plot_score and likeness["score"] < min_plot_score:
+        print(f"[Skipped] {figure['name']}: not a plot (score {likeness['score']:.2f})")
+        entry["skipped"] = "not a plot"
+        entry["plot_features"] = likeness["features"]
+        return entry
+    try:
+        result = run(figure["image"], SimpleNamespace(**settings))
+    except Exception as e:
+        print(f"[Failed] {figure['name']}: {e}")
+        entry["error"] = str(e)
+        return entry
+    entry.update(result_to_json(result))
+    return entry
+
+
+def vector_entry_to_json(entry):
+    """Converts the NumPy arrays of a directly extracted vector figure to lists."""
+    entry = dict(entry)
+    entry["data_points"] = entry["data_points"].astype(float).tolist()
+    entry["series"] = [{**series, "data_points": series["data_points"].astype(float).tolist()}
+                       for series in entry["series"]]
+    return entry
+
+
+def process_pdf(pdf, args, output_folder="pdf", max_workers=None, max_file_length=100, min_plot_score=MIN_PLOT_SCORE,
+                vector=True, vector_dpi=200):
+    """
+    Extracts the images embedded in a PDF and digitizes each of them.
+
+    Figures are decoded in memory and handed to run.main as arrays (no PNG
+    round trip) and processed in parallel. Every figure writes its outputs
+    (extracted-image.png, axes-extraction.png, ...) to its own sub-folder.
+
+    Parameters:
+        pdf: Path to the PDF, or its contents as bytes.
+        args: run.main settings (object with attributes); output_folder is
+            replaced per figure and the figures share one calibration_cache.
+        output_folder (str): Parent folder of the per-figure outputs.
+        max_workers (int): Number of figures processed at once.
+        max_file_length (int): Maximum length of the caption part of a figure name.
+        min_plot_score (float): Images scoring lower are not digitized (0 keeps all).
+        vector (bool): Also extract figures drawn as vector graphics (see
+            vector_figures.iter_vector_figures); their series are read from
+            the path data, or they are clip-rendered at vector_dpi.
+
+    Returns:
+        dict: Manifest with "output_path", "total_figures", "skipped_figures"
+        and "figures" (one entry per image or vector figure, in page order,
+        with a "source" of "raster", "vector" or "vector-render").
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    settings = dict(vars(args))
+    # Figures of one PDF usually share a template: with calibration "cached"
+    # (e.g. the fast preset) their axis calibrations are reused within it
+    settings.setdefault("calibration_cache", CalibrationCache())
+
+    def figure_settings(figure):
+        folder = os.path.join(output_folder, figure["name"])
+        return {**settings, "output_folder": folder}
+
+    with ThreadPoolExecutor(max_workers=max_workers or default_workers()) as executor:
+        # Figures are submitted while the PDF is still being read
+        futures = [executor.submit(process_figure, figure, figure_settings(figure), min_plot_score)
+                   for figure in iter_figures(pdf, max_file_length)]
+        # Vector figures read from their path data need no further processing
+        extracted = []
+        if vector:
+            for figure in iter_vector_figures(pdf, vector_dpi, max_file_length):
+                if "image" in figure:
+                    futures.append(executor.submit(process_figure, figure, figure_settings(figure), min_plot_score))
+                else:
+                    extracted.append(vector_entry_to_json(figure))
+        figures = [future.result() for future in futures] + extracted
+    # Raster and vector figures, in page order
+    figures.sort(key=lambda figure: figure["page"])
+
+    skipped = sum(1 for figure in figures if "skipped" in figure)
+    print(f"Processed {len(figures) - skipped} figures ({skipped} skipped), output path: {output_folder}")
+    return {"output_path": output_folder, "total_figures": len(figures), "skipped_figures": skipped, "figures": figures}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract the figures of a PDF and digitize their data.")
+    parser.add_argument("--p", type=str, help="Path to the input PDF.")
+    parser.add_argument("--o", type=str, default="pdf", help="Output folder.")
+    parser.add_argument("--l", type=int, default=100, help="Maximum length of the figure names.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of figures processed in parallel.")
+    parser.add_argument("--target_color", type=str, default="blue", help="Color of the data trace.")
+    parser.add_argument("--delta", type=int, default=None, help="Color tolerance (default 20, or the discovered one for auto).")
+    parser.add_argument("--thin", type=int, default=6, help="Thin factor.")
+    parser.add_argument("--kernel_size", type=int, default=1, help="Kernel size.")
+    parser.add_argument("--deskew", action="store_true", help="Straighten rotated figures.")
+    parser.add_argument("--min_plot_score", type=float, default=MIN_PLOT_SCORE, help="Skip images less plot-like than this (0 keeps all).")
+    parser.add_argument("--no_vector", action="store_true", help="Ignore figures drawn as vector graphics.")
+    parser.add_argument("--vector_dpi", type=int, default=200, help="Resolution used when a vector figure has to be rendered.")
+    parser.add_argument("--no_render", action="store_true", help="Skip rendering the extracted-image.png figures.")
+    parser.add_argument("--preset", type=str, default=None, choices=list(PRESETS),
+                        help="Quality preset (fast for large batches, accurate for high-fidelity traces).")
+    parser.add_argument("--manifest", type=str, default=None, help="Manifest path (default: <output folder>/manifest.json).")
+
+    cli_args = parser.parse_args()
+    run_args = SimpleNamespace(
+        target_color=cli_args.target_color,
+        delta=cli_args.delta,
+        thin=cli_args.thin,
+        kernel_size=cli_args.kernel_size,
+        deskew=cli_args.deskew,
+        isMedian=True,
+        preset=cli_args.preset,
+    )
+    # Otherwise the preset decides
+    if cli_args.no_render:
+        run_args.render = False
+    manifest = process_pdf(os.path.expanduser(cli_args.p), run_args, cli_args.o, cli_args.workers, cli_args.l,
+                           cli_args.min_plot_score, not cli_args.no_vector, cli_args.vector_dpi)
+
+    manifest_path = cli_args.manifest or os.path.join(cli_args.o, "manifest.json")
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Manifest saved to {manifest_path}")
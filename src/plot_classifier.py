@@ -0,0 +1,86 @@
+import cv2
+import numpy as np
+from find_plot_corners import orthogonal_line_extent
+
+# Images scoring below this are treated as photos, logos or diagrams
+MIN_PLOT_SCORE = 0.5
+
+
+def downsample(image, max_dim=512):
+    """Shrinks an image so its longest side is at most max_dim pixels (INTER_AREA keeps thin lines visible)."""
+    scale = max_dim / max(image.shape[:2])
+    if scale >= 1:
+        return image
+    return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def color_sparsity(image, top_colors=8, bits=4):
+    """
+    Fraction of the pixels covered by the `top_colors` most common colors,
+    after quantizing each channel to `bits` bits. Plots (white background,
+    black axes, a few trace colors) score near 1, photos much lower.
+    """
+    if image.ndim == 2:
+        codes = (image >> (8 - bits)).ravel().astype(np.int64)
+    else:
+        q = (image[:, :, :3] >> (8 - bits)).astype(np.int64)
+        codes = ((q[:, :, 0] << (2 * bits)) | (q[:, :, 1] << bits) | q[:, :, 2]).ravel()
+    counts = np.bincount(codes)
+    top = np.partition(counts, -top_colors)[-top_colors:] if counts.size > top_colors else counts
+    return float(top.sum() / codes.size)
+
+
+def edge_density(image):
+    """Fraction of Canny edge pixels."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    edges = cv2.Canny(gray, 100, 200)
+    return float(np.count_nonzero(edges)) / edges.size
+
+
+def plot_likeness(image, max_dim=512, pool=None):
+    """
+    Cheap score of how much an image looks like a line plot, computed on a
+    downsampled copy so it can run before any expensive stage.
+
+    Features:
+        lines: Extent of the longest horizontal and vertical lines (axes or
+            frame); both directions are needed.
+        color_sparsity: See color_sparsity.
+        edge_density: Plots have sparse edges; photos and textures are dense,
+            blank images have none.
+
+    Parameters:
+        image: BGR or grayscale image.
+        max_dim: Longest side of the downsampled copy.
+        pool: Optional BufferPool for the line extraction.
+
+    Returns:
+        dict with "score" (0 to 1, see MIN_PLOT_SCORE) and the "features".
+    """
+    small = downsample(image, max_dim)
+    horizontal, vertical = orthogonal_line_extent(small, pool=pool)
+    lines = min(horizontal, vertical)
+    sparsity = color_sparsity(small)
+    edges = edge_density(small)
+
+    # Full marks between 0.2% and 10% edge pixels, fading to 0 at 30%
+    if edges < 0.002:
+        edge_score = edges / 0.002
+    else:
+        edge_score = float(np.clip((0.3 - edges) / 0.2, 0, 1))
+    # Line features carry the most weight: without axes there is nothing to digitize
+    score = 0.6 * min(1.0, lines / 0.5) + 0.25 * sparsity + 0.15 * edge_score
+    return {
+        "score": round(float(score), 3),
+        "features": {
+            "horizontal_lines": round(horizontal, 3),
+            "vertical_lines": round(vertical, 3),
+            "color_sparsity": round(sparsity, 3),
+            "edge_density": round(edges, 4),
+        },
+    }
+
+
+def is_plot(image, min_score=MIN_PLOT_SCORE, **kwargs):
+    """True if plot_likeness(image) reaches min_score."""
+    return plot_likeness(image, **kwargs)["score"] >= min_score
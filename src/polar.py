@@ -0,0 +1,121 @@
+import cv2
+import numpy as np
+from axis_calibration import AxisCalibration
+
+
+def frame_mask(image, max_value=128, max_saturation=80):
+    """Dark, unsaturated pixels (black frame and text; colored traces excluded)."""
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    return (hsv[:, :, 2] < max_value) & (hsv[:, :, 1] < max_saturation)
+
+
+def ring_support(mask, center, radius, samples=360, tolerance=2):
+    """
+    Fraction of the angles at which `mask` has a pixel within `tolerance`
+    pixels of the circle (all angles and offsets sampled at once).
+    """
+    angles = np.linspace(0, 2 * np.pi, samples, endpoint=False)
+    radii = radius + np.arange(-tolerance, tolerance + 1)[:, None]
+    xs = np.rint(center[0] + radii * np.cos(angles)).astype(np.intp)
+    ys = np.rint(center[1] + radii * np.sin(angles)).astype(np.intp)
+    height, width = mask.shape
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    hits = np.zeros(xs.shape, bool)
+    hits[inside] = mask[ys[inside], xs[inside]]
+    return float(hits.any(axis=0).mean())
+
+
+def fit_circle(xs, ys):
+    """Algebraic least-squares circle through points; returns (cx, cy, r)."""
+    xs = np.asarray(xs, np.float64)
+    ys = np.asarray(ys, np.float64)
+    A = np.column_stack([xs, ys, np.ones_like(xs)])
+    (a, b, c), *_ = np.linalg.lstsq(A, xs ** 2 + ys ** 2, rcond=None)
+    cx, cy = a / 2, b / 2
+    return cx, cy, float(np.sqrt(c + cx ** 2 + cy ** 2))
+
+
+def detect_polar_circle(image, min_radius_fraction=0.2, candidates=10):
+    """
+    Finds the outer circle of a polar plot.
+
+    Hough circle candidates are scored by how much of their perimeter lies on
+    dark frame pixels (ring_support); the best one is refined with a
+    least-squares fit to the frame pixels near it.
+
+    Parameters:
+        image: BGR image.
+        min_radius_fraction (float): Smallest radius, as a fraction of the
+            shorter image side.
+        candidates (int): Number of Hough candidates scored.
+
+    Returns:
+        dict with "center" (x, y), "radius" and "confidence" (ring support,
+        0 to 1), or None if no circle is found.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    size = min(gray.shape)
+    circles = cv2.HoughCircles(cv2.medianBlur(gray, 3), cv2.HOUGH_GRADIENT, dp=1, minDist=5, param1=100,
+                               param2=60, minRadius=int(min_radius_fraction * size), maxRadius=size // 2)
+    if circles is None:
+        return None
+    mask = frame_mask(image)
+    scored = [(ring_support(mask, (cx, cy), r), r, cx, cy) for cx, cy, r in circles[0][:candidates]]
+    # Best supported circle, the outer one among equals (inner rings are grid lines)
+    support, r, cx, cy = max(scored, key=lambda s: (round(s[0], 1), s[1]))
+
+    # Refine on the frame pixels close to the candidate
+    ys, xs = np.nonzero(mask)
+    near = np.abs(np.hypot(xs - cx, ys - cy) - r) < 0.03 * r + 3
+    if np.count_nonzero(near) >= 3:
+        cx, cy, r = fit_circle(xs[near], ys[near])
+        support = ring_support(mask, (cx, cy), r)
+    return {"center": (float(cx), float(cy)), "radius": float(r), "confidence": round(support, 3)}
+
+
+def unwarp_polar(image, center, radius, angle_bins=720, theta_zero=90, theta_direction=-1, margin=None):
+    """
+    Resamples a polar plot into an angle x radius image with cv2.warpPolar.
+
+    Column j is the aspect angle j * 360 / angle_bins degrees; row 0 is the
+    outer circle and the last row the center, so the unwarped image reads
+    like a Cartesian plot of radius versus angle.
+
+    Parameters:
+        image: BGR image.
+        center, radius: Plot circle (see detect_polar_circle).
+        angle_bins (int): Angular resolution of the output.
+        theta_zero (float): Direction of angle 0, counterclockwise from east
+            (90 = top, the usual RCS convention).
+        theta_direction (int): 1 for counterclockwise angles, -1 for clockwise.
+        margin (int): Pixels dropped inside the outer circle so the circle
+            itself is not read as data (default: 3 + 1% of the radius).
+
+    Returns:
+        np.ndarray: Unwarped image of shape (round(radius) - margin, angle_bins, 3).
+    """
+    if margin is None:
+        margin = 3 + int(round(0.01 * radius))
+    radius_bins = max(1, int(round(radius)))
+    # Nearest neighbour keeps the exact trace colors filter_colors relies on
+    warped = cv2.warpPolar(image, (radius_bins, angle_bins), center, radius,
+                           cv2.WARP_POLAR_LINEAR | cv2.INTER_NEAREST)
+    # warpPolar rows are image angles (clockwise from east, since y points down)
+    theta = np.arange(angle_bins) * 360.0 / angle_bins
+    image_angle = np.mod(-(theta_zero + theta_direction * theta), 360)
+    rows = np.rint(image_angle * angle_bins / 360).astype(np.intp) % angle_bins
+    return np.ascontiguousarray(warped[rows, :max(1, radius_bins - margin)].transpose(1, 0, 2)[::-1])
+
+
+def polar_calibrations(unwarped_shape, r_lim, radius):
+    """
+    (angle, radius) calibrations of an unwarp_polar image of a circle of
+    `radius` pixels: degrees along x, r_lim[0] at the center and r_lim[1] on
+    the outer circle along y.
+    """
+    height, width = unwarped_shape[:2]
+    x_calibration = AxisCalibration(360.0 / width, 0.0)
+    # The last row is the center; each row up is one radius_bins-th of the circle
+    slope = -(r_lim[1] - r_lim[0]) / max(1, int(round(radius)))
+    y_calibration = AxisCalibration(slope, r_lim[0] - slope * (height - 1))
+    return x_calibration, y_calibration
@@ -0,0 +1,25 @@
+# Quality presets of run.main (args.preset). Each one sets the speed/accuracy
+# settings of the whole pipeline together; settings given explicitly still win.
+PRESETS = {
+    # Rough medians from large batches: corners on a half-size image, axis
+    # calibration reused within a batch for identical layouts and tick labels,
+    # coarse contours, no rendered figure
+    "fast": {"corner_scale": 0.5, "calibration": "cached", "decimation": 0.0002, "render": False, "dpi": 100},
+    "balanced": {"corner_scale": 0.75, "calibration": "ocr", "decimation": 0.0001, "render": True, "dpi": 150},
+    # High-fidelity traces (the defaults of run.main)
+    "accurate": {"corner_scale": 1.0, "calibration": "ocr", "decimation": 0.0001, "render": True, "dpi": 300},
+}
+
+
+def preset_settings(name):
+    """
+    Settings of a quality preset (an empty dict for None).
+
+    Raises:
+        ValueError: If the preset is unknown.
+    """
+    if name is None:
+        return {}
+    if name not in PRESETS:
+        raise ValueError(f"Unknown preset {name!r}, expected one of {', '.join(PRESETS)}")
+    return dict(PRESETS[name])
@@ -1,46 +1,263 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 import cv2
+import numpy as np
 import matplotlib
 matplotlib.use("Agg")  # Use a non-GUI backend
 import matplotlib.pyplot as plt
-from graph_data_extractor import GraphDataExtractor
-from extract_axes import extract_axes_labels
-from utils import calculate_median_rcs
+from graph_data_extractor import GraphDataExtractor, MIN_COMPONENT_AREA, DECIMATION
+from extract_axes import extract_axes
+from axis_calibration import fit_axis, LOG_SCALES
+from utils import calculate_median_rcs, estimate_skew, rotate_image, string_to_hsv
+from stage_cache import hash_array, stage_key
+from color_discovery import plot_colors, MIN_SATURATION
+from find_plot_corners import PlotCorners, detect_plot_panels
+from polar import detect_polar_circle, unwarp_polar, polar_calibrations
+from presets import preset_settings
 
 from sample_figure import generate_sample_figure, plot_median
 
 
-def validate_limits(xlim):
+# pyplot keeps global state and is not thread-safe; figures rendered from
+# worker threads (pdf_pipeline) must take turns
+_pyplot_lock = threading.Lock()
+
+# Plot types run.main can digitize (args.mode)
+MODES = ("line", "polar", "markers", "bars")
+
+
+def validate_limits(xlim, scale="linear"):
   """Validates the x and y limits."""
   if xlim[0] >= xlim[1]:
       print(f"Invalid axis limits: {xlim}")
       return False
+  if scale in LOG_SCALES:
+      # Log axes may span e.g. 0.01 to 0.1, but cannot reach zero
+      if xlim[0] <= 0:
+          print(f"Invalid axis limits for a {scale} axis: {xlim}")
+          return False
+      return True
   if xlim[1] - xlim[0] < 1:
       print(f"Invalid axis limits: {xlim}")
       return False
   return True
 
+
+def roi_box(image_shape, offset, x_calibration, y_calibration, roi=None, x_range=None, y_range=None):
+    """
+    Pixel box of a region of interest, clipped to the current (plot area) image.
+
+    Parameters:
+        image_shape: Shape of the current image.
+        offset: Position of the current image in the input image.
+        x_calibration, y_calibration: Calibrations of the full plot area,
+            used to convert the data ranges to pixels.
+        roi: [left, top, right, bottom] in pixels of the input image (after deskew).
+        x_range, y_range: [start, end] in data units (dB for "db" axes).
+
+    Returns:
+        tuple: (left, top, right, bottom) in pixels of the current image.
+
+    Raises:
+        ValueError: If the region does not overlap the plot area.
+    """
+    height, width = image_shape[:2]
+    x0, y0 = offset
+    left, top, right, bottom = 0, 0, width, height
+    if roi is not None:
+        left, top = max(left, int(np.floor(roi[0])) - x0), max(top, int(np.floor(roi[1])) - y0)
+        right, bottom = min(right, int(np.ceil(roi[2])) - x0), min(bottom, int(np.ceil(roi[3])) - y0)
+    if x_range is not None:
+        pixels = x_calibration.to_pixel(x_range) - x0
+        left, right = max(left, int(np.floor(pixels.min()))), min(right, int(np.ceil(pixels.max())) + 1)
+    if y_range is not None:
+        pixels = y_calibration.to_pixel(y_range) - y0
+        top, bottom = max(top, int(np.floor(pixels.min()))), min(bottom, int(np.ceil(pixels.max())) + 1)
+    if right <= left or bottom <= top:
+        raise ValueError("Region of interest does not overlap the plot area")
+    return left, top, right, bottom
+
+def panel_boxes(image_shape, panels):
+    """
+    Crop box of every panel of a multi-panel figure: the panel frame grown
+    halfway towards the neighbouring frames (or to the image edge), so each
+    crop keeps the panel's tick labels and title but no other frame.
+
+    Parameters:
+        image_shape: Shape of the figure image.
+        panels: PlotCorners of the panels (see detect_plot_panels).
+
+    Returns:
+        list: (left, top, right, bottom) pixel boxes, one per panel.
+    """
+    height, width = image_shape[:2]
+    frames = np.array([[p.origin[0], p.top_right[1], p.top_right[0], p.origin[1]] for p in panels])
+    boxes = []
+    for left, top, right, bottom in frames:
+        others = frames[(frames != [left, top, right, bottom]).any(axis=1)]
+        same_row = (others[:, 1] < bottom) & (others[:, 3] > top)
+        same_column = (others[:, 0] < right) & (others[:, 2] > left)
+        before = others[same_row & (others[:, 2] <= left), 2]
+        after = others[same_row & (others[:, 0] >= right), 0]
+        above = others[same_column & (others[:, 3] <= top), 3]
+        below = others[same_column & (others[:, 1] >= bottom), 1]
+        boxes.append((
+            int((before.max() + left) // 2) if before.size else 0,
+            int((above.max() + top) // 2) if above.size else 0,
+            int((after.min() + right + 1) // 2) if after.size else width,
+            int((below.min() + bottom + 1) // 2) if below.size else height,
+        ))
+    return boxes
+
+
+def extract_panels(image, args, panels, max_workers=None):
+    """
+    Runs main() on every panel of a multi-panel figure in a thread pool.
+
+    Each panel is cropped with panel_boxes and extracted independently, with
+    its own frame detection and axis OCR, into an output sub-folder
+    panel-<index>. The stage cache is not used for the panels.
+
+    Parameters:
+        image: BGR figure image.
+        args: main() settings; a pixel roi is in figure coordinates.
+        panels: PlotCorners of the panels (see detect_plot_panels).
+        max_workers (int): Number of panels extracted at once.
+
+    Returns:
+        dict: "panels" (the main() result of each panel, with its "panel"
+        index and crop "box", or an "error" entry), "series" (one entry per
+        panel with its index, box and data points) and the "extracted_image"
+        of the first panel.
+    """
+    settings = dict(vars(args))
+    output_folder = settings.get("output_folder", "static/images")
+    boxes = panel_boxes(image.shape, panels)
+
+    def extract_panel(index):
+        left, top, right, bottom = boxes[index]
+        panel_settings = {**settings, "panels": False, "stage_cache": None, "image_key": None,
+                          "output_folder": os.path.join(output_folder, f"panel-{index}")}
+        if settings.get("roi") is not None:
+            roi = settings["roi"]
+            panel_settings["roi"] = [roi[0] - left, roi[1] - top, roi[2] - left, roi[3] - top]
+        entry = {"panel": index, "box": [left, top, right, bottom]}
+        try:
+            result = main(np.ascontiguousarray(image[top:bottom, left:right]), SimpleNamespace(**panel_settings))
+        except ValueError as e:
+            print(f"[Failed] panel {index}: {e}")
+            entry["error"] = str(e)
+            return entry
+        entry.update(result)
+        return entry
+
+    print(f"Found {len(panels)} plot panels")
+    # OpenCV and Tesseract release the GIL, so the panels run concurrently
+    with ThreadPoolExecutor(max_workers=max_workers or min(len(panels), os.cpu_count() or 1)) as executor:
+        results = list(executor.map(extract_panel, range(len(panels))))
+
+    series = [{"panel": r["panel"], "box": r["box"],
+               "data_points": r["data_points"] if r.get("data_points") is not None else np.empty((0, 2))}
+              for r in results]
+    return {
+        "origin": None,
+        "data_points": None,
+        "median_rcs": None,
+        "panels": results,
+        "series": series,
+        "extracted_image": next((r["extracted_image"] for r in results if r.get("extracted_image")), None),
+        "cached_stages": [],
+    }
+
+
 def main(image, args):
     # Settings and paths from arguments
 
+    # Quality preset ("fast", "balanced" or "accurate", see presets.py): the
+    # defaults of the settings below it coordinates
+    preset = preset_settings(getattr(args, "preset", None))
+
     # Analysis properties
-    target_color = getattr(args, 'target_color', 'blue')
-    delta        = getattr(args, 'delta', 20)
+    target_color = getattr(args, 'target_color', 'blue')  # or "auto" (color_discovery)
+    delta        = getattr(args, 'delta', None)  # None: 20, or the discovered one for "auto"
     debug        = getattr(args, 'debug', False)
     output_folder= getattr(args, 'output_folder', 'static/images')
     thin         = getattr(args, 'thin', 6)
     kernel_size  = getattr(args, 'kernel_size', 1)
+    min_component_area = getattr(args, 'min_component_area', MIN_COMPONENT_AREA)  # pixels
+    # Follow same-color curves column by column (trace_tracking) instead of
+    # reading the contours; traces=None estimates the number of curves
+    tracking     = getattr(args, 'tracking', False)
+    traces       = getattr(args, 'traces', None)
     xlim         = getattr(args, "x_lim", None)
     ylim         = getattr(args, "y_lim", None)
     title        = getattr(args, "title", "Title")
     x_label      = getattr(args, "x_label", "X Axis")
     y_label      = getattr(args, "y_label", "Y Axis")
     isMedian     = getattr(args, "isMedian", False)
+    deskew       = getattr(args, "deskew", False)
+    deskew_threshold = getattr(args, "deskew_threshold", 0.2)  # degrees
+    min_corner_confidence = getattr(args, "min_corner_confidence", 0.3)
+    # "linear", "log10", "db" (log-spaced labels, values reported in dB) or
+    # "auto" (detected from the tick labels, linear for manual limits)
+    x_scale      = getattr(args, "x_scale", "auto")
+    y_scale      = getattr(args, "y_scale", "auto")
+    # Optional region of interest: a pixel box [left, top, right, bottom] of the
+    # input image and/or [start, end] data ranges along each axis
+    roi          = getattr(args, "roi", None)
+    x_range      = getattr(args, "x_range", None)
+    y_range      = getattr(args, "y_range", None)
+    # "line" (Cartesian plot), "polar" (radius versus aspect angle, see polar.py)
+    # "markers" (scatter plot, one point per marker) or "bars" (bar chart)
+    mode         = getattr(args, "mode", "line")
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {', '.join(MODES)}")
+    # Polar plots: radius values at the center and on the outer circle, the
+    # direction of angle 0 (degrees counterclockwise from east) and the sense
+    r_lim        = getattr(args, "r_lim", None)
+    theta_zero   = getattr(args, "theta_zero", 90)
+    theta_direction = getattr(args, "theta_direction", -1)
+    angle_bins   = getattr(args, "angle_bins", 720)
+    # Bar charts: one series per bar color (default: target_color, or all
+    # discovered colors when it is "auto"), "vertical" or "horizontal" bars
+    bar_colors   = getattr(args, "bar_colors", None)
+    bar_orientation = getattr(args, "bar_orientation", "vertical")
+    # Remove gridlines drawn in the trace color and mask legends (swatch and
+    # label) before the contours are read (see suppression.py)
+    suppress_grid = getattr(args, "suppress_grid", False)
+    suppress_legend = getattr(args, "suppress_legend", False)
+    # Corner detection on an image downscaled by corner_scale; axis OCR on
+    # every figure ("ocr") or once per frame layout and tick labels within a
+    # batch ("cached", needs the batch's calibration_cache, see
+    # stage_cache.CalibrationCache); contour simplification tolerance
+    corner_scale = getattr(args, "corner_scale", preset.get("corner_scale", 1.0))
+    calibration  = getattr(args, "calibration", preset.get("calibration", "ocr"))
+    calibration_cache = getattr(args, "calibration_cache", None)
+    decimation   = getattr(args, "decimation", preset.get("decimation", DECIMATION))
+    if calibration not in ("ocr", "cached"):
+        raise ValueError(f'Unknown calibration {calibration!r}, expected "ocr" or "cached"')
+    # Multi-panel figures (subplot grids): extract every detected plot frame
+    # separately (see extract_panels)
+    panels       = getattr(args, "panels", False)
+    panel_workers = getattr(args, "panel_workers", None)
     axes_extract_factor = 0.004
 
+    if panels and mode != "polar":
+        detected = detect_plot_panels(image)
+        if len(detected) > 1:
+            return extract_panels(image, args, detected, panel_workers)
+
+    if mode == "polar":
+        # Angles along x of the unwarped plot, radii along y
+        xlim, ylim = [0, 360], r_lim or ylim or [-30, 30]
+        x_scale = y_scale = "linear"
+
     # Figure properties
     classification = getattr(args, 'classification', "SAMPLE")
-    dpi            = getattr(args, "dpi", 300)
+    dpi            = getattr(args, "dpi", preset.get("dpi", 300))
+    render         = getattr(args, "render", preset.get("render", True))
 
     # Create output folder if it doesn't exist
     os.makedirs(output_folder, exist_ok=True)
@@ -48,76 +265,318 @@ def main(image, args):
     if debug:
         print("DEBUG MODE: ")
 
-    # Initialize extractor and load image
+    # Optional session cache of the stage results (interactive re-extraction):
+    # each stage key chains the upstream key with the parameters the stage
+    # uses, so only stages downstream of a changed parameter are recomputed.
+    stage_cache = getattr(args, "stage_cache", None)
+    cached_stages = []
+    image_key = None
+    if stage_cache is not None:
+        image_key = getattr(args, "image_key", None) or hash_array(image)
+
+    # Initialize extractor
     extractor = GraphDataExtractor()
-    extractor.image = image.copy()
     extractor.set_kernel_size(kernel_size)
     extractor.set_thin(thin)
+    extractor.set_min_component_area(min_component_area)
+    extractor.set_decimation(decimation)
 
-    # Get original area and crop if necessary
-    original_image_area = extractor.get_image_area()
-    extractor.crop_to_plot_area()
-    min_plot_area = original_image_area * 0.8
-    plot_area = extractor.get_image_area()
-    
-    if plot_area < min_plot_area:
-        # extractor.load_image(image_path, target_color=target_color, delta=delta)
-        extractor.image = image
-        print(f"Reloaded image area = {extractor.get_image_area()}\n")
+    def run_stage(name, key, compute, state):
+        """
+        Runs compute() (which updates the extractor and returns the stage's
+        other results), or restores the extractor attributes in `state` and
+        the results from the stage cache.
+        """
+        if stage_cache is not None:
+            cached = stage_cache.get(name, key)
+            if cached is not None:
+                results, snapshot = cached
+                extractor.restore(snapshot)
+                cached_stages.append(name)
+                return results
+        results = compute()
+        if stage_cache is not None:
+            stage_cache.put(name, key, (results, extractor.snapshot(*state)))
+        return results
+
+    def frame_stage():
+        frame_image = image
+        # Optionally straighten scanned/rotated figures before anything else
+        deskew_angle = 0.0
+        if deskew:
+            angle, method = estimate_skew(frame_image)
+            if debug:
+                print(f"Estimated skew: {angle:.2f} degrees ({method})")
+            if abs(angle) > deskew_threshold:
+                # Nearest-neighbour keeps the exact line/trace colors filter_colors relies on
+                frame_image = rotate_image(frame_image, angle, border_value=(255, 255, 255), interpolation=cv2.INTER_NEAREST)
+                deskew_angle = angle
+
+        # Load image
+        extractor.copy_image(frame_image)
 
-    # Get plot area origin first
-    origin, _ = extractor.find_corners(debug=debug, output_folder=output_folder)
+        # Detect the plot frame once on the full image. Without a confident frame
+        # there is nothing to crop to and no origin to place the axis OCR regions,
+        # so those stages are skipped.
+        corners = extractor.detect_corners(debug=debug, output_folder=output_folder, scale=corner_scale)
+        has_frame = corners.confidence >= min_corner_confidence
+
+        if has_frame:
+            # Get original area and crop if necessary
+            original_image_area = extractor.get_image_area()
+            extractor.crop_to_plot_area(corners=corners)
+            min_plot_area = original_image_area * 0.8
+            plot_area = extractor.get_image_area()
+
+            if plot_area < min_plot_area:
+                # extractor.load_image(image_path, target_color=target_color, delta=delta)
+                extractor.set_image(frame_image)
+                print(f"Reloaded image area = {extractor.get_image_area()}\n")
+                # Same image as the first detection, no need to detect again
+                origin = corners.origin
+            else:
+                # Get plot area origin first
+                origin, _ = extractor.find_corners(debug=debug, output_folder=output_folder, scale=corner_scale)
+        else:
+            print(f"Low corner detection confidence ({corners.confidence:.2f}), skipping crop and axes extraction")
+            origin = None
+        return {"image": frame_image, "deskew_angle": deskew_angle, "corners": corners,
+                "has_frame": has_frame, "origin": origin}
+
+    def polar_frame_stage():
+        # Unwarp the plot circle once; the rest of the pipeline sees a Cartesian
+        # plot of radius versus angle without a frame
+        circle = detect_polar_circle(image)
+        if circle is None or circle["confidence"] < min_corner_confidence:
+            raise ValueError("No polar plot circle found")
+        print(f"Polar plot circle: center {circle['center']}, radius {circle['radius']:.1f}")
+        unwarped = unwarp_polar(image, circle["center"], circle["radius"], angle_bins=angle_bins,
+                                theta_zero=theta_zero, theta_direction=theta_direction)
+        extractor.set_image(unwarped)
+        return {"image": unwarped, "deskew_angle": 0.0, "corners": PlotCorners(None, None, 0.0, []),
+                "has_frame": False, "origin": None, "circle": circle}
+
+    if mode == "polar":
+        frame_key = stage_key(image_key, mode, min_corner_confidence, angle_bins, theta_zero, theta_direction)
+        frame = run_stage("frame", frame_key, polar_frame_stage, ("image", "offset"))
+    else:
+        frame_key = stage_key(image_key, deskew, deskew_threshold, min_corner_confidence, corner_scale)
+        frame = run_stage("frame", frame_key, frame_stage, ("image", "offset"))
+    image = frame["image"]
+    deskew_angle = frame["deskew_angle"]
+    corners = frame["corners"]
+    has_frame = frame["has_frame"]
+    origin = frame["origin"]
+
+    # Auto color: use the dominant trace color inside the plot frame
+    colors = None
+    if target_color == "auto":
+        colors = run_stage("colors", stage_key(frame_key), lambda: plot_colors(
+            image, corners=corners, min_corner_confidence=min_corner_confidence)["colors"], ())
+        if colors:
+            target_color = colors[0]["color"]
+            if delta is None:
+                # Hue tolerance covering the discovered cluster
+                delta = colors[0]["delta"]
+            print(f"Discovered trace colors: {', '.join(c['color'] for c in colors)}")
+        else:
+            print("No trace color found, using blue")
+            target_color = "blue"
+    if delta is None:
+        delta = 20
 
     axes_file_path = os.path.join(output_folder, "axes-extraction.png")
 
-    # Find plot corners (origin) and extract axes labels
-    if xlim is None or ylim is None:
-        print("No axes specified, attempting to extract from image")
-        image = extractor.get_image()
-        
-        x_axis, y_axis = extract_axes_labels(image, origin, DEBUG=args.debug, factor=axes_extract_factor, debug_file_path=axes_file_path)
-        
-        if not x_axis:
-            print("No x axis found, using default")
-            x_axis = [0, 180]
-        if not y_axis:
-            print("No y axis found, using default")
-            y_axis = [-30, 30]
-
-        xlim = [x_axis[0], x_axis[-1]]
-        ylim = [y_axis[0], y_axis[-1]]
-
-        if not validate_limits(xlim):
-            print("Using default x limits")
-            xlim = [0, 180]
-        if not validate_limits(ylim):
-            print("Using default y limits")
-            ylim = [-30, 30]
+    def axes_stage():
+        xlim_, ylim_ = xlim, ylim
+        x_scale_, y_scale_ = x_scale, y_scale
+        # Find plot corners (origin) and extract axes labels
+        x_calibration = y_calibration = None
+        if xlim_ is None or ylim_ is None:
+            if origin is None:
+                print("No plot origin found, using default axes")
+                x_axis, y_axis = [], []
+            else:
+                print("No axes specified, attempting to extract from image")
+                axes_image = extractor.get_image()
+
+                axes = extract_axes(axes_image, origin, DEBUG=debug, factor=axes_extract_factor, debug_file_path=axes_file_path)
+                x_axis, y_axis = axes["x_axis"], axes["y_axis"]
+                if x_scale_ == "auto":
+                    x_scale_ = axes["x_scale"]
+                if y_scale_ == "auto":
+                    y_scale_ = axes["y_scale"]
+
+                # Fit pixel -> value mappings from the tick label positions, in the
+                # coordinates of the uncropped image so they survive later crops
+                dx, dy = extractor.offset
+                x_calibration = fit_axis([(v, p + dx) for v, p in axes["x_ticks"]], scale=x_scale_)
+                y_calibration = fit_axis([(v, p + dy) for v, p in axes["y_ticks"]], scale=y_scale_)
+                if debug:
+                    print(f"X calibration: {x_calibration}")
+                    print(f"Y calibration: {y_calibration}")
+
+            if not x_axis:
+                print("No x axis found, using default")
+                x_axis = [0, 180]
+            if not y_axis:
+                print("No y axis found, using default")
+                y_axis = [-30, 30]
+
+            xlim_ = [x_axis[0], x_axis[-1]]
+            ylim_ = [y_axis[0], y_axis[-1]]
+
+            if not validate_limits(xlim_, x_scale_):
+                print("Using default x limits")
+                xlim_ = [0, 180]
+                x_scale_, x_calibration = "linear", None
+            if not validate_limits(ylim_, y_scale_):
+                print("Using default y limits")
+                ylim_ = [-30, 30]
+                y_scale_, y_calibration = "linear", None
+        else:
+            # save a blank image
+            print(f"Manual Axes input... overwriting {axes_file_path}")
+            cv2.imwrite(axes_file_path, image)
+
+        # Without tick labels to detect from, assume linear axes
+        if x_scale_ == "auto":
+            x_scale_ = "linear"
+        if y_scale_ == "auto":
+            y_scale_ = "linear"
+        return xlim_, ylim_, x_scale_, y_scale_, x_calibration, y_calibration
+
+    axes_key = stage_key(frame_key, xlim, ylim, x_scale, y_scale)
+    compute_axes = axes_stage
+    if calibration == "cached" and calibration_cache is not None and origin is not None and (xlim is None or ylim is None):
+        # Same template and tick labels, same calibration: the label strips
+        # (left of and below the frame) are part of the key, so figures that
+        # only share the layout are still read separately
+        axes_image = extractor.get_image()
+        layout_key = stage_key(axes_image.shape, origin, corners.top_right, xlim, ylim, x_scale, y_scale,
+                               hash_array(axes_image[:, :origin[0]]), hash_array(axes_image[origin[1]:]))
+        compute_axes = lambda: calibration_cache.get_or_compute(layout_key, axes_stage)
+    xlim, ylim, x_scale, y_scale, x_calibration, y_calibration = run_stage("axes", axes_key, compute_axes, ())
+    if mode == "polar":
+        x_calibration, y_calibration = polar_calibrations(image.shape, ylim, frame["circle"]["radius"])
+
+    # Restrict the color filtering, morphology and contours to the region of
+    # interest. The image edges no longer match the axis limits once cropped,
+    # so the calibrations of the full plot area are fixed beforehand.
+    def crop_to_frame():
+        if has_frame and extractor.offset == (0, 0):
+            # The frame stage kept the uncropped image: crop to the detected
+            # frame here, as the second crop in the mask stage does otherwise
+            extractor.crop_to_plot_area(corners=corners)
+
+    roi_calibrations = None
+    roi_pixels = None
+    if roi is not None or x_range is not None or y_range is not None:
+        crop_to_frame()
+        extractor.set_limits(xlim, ylim, x_scale=x_scale, y_scale=y_scale)
+        extractor.set_calibration(x_calibration, y_calibration)
+        roi_calibrations = extractor.get_calibration()
+        left, top, right, bottom = roi_box(extractor.image.shape, extractor.offset, *roi_calibrations,
+                                           roi=roi, x_range=x_range, y_range=y_range)
+        dx, dy = extractor.offset
+        roi_pixels = [left + dx, top + dy, right + dx, bottom + dy]
+        print(f"Region of interest: {roi_pixels}")
+
+    def crop_to_roi():
+        if roi_pixels is not None:
+            x0, y0 = extractor.offset
+            extractor.crop((roi_pixels[0] - x0, roi_pixels[3] - y0), (roi_pixels[2] - x0, roi_pixels[1] - y0))
+
+    def mask_stage():
+        crop_to_roi()
+        # Convert to grayscale after isolating target color. Inside a polar
+        # plot black is text and grid, unless the trace itself is black.
+        keep_black = mode != "polar" or string_to_hsv(target_color)[1] < MIN_SATURATION
+        extractor.filter_to_gray(target_color, delta=delta, keep_black=keep_black)
+        # Crop again to the plot area (a region of interest is already inside it)
+        if has_frame and roi_pixels is None:
+            extractor.crop_to_plot_area()
+
+    # Bar charts are measured on the color plot area, without the mask,
+    # morphology and contour stages
+    if mode == "bars":
+        crop_to_frame()
+        crop_to_roi()
     else:
-        # save a blank image
-        print(f"Manual Axes input... overwriting {axes_file_path}")
-        cv2.imwrite(axes_file_path, image)
-
-    # Convert to grayscale after isolating target color
-    extractor.filter_to_gray(target_color, delta=delta)
-    # Crop again to the plot area
-    extractor.crop_to_plot_area()
+        mask_key = stage_key(frame_key, target_color, delta, roi_pixels)
+        run_stage("mask", mask_key, mask_stage, ("image", "offset"))
+
+    def morphology_stage():
+        extractor.threshold_image()
+        # The edges of a region of interest cut through the data, not the frame
+        # (and a polar plot has no frame left after unwarping)
+        extractor.clean_image(mask_border=roi_pixels is None and mode != "polar")
+
+    if mode != "bars":
+        morphology_key = stage_key(mask_key, kernel_size)
+        run_stage("morphology", morphology_key, morphology_stage, ("thresholded_image", "cleaned_image"))
+
+    def suppression_stage():
+        if suppress_grid:
+            extractor.remove_gridlines()
+        if suppress_legend:
+            # The color pixels of the current (cropped) area
+            dx, dy = extractor.offset
+            height, width = extractor.cleaned_image.shape[:2]
+            extractor.mask_legends(image[dy:dy + height, dx:dx + width])
+            if extractor.legend_boxes:
+                print(f"Masked legends: {extractor.legend_boxes}")
+
+    if mode != "bars":
+        suppression_key = stage_key(morphology_key, suppress_grid, suppress_legend)
+        if suppress_grid or suppress_legend:
+            run_stage("suppression", suppression_key, suppression_stage, ("cleaned_image", "legend_boxes"))
+
+    if mode in ("line", "polar"):
+        contours_key = stage_key(suppression_key, thin, min_component_area)
+        run_stage("contours", contours_key, extractor.find_contours, ("eroded_image", "contours", "contour_stats"))
+
     # Set limits
-    extractor.set_limits(xlim, ylim)
-    # Run the full data extraction process
-    extractor.process()
+    extractor.set_limits(xlim, ylim, x_scale=x_scale, y_scale=y_scale)
+    if roi_calibrations is not None:
+        extractor.set_calibration(*roi_calibrations)
+    else:
+        extractor.set_calibration(x_calibration, y_calibration)
+    # Scale the contour points (always recomputed, it only depends on cheap inputs)
+    if mode == "bars":
+        if not bar_colors:
+            bar_colors = [c["color"] for c in colors] if colors else [target_color]
+        extractor.extract_bars(bar_colors, delta=delta, orientation=bar_orientation)
+    elif mode == "markers":
+        extractor.extract_markers()
+    elif tracking:
+        extractor.track_traces(traces)
+    else:
+        extractor.extract_data_points()
+    if cached_stages:
+        print(f"Reused cached stages: {', '.join(cached_stages)}")
 
-    if debug:
+    if debug and mode != "bars":
         extractor.plot_thresholded_image(os.path.join(output_folder, "extract-threshold.png"))
         extractor.plot_cleaned_image(os.path.join(output_folder, "extract-cleaned.png"))
-        extractor.plot_contours(os.path.join(output_folder, "extract-contours.png"))
+        if mode != "markers":
+            extractor.plot_contours(os.path.join(output_folder, "extract-contours.png"))
 
+    # Hand the working images back to the buffer pool for the next request
+    extractor.release_buffers()
 
     # Get data
     data_points = extractor.data_points
+    series = extractor.series
     median = None
+    figure_path = None
+
+    has_data = data_points is not None and len(data_points) > 0
 
-    if data_points is not None and len(data_points):
+    if has_data and isMedian:
+        median = calculate_median_rcs(data_points)
+
+    if has_data and render:
         # Define plot settings
         settings = {
             "title": title,
@@ -125,37 +584,64 @@ def main(image, args):
             "y_label": y_label,
             "type": classification,
             "x_lim": xlim,
-            "y_lim": ylim
+            "y_lim": ylim,
+            "x_scale": x_scale,
+            "y_scale": y_scale
         }
 
         # Generate the sample figure
         figure_path = os.path.join(output_folder, "extracted-image.png")
-        ax = generate_sample_figure(settings)
-        ax.plot(data_points[:, 0], data_points[:, 1], linestyle='-', color='blue', linewidth=0.8)
-        print(f"Saving figure to {figure_path}")
+        with _pyplot_lock:
+            ax = generate_sample_figure(settings)
+            if mode == "bars":
+                # One marker per bar end, in the bar color
+                for s in series:
+                    ax.plot(s["data_points"][:, 0], s["data_points"][:, 1], linestyle='none', marker='s',
+                            markersize=4, color=s["color"])
+            elif series:
+                # One color per tracked curve
+                for s in series:
+                    ax.plot(s["data_points"][:, 0], s["data_points"][:, 1], linestyle='-', linewidth=0.8)
+            elif mode == "markers":
+                ax.plot(data_points[:, 0], data_points[:, 1], linestyle='none', marker='o', markersize=3, color='blue')
+            else:
+                ax.plot(data_points[:, 0], data_points[:, 1], linestyle='-', color='blue', linewidth=0.8)
+            print(f"Saving figure to {figure_path}")
 
-        if isMedian:
-            median = calculate_median_rcs(data_points)
-            print(f"Plotting Median RCS: {median}")
-            plot_median(median, data_points)
-            
+            if isMedian:
+                print(f"Plotting Median RCS: {median}")
+                plot_median(median, data_points)
 
-        plt.savefig(figure_path, dpi=dpi)
-        plt.close()
+            plt.savefig(figure_path, dpi=dpi)
+            plt.close()
 
-        
-    else:
+    elif not has_data:
         print("\n!!!!! ERROR EXTRACTING DATA !!!!!\n")
         
 
 
     result = {
         "origin": origin,
+        "corner_confidence": corners.confidence,
         "xlim": xlim,
         "ylim": ylim,
+        "x_scale": x_scale,
+        "y_scale": y_scale,
+        "target_color": target_color,
+        "delta": delta,
+        "colors": colors,
+        "x_calibration": x_calibration.as_dict() if x_calibration else None,
+        "y_calibration": y_calibration.as_dict() if y_calibration else None,
         "median_rcs": median,
+        "deskew_angle": deskew_angle,
+        "polar": frame.get("circle"),
+        "roi": roi_pixels,
         "data_points": data_points,
-        "extracted_image": figure_path
+        "marker_count": extractor.marker_count,
+        "legend_boxes": extractor.legend_boxes,
+        "series": series,
+        "extracted_image": figure_path,
+        "cached_stages": cached_stages
     }
     
 
@@ -163,4 +649,20 @@ def main(image, args):
         print("Data points:", data_points)
         print("Median:", median)
 
-    return result
\ No newline at end of file
+    return result
+
+
+def result_to_json(result):
+    """Converts the NumPy values in a main() result to plain Python types for JSON responses."""
+    result = dict(result)
+    if hasattr(result["data_points"], "tolist"):
+        result["data_points"] = result["data_points"].astype(float).tolist()
+    if result.get("series"):
+        result["series"] = [{**s, "data_points": s["data_points"].astype(float).tolist()} for s in result["series"]]
+    if hasattr(result["median_rcs"], "item"):
+        result["median_rcs"] = float(result["median_rcs"].item())
+    if result["origin"] is not None:
+        result["origin"] = [int(v) for v in result["origin"]]
+    if result.get("panels"):
+        result["panels"] = [panel if "error" in panel else result_to_json(panel) for panel in result["panels"]]
+    return result
@@ -28,6 +28,8 @@ def generate_sample_figure(settings):
     line_width = settings.get("line_width",0.5)
     x_min, x_max = settings.get("x_lim", [0, 180])
     y_min, y_max = settings.get("y_lim", [-30, 30])
+    x_scale = settings.get("x_scale", "linear")
+    y_scale = settings.get("y_scale", "linear")
 
 
     # Create the figure and axis with a white background
@@ -41,6 +43,15 @@ def generate_sample_figure(settings):
 
     # Set x-axis ticks and axis limits
     # ax.set_xticks(np.arange(0, 181, 20))
+    # Limits are axis label values; dB axes are plotted in dB
+    if x_scale == "log10":
+        ax.set_xscale("log")
+    elif x_scale == "db":
+        x_min, x_max = 10 * np.log10(x_min), 10 * np.log10(x_max)
+    if y_scale == "log10":
+        ax.set_yscale("log")
+    elif y_scale == "db":
+        y_min, y_max = 10 * np.log10(y_min), 10 * np.log10(y_max)
     ax.set_xlim(x_min, x_max)
     ax.set_ylim(y_min, y_max)
 
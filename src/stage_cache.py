@@ -0,0 +1,173 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def hash_bytes(data):
+    """Hex digest of raw bytes (e.g. an uploaded file)."""
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def hash_array(array):
+    """Hex digest of an array's pixels, shape and dtype."""
+    array = np.ascontiguousarray(array)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{array.shape}|{array.dtype.str}|".encode())
+    digest.update(array.data)
+    return digest.hexdigest()
+
+
+def stage_key(*inputs):
+    """
+    Key of a pipeline stage from its inputs: the key of the upstream stage
+    and the parameters the stage itself uses.
+    """
+    return hashlib.blake2b(repr(inputs).encode(), digest_size=20).hexdigest()
+
+
+class StageCache:
+    """
+    Results of the pipeline stages for one interactive session.
+
+    Only the latest result of each stage is kept. Because every stage key
+    includes the key of the stage before it, changing a parameter misses the
+    stage that uses it and every stage downstream, while the upstream stages
+    (decode, corners/crop, OCR) are reused.
+
+    Stored values must not share memory with buffer-pool buffers, since
+    those are recycled after each request (see GraphDataExtractor.snapshot).
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.last_used = time.monotonic()
+
+    def get(self, stage, key):
+        """Returns the stored result of `stage` if it was computed for `key`, else None."""
+        with self._lock:
+            self.last_used = time.monotonic()
+            entry = self._entries.get(stage)
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, stage, key, value):
+        """Stores the result of `stage` for `key`, replacing the previous one."""
+        with self._lock:
+            self._entries[stage] = (key, value)
+
+    def get_or_compute(self, stage, key, compute):
+        """Returns the stored result of `stage`, calling compute() on a miss."""
+        value = self.get(stage, key)
+        if value is None:
+            value = compute()
+            self.put(stage, key, value)
+        return value
+
+    def fork(self, stages):
+        """
+        New cache holding the current results of the given stages (shared,
+        not copied: stored values are read-only), e.g. to evaluate several
+        downstream settings concurrently from the same upstream stages.
+        """
+        cache = StageCache()
+        with self._lock:
+            cache._entries = {stage: self._entries[stage] for stage in stages if stage in self._entries}
+        return cache
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "stages": sorted(self._entries)}
+
+
+class SessionStore:
+    """
+    Stage caches of the active sessions (bounded LRU; sessions idle for
+    longer than `ttl` seconds are dropped).
+    """
+
+    def __init__(self, max_sessions=8, ttl=15 * 60):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """Returns the StageCache of a session, creating it if needed."""
+        with self._lock:
+            now = time.monotonic()
+            for expired in [sid for sid, cache in self._sessions.items() if now - cache.last_used > self.ttl]:
+                del self._sessions[expired]
+            cache = self._sessions.get(session_id)
+            if cache is None:
+                cache = self._sessions[session_id] = StageCache()
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return cache
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self.max_sessions}
+
+
+class CalibrationCache:
+    """
+    Axis calibrations of one batch, keyed on the plot layout (image size and
+    frame corners) and the pixels of the tick label strips, bounded LRU.
+
+    Figures generated from the same template with the same axes share the
+    key, so a batch runs the axis localization, OCR and fit once for them
+    (run.main options calibration="cached" and calibration_cache). Create
+    one per batch (see pdf_pipeline.process_pdf) rather than sharing it
+    between unrelated requests.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        """Returns the calibration stored for `key`, calling compute() on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+# One store per worker process
+default_store = SessionStore()
+
+
+def get_session_cache(session_id):
+    """Returns the StageCache of a session, or None without a session id."""
+    if not session_id:
+        return None
+    return default_store.get(session_id)
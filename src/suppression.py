@@ -0,0 +1,103 @@
+import cv2
+import numpy as np
+from polar import frame_mask
+
+
+def legend_entries(image, mask, min_width=0.02, max_width=0.15, max_height=0.25, min_chars=2):
+    """
+    Legend entries of a plot area: a short horizontal swatch in the mask
+    followed on the same line by text (dark, unsaturated glyphs).
+
+    Swatch candidates are the flat connected components of `mask`. A
+    candidate is an entry if at least min_chars glyph-sized dark components
+    start within half a swatch length to its right; the text runs on while
+    the gaps between glyphs stay below half a swatch length. Trace segments
+    are rejected since nothing like text follows them, and lines crossing
+    the search window (gridlines) are not glyphs.
+
+    Parameters:
+        image: BGR plot area.
+        mask: Binary trace mask of the same area (nonzero = trace).
+        min_width, max_width (float): Swatch length range, as fractions of
+            the image width.
+        max_height (float): Maximum swatch thickness relative to its length.
+        min_chars (int): Minimum number of glyphs after the swatch.
+
+    Returns:
+        list: (left, top, right, bottom, swatch_length) of each entry
+        (swatch and text, right and bottom exclusive).
+    """
+    height, width = mask.shape[:2]
+    count, _, stats, _ = cv2.connectedComponentsWithStats((mask > 0).astype(np.uint8), connectivity=8)
+    x, y, w, h, area = stats[1:].T
+    swatches = np.flatnonzero((w >= min_width * width) & (w <= max_width * width) &
+                              (h <= np.maximum(3, max_height * w)) & (area >= 0.5 * w * h))
+    if swatches.size == 0:
+        return []
+    dark = frame_mask(image).astype(np.uint8)
+
+    entries = []
+    for i in swatches:
+        length = int(w[i])
+        center = int(y[i] + h[i] // 2)
+        top, bottom = max(0, center - int(0.4 * length)), min(height, center + int(0.4 * length) + 1)
+        left, right = int(x[i] + w[i]), min(width, int(x[i] + w[i]) + 10 * length)
+        if right <= left or bottom - top < 3:
+            continue
+        _, _, glyphs, _ = cv2.connectedComponentsWithStats(dark[top:bottom, left:right], connectivity=8)
+        gx, gy, gw, gh, _ = glyphs[1:].T
+        # Glyphs lie within the line's height and are not long thin lines
+        glyph = (gy > 0) & (gy + gh < bottom - top) & (gw <= 2 * length) & ~((gh <= 2) & (gw > length))
+        order = np.flatnonzero(glyph)[np.argsort(gx[glyph], kind="stable")]
+        text_right = 0
+        chars = 0
+        for j in order:
+            if gx[j] > text_right + length // 2:
+                break
+            text_right = max(text_right, int(gx[j] + gw[j]))
+            chars += 1
+        if chars >= min_chars:
+            text_top = top + int(gy[order[:chars]].min())
+            text_bottom = top + int((gy + gh)[order[:chars]].max())
+            entries.append((int(x[i]), min(int(y[i]), text_top), left + text_right,
+                            max(int(y[i] + h[i]), text_bottom), length))
+    return entries
+
+
+def find_legend_boxes(image, mask, **kwargs):
+    """
+    Boxes of the legends of a plot area (see legend_entries).
+
+    Every entry is padded by half its swatch length (about the border padding
+    of a legend frame) and overlapping boxes are merged, so the entries of a
+    legend end up in one box covering its frame.
+
+    Parameters:
+        image: BGR plot area.
+        mask: Binary trace mask of the same area.
+        **kwargs: Passed to legend_entries.
+
+    Returns:
+        list: [left, top, right, bottom] pixel boxes (right and bottom
+        exclusive), clipped to the image.
+    """
+    height, width = mask.shape[:2]
+    boxes = []
+    for left, top, right, bottom, length in legend_entries(image, mask, **kwargs):
+        pad = length // 2
+        boxes.append([max(0, left - pad), max(0, top - pad), min(width, right + pad), min(height, bottom + pad)])
+    # Merge overlapping boxes until none overlap
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
@@ -2,6 +2,8 @@ import io
 import os
 import math
 import pytest
+import numpy as np
+import cv2
 from extractor_app import app
 
 @pytest.fixture
@@ -166,4 +168,41 @@ def test_extract_parameterized(client, form_fields, expected_output):
 
     # Check the expected length of data_points
     # assert len(json_data['data_points']) == expected_output['data_points_length'], \
-    #        f"Expected data_points length {expected_output['data_points_length']}, got {len(json_data['data_points'])}"
\ No newline at end of file
+    #        f"Expected data_points length {expected_output['data_points_length']}, got {len(json_data['data_points'])}"
+
+def test_stats(client):
+    response = client.get('/stats')
+    json_data = response.get_json()
+    assert response.status_code == 200
+    assert 'hits' in json_data['buffer_pool']
+    assert 'misses' in json_data['buffer_pool']
+    assert 'hit_rate' in json_data['ocr_cache']
+
+def test_extractpdfdata_invalid_file(client):
+    response = client.post('/extractpdfdata', data={})
+    assert response.status_code == 400
+    data = {'file': (io.BytesIO(b"not a pdf"), 'report.pdf')}
+    response = client.post('/extractpdfdata', data=data, content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert 'Invalid PDF' in response.get_json()['error']
+
+def test_extract_invalid_roi(client):
+    data = {'file': (io.BytesIO(b"dummy content"), 'plot.png'), 'roi': '10,20,30'}
+    response = client.post('/extract', data=data, content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert 'roi' in response.get_json()['error']
+
+def test_colors(client):
+    response = client.post('/colors', data={'file': (io.BytesIO(b"not an image"), 'plot.png')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+
+    # Blank white image with one orange stripe
+    image = np.full((200, 300, 3), 255, np.uint8)
+    image[100:104, 20:280] = (0, 165, 255)
+    data = {'file': (io.BytesIO(cv2.imencode('.png', image)[1].tobytes()), 'plot.png')}
+    response = client.post('/colors', data=data, content_type='multipart/form-data')
+    assert response.status_code == 200
+    json_data = response.get_json()
+    assert json_data['plot_box'] is None
+    assert json_data['colors'][0]['color'] == '#ffa500'
@@ -0,0 +1,852 @@
+import os
+import io
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import cv2
+import matplotlib
+matplotlib.use("Agg")  # Use a non-GUI backend
+import matplotlib.pyplot as plt
+
+from buffer_pool import BufferPool
+from utils import filter_colors, estimate_skew, rotate_image, skew_from_projection_profile, string_to_hsv, calculate_median_rcs
+from find_plot_corners import find_plot_corners, detect_plot_corners, detect_plot_panels
+from kernel_cache import quantize_size, corner_detection_params, get_square_kernel
+from run import main as run
+from angle_histogram import line_angles, aggregate_line_angles
+import extract_axes
+from extract_axes import label_boxes, detect_axis_scale
+from axis_calibration import fit_axis, calibration_from_limits
+from ocr_cache import OCRCache
+from stage_cache import StageCache
+from color_discovery import discover_colors, plot_colors
+from polar import detect_polar_circle
+from pdf_pipeline import process_pdf
+from plot_classifier import plot_likeness, MIN_PLOT_SCORE
+from vector_figures import iter_vector_figures, find_vector_figures, extract_vector_series, plot_area
+from pdf_extract import pixmap_to_numpy, pixmap_to_bgr, extract as extract_pdf_images
+import fitz
+from graph_data_extractor import GraphDataExtractor
+from autotune import autotune, score_points
+from bar_chart import bar_values, find_bars
+
+
+def render_plot(x, y, xlim=(0, 180), ylim=(-30, 30), color="blue", dpi=200, xscale="linear", yscale="linear",
+                extra_curves=(), **plot_kwargs):
+    """Renders a simple line plot (plus extra_curves, more y arrays in the same color) as a BGR image."""
+    fig, ax = plt.subplots(figsize=(8, 6), dpi=dpi)
+    ax.plot(x, y, color=color, linewidth=1, **plot_kwargs)
+    for extra_y in extra_curves:
+        ax.plot(x, extra_y, color=color, linewidth=1, **plot_kwargs)
+    ax.set_xscale(xscale)
+    ax.set_yscale(yscale)
+    ax.set_xlim(*xlim)
+    ax.set_ylim(*ylim)
+    fig.canvas.draw()
+    rgba = np.asarray(fig.canvas.buffer_rgba())
+    plt.close(fig)
+    return cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGR)
+
+
+def run_args(tmp_path, **overrides):
+    settings = {
+        "target_color": "blue",
+        "thin": 2,
+        "x_lim": [0, 180],
+        "y_lim": [-30, 30],
+        "output_folder": str(tmp_path),
+        "isMedian": True,
+    }
+    settings.update(overrides)
+    return SimpleNamespace(**settings)
+
+
+@pytest.fixture(scope="module")
+def sine_image():
+    x = np.linspace(0, 180, 400)
+    return render_plot(x, 10 * np.sin(np.deg2rad(2 * x)))
+
+
+def test_buffer_pool_reuses_released_buffers():
+    pool = BufferPool()
+    a = pool.acquire((10, 20), np.uint8)
+    pool.release(a)
+    b = pool.acquire((10, 20), np.uint8)
+    assert b is a
+    # Different dtype is a different key
+    c = pool.acquire((10, 20), np.float32)
+    assert c is not a
+    # Views are never pooled
+    pool.release(b[2:5])
+    stats = pool.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["idle_buffers"] == 0
+
+
+def test_pooled_stages_match_unpooled(sine_image):
+    pool = BufferPool()
+    first = filter_colors(sine_image, "blue", pool=pool)
+    expected = first.copy()
+    pool.release(first)
+    # Second call draws dirty buffers from the pool and must still produce the same image
+    second = filter_colors(sine_image, "blue", pool=pool)
+    assert np.array_equal(second, expected)
+
+    corners = find_plot_corners(sine_image, pool=pool)
+    assert find_plot_corners(sine_image, pool=pool) == corners
+    assert pool.stats()["hits"] > 0
+
+
+def test_kernel_cache_shares_size_buckets():
+    assert quantize_size(1200) == quantize_size(1210) == 1184
+    assert quantize_size(5) == 32
+    # Similar image sizes reuse the same cached parameters and kernels
+    assert corner_detection_params(1200, 1600) is corner_detection_params(1210, 1601)
+    kernel = get_square_kernel(3)
+    assert kernel is get_square_kernel(3)
+    assert not kernel.flags.writeable
+
+
+def test_aggregate_line_angles():
+    rng = np.random.default_rng(0)
+    # 3000 short noisy segments near 30 degrees (text/hatching) and a few long lines at 1.5 degrees
+    noise = np.column_stack([np.zeros(3000), np.zeros(3000),
+                             10 * np.cos(np.radians(30)) + rng.normal(0, 0.5, 3000), 10 * np.sin(np.radians(30)) * np.ones(3000)])
+    t = np.tan(np.radians(1.5))
+    axes = np.array([[0, 0, 1000, 1000 * t], [0, 500, 800, 500 + 800 * t], [0, 0, -600 * t, 600]])
+    angles, lengths = line_angles(np.vstack([noise, axes]))
+    assert lengths.shape == (3003,)
+
+    # The many short segments outweigh the axes in total length...
+    angle, _ = aggregate_line_angles(angles, lengths, bin_width=1.0)
+    assert abs(angle - 30) < 2
+    # ...but not once long lines are favoured
+    angle, confidence = aggregate_line_angles(angles, lengths ** 2, bin_width=1.0)
+    assert abs(angle - 1.5) < 0.01
+    assert 0 < confidence <= 1
+    assert aggregate_line_angles([], []) == (0.0, 0.0)
+
+    # Lines at +44.9 and -44.9 degrees share one orientation: their votes
+    # wrap around the histogram ends and outweigh a minority direction
+    angle, confidence = aggregate_line_angles([44.8, 44.9, -44.9, -44.8, 10], [1, 1, 1, 1, 3], bin_width=1.0)
+    assert abs(angle) == pytest.approx(44.9)
+    assert confidence == pytest.approx(4 / 7)
+
+
+@pytest.mark.parametrize("angle", [-2.0, 1.0])
+def test_skew_estimators(sine_image, angle):
+    rotated = rotate_image(sine_image, angle, border_value=(255, 255, 255))
+    estimate, method = estimate_skew(rotated)
+    assert method == "axes"
+    assert abs(estimate + angle) < 0.1
+    assert abs(skew_from_projection_profile(rotated) + angle) < 0.1
+
+
+def test_run_deskew(sine_image, tmp_path):
+    straight = run(sine_image, run_args(tmp_path))
+    rotated = rotate_image(sine_image, 1.5, border_value=(255, 255, 255), interpolation=cv2.INTER_NEAREST)
+    result = run(rotated, run_args(tmp_path, deskew=True))
+    assert abs(result["deskew_angle"] + 1.5) < 0.1
+    assert abs(result["median_rcs"] - straight["median_rcs"]) < 1
+    # Below the threshold nothing is rotated
+    assert run(sine_image, run_args(tmp_path, deskew=True))["deskew_angle"] == 0.0
+
+
+def test_corner_confidence(sine_image):
+    corners = detect_plot_corners(sine_image)
+    assert corners.confidence > 0.9
+    assert (corners.origin, corners.top_right) == find_plot_corners(sine_image)
+    assert corners.origin in corners.candidates
+
+    noise = np.random.default_rng(0).integers(0, 255, sine_image.shape, dtype=np.uint8)
+    assert detect_plot_corners(cv2.GaussianBlur(noise, (9, 9), 0)).confidence < 0.3
+
+
+def test_run_without_frame_skips_crop_and_axes(tmp_path):
+    image = np.full((400, 600, 3), 255, np.uint8)
+    cv2.putText(image, "Hello", (100, 200), cv2.FONT_HERSHEY_SIMPLEX, 3, (0, 0, 0), 5)
+    result = run(image, run_args(tmp_path, x_lim=None, y_lim=None))
+    assert result["corner_confidence"] == 0.0
+    assert result["origin"] is None
+    assert result["xlim"] == [0, 180]
+
+
+def axis_rois(image, origin, factor=0.004):
+    """Thresholded x/y label strips as cut by extract_axes_labels, with their offsets."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    bottom, right = gray.shape
+    m = int(bottom * factor)
+    y_roi_right, x_roi_top = origin[0] - m, origin[1] + m
+    y_roi_left = y_roi_right // 2
+    x_roi_bottom = x_roi_top + (bottom - x_roi_top) // 2
+    _, x_roi = cv2.threshold(gray[x_roi_top:x_roi_bottom, :], 150, 255, cv2.THRESH_BINARY)
+    _, y_roi = cv2.threshold(gray[:, y_roi_left:y_roi_right], 150, 255, cv2.THRESH_BINARY)
+    return (x_roi, (0, x_roi_top)), (y_roi, (y_roi_left, 0))
+
+
+def test_tick_labels_are_localized(sine_image):
+    origin, top_right = find_plot_corners(sine_image)
+    (x_roi, x_offset), (y_roi, y_offset) = axis_rois(sine_image, origin)
+
+    # 0, 20, ..., 180 -> ten labels centered on the ticks from the left to the right frame edge
+    x_boxes = label_boxes(x_roi, "x", x_offset, origin=origin)
+    centers = [x + w / 2 for x, y, w, h in x_boxes]
+    assert len(centers) == 10
+    assert np.allclose(centers, np.linspace(origin[0], top_right[0], 10), atol=3)
+
+    # -30, -20, ..., 30 from bottom to top
+    y_boxes = label_boxes(y_roi, "y", y_offset, origin=origin)
+    centers = [y + h / 2 for x, y, w, h in y_boxes]
+    assert len(centers) == 7
+    assert np.allclose(centers, np.linspace(origin[1], top_right[1], 7), atol=3)
+    # Much smaller than the strips that used to be OCR'd
+    assert sum(w * h for x, y, w, h in x_boxes + y_boxes) < 0.1 * (x_roi.size + y_roi.size)
+
+
+def test_label_mosaic_maps_words_back(monkeypatch):
+    crops = [np.zeros((20, 30), np.uint8), np.zeros((25, 40), np.uint8), np.zeros((20, 10), np.uint8)]
+    calls = []
+
+    def fake_image_to_data(mosaic, config, output_type):
+        calls.append(mosaic.shape)
+        # Words centered on the first and second crop lines (10 px padding)
+        return {"text": ["-30", "", "20", "x"], "top": [10, 0, 40, 42], "height": [20, 0, 25, 20]}
+
+    monkeypatch.setattr(extract_axes.pytesseract, "image_to_data", fake_image_to_data)
+    assert extract_axes.ocr_label_crops(crops, cache=OCRCache()) == ["-30", "20 x", ""]
+    assert calls == [(20 + 25 + 20 + 40, 60)]
+
+
+def test_ocr_cache_skips_repeated_labels(monkeypatch, tmp_path):
+    calls = []
+
+    def fake_image_to_data(mosaic, config, output_type):
+        calls.append(mosaic.shape)
+        # One word on the first line of the mosaic
+        return {"text": ["0"], "top": [10], "height": [20]}
+
+    monkeypatch.setattr(extract_axes.pytesseract, "image_to_data", fake_image_to_data)
+    cache = OCRCache(cache_dir=str(tmp_path))
+    crops = [np.full((20, 30), 255, np.uint8), np.zeros((20, 30), np.uint8)]
+    texts = extract_axes.ocr_label_crops(crops, cache=cache)
+    assert texts == ["0", ""]
+    # Same label strips again (e.g. the next figure of a report): no Tesseract call
+    assert extract_axes.ocr_label_crops([c.copy() for c in crops], cache=cache) == texts
+    assert len(calls) == 1
+    # Only the new crop is OCR'd
+    extract_axes.ocr_label_crops(crops + [np.zeros((20, 40), np.uint8)], cache=cache)
+    assert calls[-1] == (40, 60)
+    # A new process finds the results on disk
+    restarted = OCRCache(cache_dir=str(tmp_path))
+    assert extract_axes.ocr_label_crops(crops, cache=restarted) == texts
+    assert len(calls) == 2
+    assert restarted.stats()["disk_hits"] == 2
+    # The key covers the config
+    assert cache.key(crops[0], "--psm 6") != cache.key(crops[0], "--psm 7")
+
+
+def test_fit_axis_rejects_outliers():
+    ticks = [(0, 100), (20, 200), (40, 300), (60, 400), (80, 500)]
+    calibration = fit_axis(ticks)
+    assert np.allclose(calibration.to_data([100, 350]), [0, 50])
+    assert np.allclose(calibration.to_pixel(50), 350)
+
+    # A misread label ("8" for 80) is rejected
+    calibration = fit_axis(ticks[:-1] + [(8, 500)])
+    assert calibration.outliers == [(8, 500)]
+    assert np.allclose(calibration.to_data(500), 80)
+    # Two points cannot tell which is wrong
+    assert fit_axis([(0, 100)]) is None
+
+    calibration = fit_axis([(1, 400), (10, 300), (100, 200), (1000, 100)], scale="log10")
+    assert np.allclose(calibration.to_data(250), 10 ** 1.5)
+
+
+def test_tick_calibration_when_limits_are_off_the_frame():
+    x = np.linspace(0, 180, 400)
+    # Labels 0..180 but the frame spans -10..190 (and -35..35 for y)
+    image = render_plot(x, 10 * np.sin(np.deg2rad(2 * x)), xlim=(-10, 190), ylim=(-35, 35))
+    origin, _ = find_plot_corners(image)
+    (x_roi, x_offset), (y_roi, y_offset) = axis_rois(image, origin)
+    x_boxes = label_boxes(x_roi, "x", x_offset, origin=origin)
+    y_boxes = label_boxes(y_roi, "y", y_offset, origin=origin)
+    # Stand-in for the OCR'd values
+    x_ticks = [(value, x_offset[0] + x + w / 2) for value, (x, y, w, h) in zip(range(0, 181, 25), x_boxes)]
+    y_ticks = [(value, y_offset[1] + y + h / 2) for value, (x, y, w, h) in zip(range(-30, 31, 10), y_boxes)]
+    assert len(x_ticks) == 8 and len(y_ticks) == 7
+
+    def extract(calibrate):
+        extractor = GraphDataExtractor()
+        extractor.copy_image(image)
+        extractor.filter_to_gray("blue")
+        extractor.crop_to_plot_area()
+        extractor.set_limits([0, 175], [-30, 30])
+        if calibrate:
+            extractor.set_calibration(fit_axis(x_ticks), fit_axis(y_ticks))
+        extractor.process()
+        extractor.release_buffers()
+        points = extractor.data_points
+        return np.abs(points[:, 1] - 10 * np.sin(np.deg2rad(2 * points[:, 0])))
+
+    assert np.median(extract(calibrate=True)) < 0.5
+    assert np.median(extract(calibrate=False)) > 1
+
+
+def test_detect_axis_scale():
+    assert detect_axis_scale([0, 20, 40, 60]) == "linear"
+    assert detect_axis_scale([1, 10, 100, 1000]) == "log10"
+    assert detect_axis_scale([0.01, 0.1, 1]) == "log10"
+    # Evenly spaced positions decide between 2, 4, 6, 8 and 2, 4, 8, 16 style labels
+    assert detect_axis_scale([2, 4, 8, 16], [100, 200, 300, 400]) == "log10"
+    assert detect_axis_scale([2, 4, 6, 8], [100, 200, 300, 400]) == "linear"
+    assert detect_axis_scale([10, 100]) == "linear"
+
+
+def test_log_and_db_axes(tmp_path):
+    # Semilog frequency sweep of an RCS in m^2, plotted on a log y axis too
+    f = np.logspace(0, 3, 400)
+    rcs = 10 ** np.sin(np.log10(f) * 2)
+    image = render_plot(f, rcs, xlim=(1, 1000), ylim=(0.01, 100), xscale="log", yscale="log")
+
+    result = run(image, run_args(tmp_path, x_lim=[1, 1000], y_lim=[0.01, 100], x_scale="log10", y_scale="db"))
+    assert (result["x_scale"], result["y_scale"]) == ("log10", "db")
+    points = result["data_points"]
+    assert points[:, 0].min() >= 0.9 and points[:, 0].max() <= 1100
+    # y comes back in dB
+    expected = 10 * np.sin(np.log10(points[:, 0]) * 2)
+    assert np.median(np.abs(points[:, 1] - expected)) < 0.5
+
+    # Treating the axes as linear is badly off
+    linear = run(image, run_args(tmp_path, x_lim=[1, 1000], y_lim=[0.01, 100]))
+    assert linear["x_scale"] == "linear"
+    assert np.median(np.abs(linear["data_points"][:, 0] - points[:, 0])) > 50
+
+
+def make_pdf(figures):
+    """PDF with one page per (BGR image, caption) pair, the caption below the image."""
+    doc = fitz.open()
+    for image, caption in figures:
+        page = doc.new_page(width=595, height=842)
+        page.insert_image(fitz.Rect(50, 50, 530, 410), stream=cv2.imencode(".png", image)[1].tobytes())
+        page.insert_text((50, 430), caption, fontsize=10)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def test_process_pdf(sine_image, tmp_path):
+    x = np.linspace(0, 180, 400)
+    cosine = render_plot(x, 20 * np.cos(np.deg2rad(x)), color="blue")
+    photo = cv2.GaussianBlur(np.random.default_rng(0).integers(0, 255, (300, 400, 3), dtype=np.uint8), (7, 7), 0)
+    pdf = make_pdf([(sine_image, "Figure 1. Sine"), (photo, "Figure 3. Test range"), (cosine, "Figure 2. Cosine")])
+
+    manifest = process_pdf(pdf, run_args(tmp_path), str(tmp_path), max_workers=2)
+    assert manifest["total_figures"] == 3
+    first, photo_entry, second = manifest["figures"]
+    # The photo is dropped before the extraction
+    assert photo_entry["skipped"] == "not a plot" and "data_points" not in photo_entry
+    assert manifest["skipped_figures"] == 1
+    assert first["plot_score"] >= MIN_PLOT_SCORE
+    assert (first["page"], first["caption"]) == (1, "Figure 1. Sine")
+    assert first["name"].startswith("1_0_Figure_1_Sine")
+    assert second["caption"] == "Figure 2. Cosine"
+
+    # Same data as running the image directly
+    direct = run(sine_image, run_args(tmp_path / "direct"))
+    assert np.allclose(first["data_points"], direct["data_points"])
+    points = np.array(second["data_points"])
+    assert np.median(np.abs(points[:, 1] - 20 * np.cos(np.deg2rad(points[:, 0])))) < 0.5
+    # Each figure has its own outputs
+    assert first["extracted_image"] != second["extracted_image"]
+    assert all(os.path.exists(figure["extracted_image"]) for figure in (first, second))
+
+
+def test_process_pdf_colorspaces(sine_image, tmp_path, monkeypatch):
+    rgb = cv2.cvtColor(sine_image, cv2.COLOR_BGR2RGB)
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, rgb.shape[1], rgb.shape[0]), False)
+    pixmap_to_numpy(pix)[:] = rgb
+    doc = fitz.open()
+    doc.new_page().insert_image(fitz.Rect(50, 50, 530, 410), pixmap=fitz.Pixmap(fitz.csCMYK, pix))
+    # A two-colorant DeviceN image (no RGB or CMYK channel layout)
+    page = doc.new_page()
+    gray = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 40, 20), False)
+    page.insert_image(fitz.Rect(50, 50, 250, 150), pixmap=gray)
+    xref = page.get_images(full=True)[0][0]
+    tint = doc.get_new_xref()
+    doc.update_object(tint, "<< /FunctionType 4 /Domain [0 1 0 1] /Range [0 1 0 1 0 1 0 1] >>")
+    doc.update_stream(tint, b"{ 0 0 }")
+    doc.update_object(xref, "<< /Type /XObject /Subtype /Image /Width 40 /Height 20 /BitsPerComponent 8 "
+                            f"/ColorSpace [/DeviceN [/Cyan /Magenta] /DeviceCMYK {tint} 0 R] >>")
+    doc.update_stream(xref, bytes(40 * 20 * 2))
+    pdf = doc.tobytes()
+    doc.close()
+
+    manifest = process_pdf(pdf, run_args(tmp_path), str(tmp_path), vector=False)
+    cmyk, devicen = manifest["figures"]
+    assert "error" not in cmyk and len(cmyk["data_points"]) > 0
+    assert devicen["skipped"] == "not a plot"
+
+    # An image that cannot be decoded is reported, the others are still processed
+    def fail_devicen(pix, dst=None):
+        if pix.colorspace.name.startswith("DeviceN"):
+            raise ValueError("Unsupported pixmap")
+        return pixmap_to_bgr(pix, dst)
+
+    monkeypatch.setattr("pdf_extract.pixmap_to_bgr", fail_devicen)
+    cmyk, devicen = process_pdf(pdf, run_args(tmp_path), str(tmp_path), vector=False)["figures"]
+    assert len(cmyk["data_points"]) > 0
+    assert devicen["error"] == "Unsupported pixmap" and "data_points" not in devicen
+
+
+def test_pixmap_handoff(sine_image, tmp_path):
+    rgb = cv2.cvtColor(sine_image, cv2.COLOR_BGR2RGB)
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, rgb.shape[1], rgb.shape[0]), False)
+    pixmap_to_numpy(pix)[:] = rgb
+    # The view shares the pixmap memory
+    assert pix.pixel(10, 20) == tuple(rgb[20, 10])
+    assert np.array_equal(pixmap_to_bgr(pix), sine_image)
+
+    extractor = GraphDataExtractor()
+    assert np.array_equal(extractor.load_pixmap(pix), sine_image)
+    extractor.release_buffers()
+
+    # Transparent pixels become white, gray is expanded to BGR
+    rgba = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 4, 2), True)
+    rgba.clear_with(0)
+    rgba.set_alpha(bytes(8))
+    assert (pixmap_to_bgr(rgba) == 255).all()
+    gray = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 4, 2), False)
+    gray.clear_with(80)
+    assert pixmap_to_bgr(gray).shape == (2, 4, 3) and (pixmap_to_bgr(gray) == 80).all()
+    cmyk = fitz.Pixmap(fitz.csCMYK, fitz.IRect(0, 0, 4, 2), False)
+    cmyk.clear_with(0)
+    assert pixmap_to_bgr(cmyk).shape == (2, 4, 3)
+
+    # PNG output is optional
+    images = []
+    result = extract_pdf_images(make_pdf([(sine_image, "Figure 1")]), str(tmp_path / "png"), save_png=False,
+                                on_image=lambda name, image: images.append(image))
+    assert result["total_images_saved"] == 0 and not os.path.exists(tmp_path / "png")
+    assert len(images) == 1 and np.array_equal(images[0], sine_image)
+
+
+def test_plot_likeness(sine_image):
+    assert plot_likeness(sine_image)["score"] > 0.9
+    rng = np.random.default_rng(0)
+    photo = cv2.GaussianBlur(rng.integers(0, 255, (600, 800, 3), dtype=np.uint8), (7, 7), 0)
+    logo = np.full((400, 400, 3), 255, np.uint8)
+    cv2.circle(logo, (200, 200), 120, (30, 60, 200), -1)
+    gradient = np.dstack([np.tile(np.linspace(0, 255, 800), (600, 1))] * 3).astype(np.uint8)
+    for image in (photo, logo, gradient):
+        assert plot_likeness(image)["score"] < MIN_PLOT_SCORE
+
+
+def vector_plot_pdf(tick_labels=True):
+    """PDF page with a matplotlib line plot embedded as vector graphics and a caption below it."""
+    x = np.linspace(0, 180, 200)
+    fig, ax = plt.subplots(figsize=(6, 4))
+    ax.plot(x, 10 * np.sin(np.deg2rad(2 * x)), color="blue", linewidth=1)
+    ax.set_xlim(0, 180)
+    ax.set_ylim(-30, 30)
+    if not tick_labels:
+        ax.set_xticklabels([])
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="pdf")
+    plt.close(fig)
+    source = fitz.open(stream=buffer.getvalue(), filetype="pdf")
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.show_pdf_page(fitz.Rect(50, 50, 530, 370), source, 0)
+    page.insert_text((50, 390), "Figure 1. Sine wave", fontsize=10)
+    return doc.tobytes()
+
+
+def test_vector_figures(tmp_path):
+    figure, = iter_vector_figures(vector_plot_pdf())
+    assert figure["source"] == "vector" and figure["caption"] == "Figure 1. Sine wave"
+    points = figure["data_points"]
+    assert len(figure["series"]) == 1 and figure["series"][0]["color"] == "#0000ff"
+    assert np.abs(points[:, 1] - 10 * np.sin(np.deg2rad(2 * points[:, 0]))).max() < 0.1
+    assert np.allclose(figure["xlim"], [0, 180], atol=0.1) and np.allclose(figure["ylim"], [-30, 30], atol=0.1)
+
+    # A frame stroked as one path along the plot area is not a data series
+    doc = fitz.open(stream=vector_plot_pdf(), filetype="pdf")
+    page = doc[0]
+    figure, = find_vector_figures(page)
+    area = plot_area(figure["drawings"], figure["rect"])
+    # (a vertex mid-way along the top edge keeps PyMuPDF from reporting a "qu" item)
+    top = fitz.Point((area.x0 + area.x1) / 2, area.y0)
+    closed = [area.tl, top, area.tr, area.br, area.bl]
+    three_sides = [area.bl, area.tl, top, area.tr, area.br]
+    for frame, close in ((closed, True), (three_sides, False)):
+        shape = page.new_shape()
+        shape.draw_polyline(frame)
+        shape.finish(color=(1, 0, 0), closePath=close)
+        shape.commit()
+    framed = find_vector_figures(page)[0]
+    assert sum(d.get("color") == (1.0, 0.0, 0.0) for d in framed["drawings"]) == 2
+    series = extract_vector_series(page, framed)["series"]
+    assert [s["color"] for s in series] == ["#0000ff"]
+    doc.close()
+
+    # Without x tick labels the region is rendered and goes through the raster pipeline
+    manifest = process_pdf(vector_plot_pdf(tick_labels=False), run_args(tmp_path), str(tmp_path))
+    entry, = manifest["figures"]
+    assert entry["source"] == "vector-render"
+    points = np.array(entry["data_points"])
+    assert np.median(np.abs(points[:, 1] - 10 * np.sin(np.deg2rad(2 * points[:, 0])))) < 1
+
+
+def test_stage_cache_reruns_only_downstream_stages(sine_image, tmp_path):
+    cache = StageCache()
+    first = run(sine_image, run_args(tmp_path, stage_cache=cache))
+    assert first["cached_stages"] == []
+
+    # Changing only the thinning factor reruns the contour step alone
+    rerun = run(sine_image, run_args(tmp_path, stage_cache=cache, thin=4))
+    assert rerun["cached_stages"] == ["frame", "axes", "mask", "morphology"]
+    fresh = run(sine_image, run_args(tmp_path, thin=4))
+    np.testing.assert_array_equal(rerun["data_points"], fresh["data_points"])
+    assert rerun["origin"] == fresh["origin"]
+
+    # A new color invalidates the mask and everything after it
+    red = run(sine_image, run_args(tmp_path, stage_cache=cache, thin=4, target_color="red"))
+    assert red["cached_stages"] == ["frame", "axes"]
+
+
+def test_region_of_interest(sine_image, tmp_path):
+    # Data-space window: the first positive half period only
+    result = run(sine_image, run_args(tmp_path, x_range=[0, 90], y_range=[0, 30]))
+    left, top, right, bottom = result["roi"]
+    assert right - left < sine_image.shape[1] / 2
+    points = result["data_points"]
+    assert points[:, 0].min() >= -1 and points[:, 0].max() <= 91
+    assert points[:, 1].min() >= -1
+
+    # Pixel window: the calibration of the whole plot area still applies
+    box = run(sine_image, run_args(tmp_path, roi=[400, 300, 900, 700]))
+    assert box["roi"] == [400, 300, 900, 700]
+    points = box["data_points"]
+    assert np.abs(points[:, 1] - 10 * np.sin(np.deg2rad(2 * points[:, 0]))).max() < 0.5
+
+    with pytest.raises(ValueError):
+        run(sine_image, run_args(tmp_path, x_range=[300, 400]))
+
+
+def test_speckles_are_dropped_before_point_extraction(sine_image, tmp_path):
+    # Scatter small blue specks over the plot area (2x2 pixels after thinning)
+    noisy = sine_image.copy()
+    rng = np.random.default_rng(1)
+    for y, x in zip(rng.integers(200, 1000, 300), rng.integers(250, 1400, 300)):
+        noisy[y:y + 3, x:x + 3] = (255, 0, 0)
+
+    kept = run(noisy, run_args(tmp_path))["data_points"]
+    filtered = run(noisy, run_args(tmp_path, min_component_area=5))["data_points"]
+    clean = run(sine_image, run_args(tmp_path))["data_points"]
+    # Only the specks touching the trace survive
+    assert len(filtered) < len(kept)
+    assert len(filtered) < 1.05 * len(clean)
+
+
+def test_contour_offsets_and_stats():
+    extractor = GraphDataExtractor()
+    extractor.set_min_component_area(4)
+    image = np.zeros((50, 50), np.uint8)
+    image[10:20, 5:15] = 255   # 100 px
+    image[30, 30] = 255        # speckle
+    image[35:40, 20:45] = 255  # 125 px
+    extractor.cleaned_image = image
+    extractor.find_contours()
+    assert len(extractor.contours) == 2
+    assert sorted(extractor.contour_stats[:, cv2.CC_STAT_AREA]) == [100, 125]
+
+    extractor.image = image
+    extractor.set_limits((0, 50), (0, 50))
+    points = extractor.extract_data_points()
+    offsets = extractor.contour_offsets
+    assert len(offsets) == 3 and len(points) > 0
+    # Each slice of the flattened vertices is one simplified contour
+    for i, contour in enumerate(extractor.contours):
+        approx = cv2.approxPolyDP(contour, extractor.decimation * cv2.arcLength(contour, True), True).reshape(-1, 2)
+        np.testing.assert_array_equal(extractor.contour_points[offsets[i]:offsets[i + 1]], approx)
+
+
+def test_track_crossing_traces(tmp_path):
+    # Two blue curves crossing twice
+    x = np.linspace(0, 180, 400)
+    image = render_plot(x, 20 * np.sin(np.deg2rad(2 * x)), extra_curves=[(x - 90) / 6])
+
+    result = run(image, run_args(tmp_path, tracking=True))
+    assert len(result["series"]) == 2
+    for expected in (lambda v: 20 * np.sin(np.deg2rad(2 * v)), lambda v: (v - 90) / 6):
+        # Each curve is followed by one of the series through both crossings
+        errors = [np.median(np.abs(s["data_points"][:, 1] - expected(s["data_points"][:, 0]))) for s in result["series"]]
+        assert min(errors) < 0.5
+    for s in result["series"]:
+        assert np.all(np.diff(s["data_points"][:, 0]) > 0)
+
+
+def test_discover_trace_colors(tmp_path):
+    x = np.linspace(0, 180, 400)
+    image = render_plot(x, 10 * np.sin(np.deg2rad(2 * x)), color="#1F77B4")
+    found = plot_colors(image)
+    assert found["plot_box"] is not None
+    assert string_to_hsv(found["colors"][0]["color"])[0] == pytest.approx(string_to_hsv("#1F77B4")[0], abs=3)
+
+    # Two traces: both colors come back, the longer trace first
+    fig, ax = plt.subplots(figsize=(8, 6), dpi=200)
+    ax.plot(x, 10 * np.sin(np.deg2rad(2 * x)), color="red")
+    ax.plot(x[:100], np.zeros(100), color="green")
+    fig.canvas.draw()
+    two = cv2.cvtColor(np.asarray(fig.canvas.buffer_rgba()), cv2.COLOR_RGBA2BGR)
+    plt.close(fig)
+    colors = discover_colors(two)
+    assert [string_to_hsv(c["color"])[0] for c in colors[:2]] == pytest.approx([0, 60], abs=3)
+
+    # Auto mode extracts the discovered color in a single run
+    result = run(image, run_args(tmp_path, target_color="auto"))
+    assert result["target_color"] == found["colors"][0]["color"]
+    # ... with the hue tolerance discovered for it, unless one is given
+    assert result["delta"] == found["colors"][0]["delta"]
+    assert run(image, run_args(tmp_path, target_color="auto", delta=25))["delta"] == 25
+    points = result["data_points"]
+    assert np.median(np.abs(points[:, 1] - 10 * np.sin(np.deg2rad(2 * points[:, 0])))) < 0.5
+
+
+def test_auto_color_red_trace(tmp_path):
+    # Red hues sit at both ends of the hue circle; the filter range wraps around 0/180
+    x = np.linspace(0, 180, 400)
+    image = render_plot(x, 10 * np.sin(np.deg2rad(2 * x)), color="red")
+    result = run(image, run_args(tmp_path, target_color="auto"))
+    points = result["data_points"]
+    assert points is not None and len(points) > 0
+    assert np.median(np.abs(points[:, 1] - 10 * np.sin(np.deg2rad(2 * points[:, 0])))) < 0.5
+
+
+def render_polar_plot(theta, r, r_lim=(-40, 10), color="blue", dpi=150):
+    """Polar plot with 0 degrees at the top and clockwise angles, as a BGR image."""
+    fig = plt.figure(figsize=(6, 6), dpi=dpi)
+    ax = fig.add_subplot(projection="polar")
+    ax.set_theta_zero_location("N")
+    ax.set_theta_direction(-1)
+    ax.plot(np.deg2rad(theta), r, color=color, linewidth=1)
+    ax.set_rlim(*r_lim)
+    fig.canvas.draw()
+    rgba = np.asarray(fig.canvas.buffer_rgba())
+    plt.close(fig)
+    return cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGR)
+
+
+def test_polar_mode(tmp_path):
+    theta = np.linspace(0, 360, 721)
+    image = render_polar_plot(theta, -15 + 10 * np.cos(np.deg2rad(2 * theta)))
+
+    circle = detect_polar_circle(image)
+    assert circle["confidence"] > 0.9
+
+    result = run(image, run_args(tmp_path, mode="polar", r_lim=[-40, 10]))
+    points = result["data_points"]
+    assert points[:, 0].min() < 5 and points[:, 0].max() > 355
+    # (aspect angle, dBsm) pairs; the black radius labels inside the circle are ignored
+    assert np.abs(points[:, 1] - (-15 + 10 * np.cos(np.deg2rad(2 * points[:, 0])))).max() < 1
+    assert result["median_rcs"] == pytest.approx(calculate_median_rcs(points))
+
+
+def test_marker_mode(tmp_path):
+    x = np.linspace(5, 175, 35)
+    y = 10 * np.sin(np.deg2rad(2 * x))
+    image = render_plot(x, y, linestyle="none", marker="o", markersize=5)
+    result = run(image, run_args(tmp_path, mode="markers"))
+    # One centroid per marker instead of outline vertices
+    assert result["marker_count"] == 35
+    points = result["data_points"]
+    assert np.abs(points[:, 0] - x).max() < 1
+    assert np.abs(points[:, 1] - y).max() < 0.5
+
+    # Three overlapping markers are split by their area
+    touching = render_plot(np.array([50, 52.5, 55, 120]), np.array([0, 0, 0, 10]), linestyle="none", marker="o",
+                           markersize=5)
+    result = run(touching, run_args(tmp_path, mode="markers"))
+    assert result["marker_count"] == 4
+    assert np.abs(result["data_points"][:3, 0] - [50, 52.5, 55]).max() < 0.5
+
+
+def test_bar_mode(tmp_path):
+    positions = np.arange(1, 7)
+    first, second = np.array([5, 12, -8, 20, 15, 3]), np.array([10, -4, 6, 25, 9, 18])
+    fig, ax = plt.subplots(figsize=(8, 6), dpi=200)
+    ax.bar(positions - 0.2, first, width=0.4, color="#1F77B4")
+    ax.bar(positions + 0.2, second, width=0.4, color="#FF7F0E")
+    ax.set_xlim(0, 7)
+    ax.set_ylim(-30, 30)
+    fig.canvas.draw()
+    image = cv2.cvtColor(np.asarray(fig.canvas.buffer_rgba()), cv2.COLOR_RGBA2BGR)
+    plt.close(fig)
+
+    result = run(image, run_args(tmp_path, mode="bars", x_lim=[0, 7], y_lim=[-30, 30],
+                                 bar_colors=["#1F77B4", "#FF7F0E"]))
+    assert [len(s["data_points"]) for s in result["series"]] == [6, 6]
+    for s, offset, values in zip(result["series"], (-0.2, 0.2), (first, second)):
+        # (category position, height) pairs, bars below the baseline included
+        np.testing.assert_allclose(s["data_points"][:, 0], positions + offset, atol=0.1)
+        np.testing.assert_allclose(s["data_points"][:, 1], values, atol=0.5)
+    assert len(result["data_points"]) == 12
+
+
+@pytest.mark.parametrize("columns", [[(10, 20), (40, 50)], [(10, 20)]])
+def test_bar_values_of_equal_height_bars(columns):
+    # Equal-height bars (or a single bar) standing on the value 0 row
+    mask = np.zeros((100, 60), bool)
+    for left, right in columns:
+        mask[50:, left:right] = True
+    x_calibration = calibration_from_limits(0, 60, 0, 60)
+    y_calibration = calibration_from_limits(0, 100, 100, 0)
+    points = bar_values(find_bars(mask), x_calibration, y_calibration)
+    np.testing.assert_allclose(points, [[(left + right) / 2, 50] for left, right in columns])
+
+    # Zero below the axis (10 to 30): the bars stand on the frame edge
+    y_calibration = calibration_from_limits(10, 30, 100, 0)
+    points = bar_values(find_bars(mask), x_calibration, y_calibration)
+    np.testing.assert_allclose(points[:, 1], 20)
+
+
+def test_subplot_grid_panels(tmp_path):
+    fig, axes = plt.subplots(2, 2, figsize=(10, 8), dpi=150)
+    x = np.linspace(0, 180, 300)
+    for k, ax in enumerate(axes.flat):
+        ax.plot(x, 10 * np.sin(np.deg2rad((k + 1) * x)), color="blue")
+        ax.set_xlim(0, 180)
+        ax.set_ylim(-30, 30)
+        ax.set_title(f"Panel {k}")
+    axes[1, 1].grid(True)
+    fig.tight_layout()
+    fig.canvas.draw()
+    image = cv2.cvtColor(np.asarray(fig.canvas.buffer_rgba()), cv2.COLOR_RGBA2BGR)
+    plt.close(fig)
+
+    panels = detect_plot_panels(image)
+    assert len(panels) == 4
+    # The single-frame detection spans the whole grid
+    corners = detect_plot_corners(image)
+    assert (corners.origin, corners.top_right) == (panels[2].origin, panels[1].top_right)
+
+    result = run(image, run_args(tmp_path, panels=True, render=False))
+    assert [s["panel"] for s in result["series"]] == [0, 1, 2, 3]
+    for k, s in enumerate(result["series"]):
+        points = s["data_points"]
+        assert len(points) > 100
+        error = np.abs(points[:, 1] - 10 * np.sin(np.deg2rad((k + 1) * points[:, 0])))
+        assert np.median(error) < 0.5
+
+    # A single plot is still one panel
+    assert len(detect_plot_panels(render_plot(x, np.sin(x)))) == 1
+
+
+@pytest.mark.parametrize("linestyle", ["-", "--"])
+def test_gridline_and_legend_suppression(sine_image, tmp_path, linestyle):
+    x = np.linspace(0, 180, 400)
+    fig, ax = plt.subplots(figsize=(8, 6), dpi=200)
+    ax.plot(x, 10 * np.sin(np.deg2rad(2 * x)), color="blue", linewidth=1, label="Measured RCS")
+    ax.set_xlim(0, 180)
+    ax.set_ylim(-30, 30)
+    # Gridlines in the trace color survive the color filter
+    ax.grid(True, color="blue", linestyle=linestyle, linewidth=0.8)
+    ax.legend(loc="lower left")
+    fig.canvas.draw()
+    image = cv2.cvtColor(np.asarray(fig.canvas.buffer_rgba()), cv2.COLOR_RGBA2BGR)
+    plt.close(fig)
+
+    def errors(result):
+        points = result["data_points"]
+        return np.abs(points[:, 1] - 10 * np.sin(np.deg2rad(2 * points[:, 0])))
+
+    plain = run(image, run_args(tmp_path, render=False))
+    assert np.mean(errors(plain) > 1) > 0.1
+    result = run(image, run_args(tmp_path, render=False, suppress_grid=True, suppress_legend=True))
+    assert np.mean(errors(result) > 1) < 0.01
+    # The legend sits in the lower left corner of the plot
+    (left, top, right, bottom), = result["legend_boxes"]
+    assert right < image.shape[1] / 2 and top > image.shape[0] / 2
+
+    # Nothing to suppress on a plain plot
+    clean = run(sine_image, run_args(tmp_path, render=False))
+    suppressed = run(sine_image, run_args(tmp_path, render=False, suppress_grid=True, suppress_legend=True))
+    assert suppressed["legend_boxes"] == []
+    assert len(suppressed["data_points"]) == len(clean["data_points"])
+
+
+def test_score_points():
+    x = np.linspace(0, 180, 400)
+    clean = score_points(np.column_stack([x, np.sin(x)]), [0, 180], [-30, 30])
+    assert clean["coverage"] == 1.0 and clean["continuity"] == 1.0
+    # One point per column over half the x range, alternating between two far apart levels
+    columns = (np.arange(100) + 0.5) * 0.9
+    jumpy = score_points(np.column_stack([columns, 20 * (np.arange(100) % 2)]), [0, 180], [-30, 30])
+    assert jumpy["coverage"] < 0.6 and jumpy["continuity"] < 0.1
+    assert score_points(np.empty((0, 2)), [0, 180], [-30, 30])["score"] == 0.0
+
+
+def test_autotune(sine_image, tmp_path):
+    grid = {"delta": (10, 20), "kernel_size": (1, 9), "thin": (2, 6)}
+    result = autotune(sine_image, run_args(tmp_path, render=False), grid=grid)
+    scores = result["autotune"]["scores"]
+    assert len(scores) == 8
+    assert [row["score"] for row in scores] == sorted((row["score"] for row in scores), reverse=True)
+    # A 9 px opening erases the 1 px trace
+    assert result["autotune"]["settings"]["kernel_size"] == 1
+    assert all(row["score"] == 0.0 for row in scores if row["kernel_size"] == 9)
+    # The best candidate is rerun from its cached stages
+    assert {"frame", "axes", "mask", "morphology", "contours"} <= set(result["cached_stages"])
+    assert len(result["data_points"]) == scores[0]["points"]
+
+
+def test_autotune_render_follows_preset(sine_image, tmp_path):
+    grid = {"delta": (20,), "kernel_size": (1,), "thin": (2,)}
+    # The fast preset turns rendering off, for the rerun of the best candidate too
+    fast = autotune(sine_image, run_args(tmp_path / "fast", preset="fast"), grid=grid)
+    assert len(fast["data_points"]) > 0
+    assert fast["extracted_image"] is None and not (tmp_path / "fast" / "extracted-image.png").exists()
+    # Without a preset or render setting the best candidate is rendered
+    rendered = autotune(sine_image, run_args(tmp_path / "default"), grid=grid)
+    assert os.path.exists(rendered["extracted_image"])
+
+
+def test_quality_presets(sine_image, tmp_path, monkeypatch):
+    import run as run_module
+    from stage_cache import CalibrationCache
+
+    ocr_calls = []
+
+    def fake_extract_axes(image, origin, **kwargs):
+        # Every OCR call reads a different x range, so a reused calibration shows
+        ocr_calls.append(origin)
+        return {"x_axis": [0, 180 * len(ocr_calls)], "y_axis": [-30, 30], "x_ticks": [], "y_ticks": [],
+                "x_scale": "linear", "y_scale": "linear"}
+
+    monkeypatch.setattr(run_module, "extract_axes", fake_extract_axes)
+    settings = {"target_color": "blue", "thin": 2, "output_folder": str(tmp_path), "isMedian": True}
+    batch = {**settings, "calibration_cache": CalibrationCache()}
+
+    accurate = run(sine_image, SimpleNamespace(**batch, preset="accurate"))
+    fast = run(sine_image, SimpleNamespace(**batch, preset="fast"))
+    assert os.path.exists(accurate["extracted_image"]) and fast["extracted_image"] is None
+    assert len(ocr_calls) == 2
+    # The same figure again in the batch reuses the calibration
+    again = run(sine_image, SimpleNamespace(**batch, preset="fast"))
+    assert len(ocr_calls) == 2 and again["xlim"] == fast["xlim"]
+    # Without a batch cache (single /extract requests) the axes are always read
+    run(sine_image, SimpleNamespace(**settings, preset="fast"))
+    assert len(ocr_calls) == 3
+
+    # Same layout, different tick labels: read separately
+    x = np.linspace(0, 360, 400)
+    other = run(render_plot(x, 10 * np.sin(np.deg2rad(x)), xlim=(0, 360)), SimpleNamespace(**batch, preset="fast"))
+    assert other["origin"] == fast["origin"]
+    assert len(ocr_calls) == 4 and other["xlim"] != fast["xlim"]
+
+    # Explicit settings override the preset
+    assert run(sine_image, SimpleNamespace(**settings, preset="fast", render=True))["extracted_image"]
+    with pytest.raises(ValueError):
+        run(sine_image, SimpleNamespace(**settings, preset="instant"))
@@ -0,0 +1,134 @@
+import numpy as np
+
+
+def column_runs(mask, max_runs=8):
+    """
+    Vertical runs of foreground pixels in every column of a binary mask.
+
+    Parameters:
+        mask: 2D array, nonzero pixels are foreground.
+        max_runs (int): Maximum number of runs kept per column (top first).
+
+    Returns:
+        tuple: (centers, lengths), two (W, max_runs) float arrays with the
+        center row and the length of each run, NaN where a column has fewer runs.
+    """
+    height, width = mask.shape
+    foreground = np.zeros((height + 2, width), np.int8)
+    foreground[1:-1] = mask > 0
+    edges = np.diff(foreground, axis=0)
+    # Transposed so the runs come out sorted by column, then row
+    start_cols, start_rows = np.nonzero(edges.T == 1)
+    _, end_rows = np.nonzero(edges.T == -1)
+
+    centers = np.full((width, max_runs), np.nan)
+    lengths = np.full((width, max_runs), np.nan)
+    if start_cols.size == 0:
+        return centers, lengths
+    # Rank of each run within its column
+    first = np.searchsorted(start_cols, start_cols, side="left")
+    rank = np.arange(start_cols.size) - first
+    keep = rank < max_runs
+    centers[start_cols[keep], rank[keep]] = (start_rows[keep] + end_rows[keep] - 1) / 2.0
+    lengths[start_cols[keep], rank[keep]] = end_rows[keep] - start_rows[keep]
+    return centers, lengths
+
+
+def estimate_trace_count(centers):
+    """Most common number of runs in the columns that have any."""
+    counts = np.count_nonzero(~np.isnan(centers), axis=1)
+    counts = counts[counts > 0]
+    if counts.size == 0:
+        return 0
+    return int(np.bincount(counts).argmax())
+
+
+def viterbi_path(columns, candidates, penalty=None, momentum=0.5):
+    """
+    Smoothest path through the candidate rows of consecutive columns.
+
+    The cost of stepping from candidate i to candidate j is the distance of
+    j from the row predicted by extending i's path with its current slope,
+    so paths keep their direction through crossings instead of switching to
+    the other curve. Each step is vectorized over the k x k candidate pairs,
+    for O(W * k^2) in total.
+
+    Parameters:
+        columns: (N,) x positions of the columns (increasing, gaps allowed).
+        candidates: (N, k) candidate rows per column, NaN for none.
+        penalty: Optional (N, k) extra cost of using each candidate.
+        momentum (float): Weight of the previous slope in the slope estimate
+            (smooths the pixel-level jitter of the runs).
+
+    Returns:
+        (N,) index of the chosen candidate in each column.
+    """
+    n, k = candidates.shape
+    if penalty is None:
+        penalty = np.zeros((n, k))
+    valid = ~np.isnan(candidates)
+    cost = np.where(valid[0], penalty[0], np.inf)
+    slope = np.zeros(k)
+    back = np.zeros((n, k), np.intp)
+
+    for t in range(1, n):
+        dx = columns[t] - columns[t - 1]
+        previous = candidates[t - 1]
+        predicted = previous + slope * dx
+        # step[i, j]: cost of moving from candidate i to candidate j
+        step = np.abs(candidates[t][None, :] - predicted[:, None])
+        total = cost[:, None] + np.where(np.isnan(step), np.inf, step)
+        best = np.argmin(total, axis=0)
+        back[t] = best
+        cost = np.where(valid[t], total[best, np.arange(k)] + penalty[t], np.inf)
+        new_slope = (candidates[t] - previous[best]) / dx
+        slope = np.where(valid[t], momentum * slope[best] + (1 - momentum) * new_slope, 0.0)
+
+    path = np.empty(n, np.intp)
+    path[-1] = np.argmin(cost)
+    for t in range(n - 1, 0, -1):
+        path[t - 1] = back[t, path[t]]
+    return path
+
+
+def track_traces(mask, traces=None, max_runs=8, reuse_penalty=None, momentum=0.5):
+    """
+    Follows one or more curves drawn in the same color through a binary mask.
+
+    Every column contributes the centers of its foreground runs as
+    candidates. Curves are tracked one after the other with viterbi_path;
+    candidates already used by a tracked curve cost reuse_penalty, so the
+    next curve follows a different one except where the curves overlap
+    (crossings), where both pass through the shared run.
+
+    Parameters:
+        mask: Binary image of the traces (nonzero = trace).
+        traces (int): Number of curves; None estimates it as the most common
+            number of runs per column.
+        max_runs (int): Candidates kept per column.
+        reuse_penalty (float): Cost of sharing a run with a tracked curve
+            (default: 5% of the image height).
+        momentum (float): See viterbi_path.
+
+    Returns:
+        list: One (N, 2) array of (x, y) pixel points per curve, one point per
+        column with foreground pixels.
+    """
+    centers, _ = column_runs(mask, max_runs)
+    columns = np.nonzero(~np.isnan(centers[:, 0]))[0]
+    if columns.size == 0:
+        return []
+    if traces is None:
+        traces = estimate_trace_count(centers)
+    if reuse_penalty is None:
+        reuse_penalty = 0.05 * mask.shape[0]
+    candidates = centers[columns]
+
+    penalty = np.zeros(candidates.shape)
+    chosen = np.arange(columns.size)
+    series = []
+    for _ in range(max(1, traces)):
+        path = viterbi_path(columns, candidates, penalty, momentum)
+        penalty[chosen, path] += reuse_penalty
+        series.append(np.column_stack([columns, candidates[chosen, path]]))
+    return series
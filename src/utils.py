@@ -1,7 +1,9 @@
 import cv2
 import numpy as np
 from PIL import ImageColor
-from math import degrees
+from buffer_pool import get_pool
+from find_plot_corners import estimate_axis_skew
+from angle_histogram import line_angles, aggregate_line_angles
 
 
 def calculate_median_rcs(data):
@@ -65,7 +67,7 @@ def string_to_hsv(color_str: str) -> np.ndarray:
 
 
 
-def filter_colors(image, target_color: str = 'black', delta: int = 20) -> np.ndarray:
+def filter_colors(image, target_color: str = 'black', delta: int = 20, pool=None, keep_black: bool = True) -> np.ndarray:
     """
     Extracts regions of an image that are black, green, white, or blue,
     and returns an image where the preserved areas maintain their original colors,
@@ -73,6 +75,11 @@ def filter_colors(image, target_color: str = 'black', delta: int = 20) -> np.nda
     
     Parameters:
         image_path (str): The file path to the image.
+        pool (BufferPool): Optional pool the intermediate HSV/mask buffers and the
+            result are drawn from. The caller owns the returned image and may
+            release it back to the pool when done.
+        keep_black (bool): Also preserve black pixels (black traces); turn off
+            when black text or frame lines lie inside the plot area.
         
     Returns:
         result (np.ndarray): The processed image with non-preserved areas filled with white.
@@ -81,59 +88,79 @@ def filter_colors(image, target_color: str = 'black', delta: int = 20) -> np.nda
     
     if image is None:
         raise ValueError("Image not found. Check the provided path.")
+
+    if pool is None:
+        pool = get_pool()
+    mask_shape = image.shape[:2]
     
     # Convert the image from BGR to HSV color space
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=pool.acquire_like(image))
 
     # Define HSV range for black (low brightness in the V channel).
     lower_black = np.array([0, 0, 0])
     upper_black = np.array([180, 255, 50])
-    mask_black = cv2.inRange(hsv, lower_black, upper_black)
+    mask_black = cv2.inRange(hsv, lower_black, upper_black, dst=pool.acquire(mask_shape))
+    if not keep_black:
+        mask_black.fill(0)
     
     # Define HSV range for white.
     # White typically has low saturation and high value.
     lower_white = np.array([0, 0, 200])
     upper_white = np.array([180, 30, 255])
-    mask_white = cv2.inRange(hsv, lower_white, upper_white)
+    mask_white = cv2.inRange(hsv, lower_white, upper_white, dst=pool.acquire(mask_shape))
 
     # Compute target color from string
     target = string_to_hsv(target_color)
-    target_hue = target[0]
+    target_hue = int(target[0])  # int, so target_hue - delta cannot wrap around as uint8
     # delta = 20
     lower_target = np.array([max(target_hue-delta,0), 150, 0]) # from partial saturation and no brightness
     upper_target = np.array([min(target_hue + delta,180), 255, 255]) # to full saturation and full brightness
-    mask_target = cv2.inRange(hsv, lower_target, upper_target)
+    mask_target = cv2.inRange(hsv, lower_target, upper_target, dst=pool.acquire(mask_shape))
+
+    # Hue is circular (0..180): a range that crosses 0 or 180 (reds) also
+    # takes the part that wraps around to the other end.
+    if target_hue - delta < 0 or target_hue + delta > 180:
+        if target_hue - delta < 0:
+            lower_wrap, upper_wrap = 180 + target_hue - delta, 180
+        else:
+            lower_wrap, upper_wrap = 0, target_hue + delta - 180
+        mask_wrap = cv2.inRange(hsv, np.array([lower_wrap, 150, 0]), np.array([upper_wrap, 255, 255]),
+                                dst=pool.acquire(mask_shape))
+        cv2.bitwise_or(mask_target, mask_wrap, dst=mask_target)
+        pool.release(mask_wrap)
     
-    # Combine all masks using bitwise OR operations.
+    # Combine all masks using bitwise OR operations (in place, no new arrays).
     combined_mask = mask_black
-    # combined_mask = cv2.bitwise_or(combined_mask, mask_black)
-    combined_mask = cv2.bitwise_or(combined_mask, mask_white)
-    combined_mask = cv2.bitwise_or(combined_mask, mask_target)
-    # combined_mask = cv2.bitwise_or(mask_white, mask_target)
+    cv2.bitwise_or(combined_mask, mask_white, dst=combined_mask)
+    cv2.bitwise_or(combined_mask, mask_target, dst=combined_mask)
 
-    
-    # Create a white background image of the same size as the original image.
-    white_bg = np.full_like(image, 255)  # 255 for white in BGR
-    
-    # Create the output image by copying the white background.
-    # Then, for all pixels where the mask is 255 (preserved colors), copy the original pixel.
-    result = white_bg.copy()
-    result[combined_mask == 255] = image[combined_mask == 255]
+    # Start from a white background of the same size as the original image,
+    # then copy the original pixel wherever the mask is set (preserved colors).
+    result = pool.acquire_like(image)
+    result.fill(255)  # 255 for white in BGR
+    cv2.copyTo(image, combined_mask, dst=result)
+
+    pool.release(hsv, mask_black, mask_white, mask_target)
     
     return result
 
 
 
-def detect_rotation(image, debug=False):
+def detect_rotation(image, debug=False, bin_width=None, return_confidence=False):
     """
     Detect the rotation angle of a plot image using Hough transform.
     
     Parameters:
         image: Input image (grayscale or BGR)
         debug: If True, save intermediate processing steps
+        bin_width: Optional angle-bin width (degrees) for histogram voting
+            before the weighted median (see aggregate_line_angles)
+        return_confidence: If True, also return the confidence score
         
     Returns:
         angle: Rotation angle in degrees (positive = counterclockwise)
+        confidence: Fraction of line length agreeing with the angle (only if
+            return_confidence is True)
     """
     # Convert to grayscale if needed
     if len(image.shape) > 2:
@@ -154,61 +181,32 @@ def detect_rotation(image, debug=False):
                            maxLineGap=50)
     
     if lines is None:
-        return 0
+        return (0, 0.0) if return_confidence else 0
     
-    lines = np.squeeze(lines)
+    lines = lines.reshape(-1, 4)
 
-    angles = []
-    lengths = []
-    for line in lines:
-        x1, y1, x2, y2 = line
-        # Calculate line length
-        length = np.sqrt((x2 - x1)**2 + (y2 - y1)**2)
-        
-        # Calculate angle of the line
-        if x2 - x1 != 0:  # Avoid division by zero
-            angle = degrees(np.arctan2(y2 - y1, x2 - x1))
-            # Normalize angles to -45 to 45 degrees range
-            if angle > 45:
-                angle -= 90
-            elif angle < -45:
-                angle += 90
-            angles.append(angle)
-            lengths.append(length)
-
-        if debug:
-            print(line, int(length), angle)
-    
-    if not angles:
-        return 0
-    
-    # Use weighted median based on line lengths
-    sorted_pairs = sorted(zip(angles, lengths), key=lambda x: -x[1])
-    total_length = sum(lengths)
-    cumulative_length = 0
-    for angle, length in sorted_pairs:
-        cumulative_length += length
-        if cumulative_length >= total_length/2:
-            rotation_angle = angle
-            break
+    # Length-weighted median of the line angles (vectorized)
+    angles, lengths = line_angles(lines)
+    rotation_angle, confidence = aggregate_line_angles(angles, lengths, bin_width=bin_width)
     
     if debug:
         # Draw detected lines with thickness proportional to length
         debug_img = cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
-        for line, length in zip(lines, lengths):
-            x1, y1, x2, y2 = line
+        for x1, y1, x2, y2 in lines:
             # thickness = int(max(1, length/100))  # Scale thickness based on length
             cv2.line(debug_img, (x1, y1), (x2, y2), (0, 0, 255), 2)
             cv2.circle(debug_img, (x1, y1), 10, (0, 255, 0), 2)
             cv2.circle(debug_img, (x2, y2), 10, (255, 255, 0), 2)
         cv2.imwrite("output/detected_lines.png", debug_img)
         print(f"Found {len(angles)} lines")
-        print(f"Line lengths: min={min(lengths):.1f}, max={max(lengths):.1f}, mean={np.mean(lengths):.1f}")
-        print(f"Detected rotation angle: {rotation_angle:.2f} degrees")
+        print(f"Line lengths: min={lengths.min():.1f}, max={lengths.max():.1f}, mean={lengths.mean():.1f}")
+        print(f"Detected rotation angle: {rotation_angle:.2f} degrees (confidence {confidence:.2f})")
     
+    if return_confidence:
+        return rotation_angle, confidence
     return rotation_angle
 
-def rotate_image(image, angle, center=None):
+def rotate_image(image, angle, center=None, border_value=None, interpolation=cv2.INTER_LINEAR):
     """
     Rotate an image by a given angle around its center.
     
@@ -216,6 +214,9 @@ def rotate_image(image, angle, center=None):
         image: Input image
         angle: Rotation angle in degrees (positive = counterclockwise)
         center: Point to rotate around (if None, use image center)
+        border_value: Fill value for pixels rotated in from outside the image
+            (if None, use OpenCV's default black border)
+        interpolation: OpenCV interpolation flag
     
     Returns:
         Rotated image
@@ -225,7 +226,84 @@ def rotate_image(image, angle, center=None):
         center = (width // 2, height // 2)
     
     rotation_matrix = cv2.getRotationMatrix2D(center, angle, scale=1.0)
-    rotated_image = cv2.warpAffine(image, rotation_matrix, (width, height),
-                                  flags=cv2.INTER_LINEAR)
+    if border_value is None:
+        rotated_image = cv2.warpAffine(image, rotation_matrix, (width, height),
+                                      flags=interpolation)
+    else:
+        rotated_image = cv2.warpAffine(image, rotation_matrix, (width, height),
+                                      flags=interpolation,
+                                      borderMode=cv2.BORDER_CONSTANT,
+                                      borderValue=border_value)
     
     return rotated_image
+
+
+def skew_from_projection_profile(image, max_angle=5.0, coarse_step=0.5, fine_step=0.05, max_dim=600):
+    """
+    Estimate the skew angle of an image with a coarse-to-fine projection profile search.
+
+    The image is downsampled, dark pixels are projected onto the normal of
+    each candidate line direction, and the angle giving the sharpest
+    histogram (largest sum of squared bin counts) wins. Horizontal rules,
+    axes and text baselines all contribute.
+    
+    Parameters:
+        image: Input image (grayscale or BGR)
+        max_angle: Largest skew (degrees) searched in either direction
+        coarse_step: Angular step of the first pass (degrees)
+        fine_step: Angular step of the refinement pass (degrees)
+        max_dim: Longest side of the downsampled working image
+        
+    Returns:
+        angle: Skew angle in degrees, in the convention of detect_rotation
+    """
+    if len(image.shape) > 2:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    else:
+        gray = image
+
+    scale = min(1.0, max_dim / max(gray.shape[:2]))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    ys, xs = np.nonzero(binary)
+    if xs.size == 0:
+        return 0.0
+    xs = xs.astype(np.float64)
+    ys = ys.astype(np.float64)
+
+    def best_angle(candidates):
+        theta = np.radians(candidates)[:, None]
+        # Offset of every pixel along the normal of each candidate direction
+        offsets = np.rint(ys[None, :] * np.cos(theta) - xs[None, :] * np.sin(theta)).astype(np.int64)
+        offsets -= offsets.min(axis=1, keepdims=True)
+        scores = [np.sum(np.bincount(row).astype(np.float64) ** 2) for row in offsets]
+        return candidates[int(np.argmax(scores))]
+
+    coarse = best_angle(np.arange(-max_angle, max_angle + coarse_step / 2, coarse_step))
+    fine = best_angle(np.arange(coarse - coarse_step, coarse + coarse_step + fine_step / 2, fine_step))
+    return float(fine)
+
+
+def estimate_skew(image, max_angle=5.0, pool=None):
+    """
+    Estimate the skew angle of a plot image.
+
+    Uses the long axis/frame lines found by the corner-detection morphology
+    when they agree on an angle, and falls back to a projection profile on a downsampled
+    copy of the image otherwise.
+    
+    Parameters:
+        image: Input image (grayscale or BGR)
+        max_angle: Largest skew (degrees) considered plausible
+        pool: Optional BufferPool for the intermediate line maps
+        
+    Returns:
+        (angle, method): Skew angle in degrees (pass to rotate_image to
+            deskew) and the estimator used ("axes" or "projection").
+    """
+    angle, confidence = estimate_axis_skew(image, pool=pool)
+    if angle is not None and abs(angle) <= max_angle and confidence >= 0.5:
+        return angle, "axes"
+    return skew_from_projection_profile(image, max_angle=max_angle), "projection"
@@ -0,0 +1,328 @@
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+from pdf_extract import FIGURE_KEYWORDS, caption_to_filename, open_pdf, pixmap_to_bgr
+from extract_axes import extract_numbers, detect_axis_scale
+from axis_calibration import fit_axis
+
+
+def _is_white(color):
+    return color is not None and min(color) >= 0.95
+
+
+def _color_to_hex(color):
+    return "#" + "".join(f"{int(round(c * 255)):02x}" for c in color[:3])
+
+
+def _drawing_boxes(drawings):
+    """(N, 4) array of x0, y0, x1, y1 of the drawings."""
+    return np.array([tuple(d["rect"]) for d in drawings], dtype=np.float64).reshape(-1, 4)
+
+
+def cluster_drawings(drawings, page_rect, gap=8):
+    """
+    Groups drawings whose bounding boxes are within `gap` points of each other.
+
+    The boxes are painted (grown by the gap) onto a 1 px per point mask and
+    the connected components of the mask are the clusters, which avoids
+    comparing every pair of paths on pages with thousands of them.
+
+    Returns:
+        list of lists of drawing indices.
+    """
+    if not drawings:
+        return []
+    boxes = _drawing_boxes(drawings)
+    width, height = int(np.ceil(page_rect.width)) + 1, int(np.ceil(page_rect.height)) + 1
+    mask = np.zeros((height, width), np.uint8)
+    grown = np.round(boxes + [-gap, -gap, gap, gap]).astype(np.int64) - [page_rect.x0, page_rect.y0] * 2
+    grown = np.clip(grown, 0, [width - 1, height - 1, width - 1, height - 1]).astype(np.int64)
+    for x0, y0, x1, y1 in grown:
+        mask[y0:y1 + 1, x0:x1 + 1] = 255
+    _, labels = cv2.connectedComponents(mask, connectivity=8)
+    centers_x = ((grown[:, 0] + grown[:, 2]) // 2)
+    centers_y = ((grown[:, 1] + grown[:, 3]) // 2)
+    owner = labels[centers_y, centers_x]
+    return [np.flatnonzero(owner == label).tolist() for label in np.unique(owner) if label > 0]
+
+
+def _caption_blocks(page):
+    """Text blocks mentioning a figure keyword, as (fitz.Rect, text)."""
+    blocks = []
+    for block in page.get_text("dict")["blocks"]:
+        if block.get("type", 1) != 0 or "lines" not in block:
+            continue
+        text = "\n".join(" ".join(span["text"] for span in line["spans"]) for line in block["lines"])
+        if any(keyword in text for keyword in FIGURE_KEYWORDS):
+            blocks.append((fitz.Rect(block["bbox"]), text))
+    return blocks
+
+
+def _nearest_caption(rect, captions, max_distance):
+    """Closest caption block above or below `rect` that overlaps it horizontally."""
+    best, best_distance = None, max_distance
+    for block_rect, text in captions:
+        if block_rect.x1 < rect.x0 or block_rect.x0 > rect.x1:
+            continue
+        distance = max(block_rect.y0 - rect.y1, rect.y0 - block_rect.y1, 0)
+        if distance <= best_distance:
+            best, best_distance = (block_rect, text), distance
+    return best
+
+
+def find_vector_figures(page, min_paths=5, min_size=72, max_caption_distance=72, gap=8):
+    """
+    Finds figures drawn as vector graphics on a PDF page.
+
+    Filled white shapes (page and axes backgrounds) are ignored, the other
+    paths are clustered (cluster_drawings), and clusters with at least
+    `min_paths` paths, at least `min_size` points wide and high and a
+    "Figure"/"Table" caption within `max_caption_distance` points are kept.
+
+    Returns:
+        list of dict with "rect" (fitz.Rect of the paths), "drawings" and
+        "caption" (text of the caption block).
+    """
+    drawings = [d for d in page.get_drawings() if not (d.get("color") is None and _is_white(d.get("fill")))]
+    captions = _caption_blocks(page)
+    boxes = _drawing_boxes(drawings)
+    figures = []
+    for members in cluster_drawings(drawings, page.rect, gap):
+        if len(members) < min_paths:
+            continue
+        # (fitz.Rect unions skip the zero-width boxes of straight lines)
+        rect = fitz.Rect(*boxes[members, :2].min(axis=0), *boxes[members, 2:].max(axis=0))
+        if rect.width < min_size or rect.height < min_size:
+            continue
+        caption = _nearest_caption(rect, captions, max_caption_distance)
+        if caption is None:
+            continue
+        figures.append({"rect": rect, "drawings": [drawings[i] for i in members], "caption": caption[1],
+                        "caption_rect": caption[0]})
+    figures.sort(key=lambda f: (f["rect"].y0, f["rect"].x0))
+    return figures
+
+
+def _path_points(drawing):
+    """Vertices of a stroked path made of lines and curves (curve end points only)."""
+    points = []
+    for item in drawing["items"]:
+        if item[0] == "l":
+            ends = (item[1], item[2])
+        elif item[0] == "c":
+            ends = (item[1], item[4])
+        else:
+            return None
+        for p in ends:
+            if not points or points[-1] != (p.x, p.y):
+                points.append((p.x, p.y))
+    return points
+
+
+def plot_area(drawings, rect, min_fraction=0.3):
+    """
+    Plot area of a vector figure from its long axis-aligned stroked lines
+    (axes or frame). Falls back to the bounding box of all paths.
+
+    Returns:
+        fitz.Rect
+    """
+    horizontal, vertical = [], []
+    for drawing in drawings:
+        if drawing.get("color") is None:
+            continue
+        for item in drawing["items"]:
+            if item[0] == "re":
+                horizontal += [(item[1].x0, item[1].x1, item[1].y0), (item[1].x0, item[1].x1, item[1].y1)]
+                vertical += [(item[1].y0, item[1].y1, item[1].x0), (item[1].y0, item[1].y1, item[1].x1)]
+            elif item[0] == "l":
+                p, q = item[1], item[2]
+                if abs(p.y - q.y) < 0.5 and abs(p.x - q.x) >= min_fraction * rect.width:
+                    horizontal.append((min(p.x, q.x), max(p.x, q.x), p.y))
+                elif abs(p.x - q.x) < 0.5 and abs(p.y - q.y) >= min_fraction * rect.height:
+                    vertical.append((min(p.y, q.y), max(p.y, q.y), p.x))
+    if not horizontal or not vertical:
+        return fitz.Rect(rect)
+    x0 = min(x for _, _, x in vertical)
+    x1 = max([x for _, _, x in vertical] + [end for _, end, _ in horizontal])
+    y0 = min([y for _, _, y in horizontal] + [start for start, _, _ in vertical])
+    y1 = max(y for _, _, y in horizontal)
+    return fitz.Rect(x0, y0, x1, y1)
+
+
+def _number_spans(page, clip):
+    """
+    Numeric text spans inside `clip` as (value, fitz.Rect). Powers of ten
+    typeset as "10" with a superscript exponent are combined (log axes).
+    """
+    spans = []
+    for block in page.get_text("dict", clip=clip)["blocks"]:
+        for line in block.get("lines", []):
+            spans += [span for span in line["spans"] if span["text"].strip()]
+    if not spans:
+        return []
+    size = float(np.median([span["size"] for span in spans]))
+    numbers = []
+    superscripts = [span for span in spans if span["size"] < 0.85 * size]
+    for span in spans:
+        if span in superscripts:
+            continue
+        values = extract_numbers(span["text"])
+        if len(values) != 1:
+            continue
+        value = values[0]
+        bbox = fitz.Rect(span["bbox"])
+        if value == 10:
+            for sup in superscripts:
+                sup_rect = fitz.Rect(sup["bbox"])
+                exponent = extract_numbers(sup["text"])
+                if exponent and abs(sup_rect.x0 - bbox.x1) < size and sup_rect.y0 < bbox.y0 + 0.5 * bbox.height:
+                    value = 10.0 ** exponent[0]
+                    bbox |= sup_rect
+                    break
+        numbers.append((value, bbox))
+    return numbers
+
+
+def vector_tick_labels(page, area, margin=48):
+    """
+    Tick labels around a plot area: the first row of numbers below it (x) and
+    the right-most column of numbers left of it (y).
+
+    Returns:
+        (x_ticks, y_ticks): lists of (value, position in points).
+    """
+    clip = fitz.Rect(area.x0 - margin, area.y0 - margin / 4, area.x1 + margin / 4, area.y1 + margin)
+    numbers = _number_spans(page, clip)
+
+    below = [(v, r) for v, r in numbers if r.y0 >= area.y1 - 2 and area.x0 - 10 <= (r.x0 + r.x1) / 2 <= area.x1 + 10]
+    x_ticks = []
+    if below:
+        top = min(r.y0 for _, r in below)
+        x_ticks = [(v, (r.x0 + r.x1) / 2) for v, r in below if r.y0 <= top + 2]
+
+    left = [(v, r) for v, r in numbers if r.x1 <= area.x0 + 2 and area.y0 - 10 <= (r.y0 + r.y1) / 2 <= area.y1 + 10]
+    y_ticks = []
+    if left:
+        right = max(r.x1 for _, r in left)
+        y_ticks = [(v, (r.y0 + r.y1) / 2) for v, r in left if r.x1 >= right - 2]
+    return sorted(x_ticks, key=lambda t: t[1]), sorted(y_ticks, key=lambda t: -t[1])
+
+
+def _is_frame(drawing, points, area, tolerance=1.0):
+    """
+    True for closed paths and for paths made only of axis-aligned segments
+    along the plot area border (a frame or axis box stroked as one path).
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if drawing.get("closePath") or np.abs(points[0] - points[-1]).max() <= tolerance:
+        return True
+    steps = np.abs(np.diff(points, axis=0))
+    aligned = (steps.min(axis=1) <= tolerance).all()
+    x, y = points[:, 0], points[:, 1]
+    on_border = ((np.minimum(np.abs(x - area.x0), np.abs(x - area.x1)) <= tolerance)
+                 | (np.minimum(np.abs(y - area.y0), np.abs(y - area.y1)) <= tolerance))
+    return bool(aligned and on_border.all())
+
+
+def _fit_ticks(ticks):
+    if len(ticks) < 2:
+        return None
+    values, positions = zip(*ticks)
+    return fit_axis(ticks, scale=detect_axis_scale(values, positions))
+
+
+def extract_vector_series(page, figure, min_segments=4):
+    """
+    Reads the data series of a vector figure straight from its path data:
+    stroked polylines with at least `min_segments` segments inside the plot
+    area, calibrated with the tick label text spans (no rasterization or OCR).
+    Closed paths and paths along the plot area border (frames) are skipped.
+
+    Returns:
+        dict with "series" (one entry per stroke color: "color", "data_points"),
+        "data_points" (the longest series), "xlim", "ylim", "x_scale",
+        "y_scale" and the calibrations; or None if no series or no axis
+        calibration could be found.
+    """
+    area = plot_area(figure["drawings"], figure["rect"])
+    x_calibration, y_calibration = (_fit_ticks(ticks) for ticks in vector_tick_labels(page, area))
+    if x_calibration is None or y_calibration is None:
+        return None
+
+    by_color = {}
+    inside = fitz.Rect(area.x0 - 1, area.y0 - 1, area.x1 + 1, area.y1 + 1)
+    for drawing in figure["drawings"]:
+        color = drawing.get("color")
+        if color is None or len(drawing["items"]) < min_segments:
+            continue
+        points = _path_points(drawing)
+        if not points or not all(inside.contains(fitz.Point(p)) for p in (points[0], points[-1])):
+            continue
+        if _is_frame(drawing, points, area):
+            continue
+        by_color.setdefault(_color_to_hex(color), []).extend(points)
+    if not by_color:
+        return None
+
+    series = []
+    for color, points in by_color.items():
+        pixels = np.asarray(points, dtype=np.float64)
+        data_points = np.column_stack([x_calibration.to_data(pixels[:, 0]), y_calibration.to_data(pixels[:, 1])])
+        series.append({"color": color, "data_points": data_points})
+    longest = max(series, key=lambda s: len(s["data_points"]))
+    xlim = [float(v) for v in x_calibration.to_data([area.x0, area.x1])]
+    ylim = [float(v) for v in y_calibration.to_data([area.y1, area.y0])]
+    return {
+        "series": series,
+        "data_points": longest["data_points"],
+        "xlim": xlim,
+        "ylim": ylim,
+        "x_scale": x_calibration.scale,
+        "y_scale": y_calibration.scale,
+        "x_calibration": x_calibration.as_dict(),
+        "y_calibration": y_calibration.as_dict(),
+    }
+
+
+def render_region(page, rect, dpi=200):
+    """Rasterizes only `rect` of a page (clip rendering) as a BGR image."""
+    return pixmap_to_bgr(page.get_pixmap(clip=rect, dpi=dpi))
+
+
+def iter_vector_figures(pdf_path, dpi=200, max_file_length=100, label_margin=48):
+    """
+    Yields the vector figures of a PDF.
+
+    Figures whose series and axes can be read from the path data yield their
+    data directly ("source": "vector"). The others are clip-rendered at
+    `dpi` (including a margin for the tick labels) and yield an "image" for
+    the raster pipeline ("source": "vector-render").
+
+    Yields:
+        dict with "page", "index", "name", "caption", "source", "rect" and
+        either the extract_vector_series results or "image".
+    """
+    doc = open_pdf(pdf_path)
+    try:
+        for page_number in range(len(doc)):
+            page = doc[page_number]
+            for index, figure in enumerate(find_vector_figures(page)):
+                rect = figure["rect"]
+                entry = {
+                    "page": page_number + 1,
+                    "index": index,
+                    "name": f"{page_number+1}_v{index}_{caption_to_filename(figure['caption'], max_file_length)}",
+                    "caption": figure["caption"].strip(),
+                    "rect": [rect.x0, rect.y0, rect.x1, rect.y1],
+                }
+                extracted = extract_vector_series(page, figure)
+                if extracted is not None:
+                    entry.update(extracted, source="vector")
+                else:
+                    clip = fitz.Rect(rect.x0 - label_margin, rect.y0 - label_margin / 4,
+                                     rect.x1 + label_margin / 4, rect.y1 + label_margin) & page.rect
+                    entry.update(image=render_region(page, clip, dpi), source="vector-render")
+                yield entry
+    finally:
+        doc.close()